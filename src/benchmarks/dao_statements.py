@@ -0,0 +1,105 @@
+"""
+Накладные расходы на запрос в горячих методах DAO: построение запроса каждый раз против готового.
+
+    python -m src.benchmarks.dao_statements --calls 20000          # сборка запросов и запросы к БД
+    python -m src.benchmarks.dao_statements --calls 20000 --no-db  # только сборка запросов, БД не нужна
+
+Сборка: построение запроса и ключа кэша компиляции SQLAlchemy, то, что делается на каждый вызов до отправки в БД.
+БД: последовательные вызовы по случайным ключам, в задержку входят и сборка, и разбор результата.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.dao.base_dao import MovementPairDAO, StockItemDAO
+from src.db.database import dispose_engines
+from src.db.models import MovementPair, StockItem
+
+
+def build_stock_by_key_per_call(warehouse_id: uuid.UUID, product_id: uuid.UUID):
+    return select(StockItem).filter_by(warehouse_id=warehouse_id, product_id=product_id)
+
+
+def build_movement_pair_per_call(movement_id: uuid.UUID):
+    return select(MovementPair).filter_by(movement_id=movement_id)
+
+
+def build_upsert_per_call(warehouse_id: uuid.UUID, product_id: uuid.UUID, delta: int):
+    """StockItemDAO._upsert_quantity_stmt, но значения встраиваются в новый запрос на каждый вызов"""
+    stmt = insert(StockItem).values(warehouse_id=warehouse_id, product_id=product_id, quantity=max(delta, 0))
+    return stmt.on_conflict_do_update(
+        index_elements=[StockItem.warehouse_id, StockItem.product_id],
+        set_={"quantity": StockItem.quantity + delta, "version": StockItem.version + 1},
+        where=StockItem.quantity + delta >= 0,
+    ).returning(StockItem.warehouse_id, StockItem.product_id, StockItem.quantity, StockItem.version)
+
+
+BUILDERS = {
+    "stock по ключу": (
+        lambda: build_stock_by_key_per_call(uuid.uuid4(), uuid.uuid4()),
+        StockItemDAO._find_by_key_stmt,
+    ),
+    "movement_pair": (
+        lambda: build_movement_pair_per_call(uuid.uuid4()),
+        MovementPairDAO._find_by_movement_id_stmt,
+    ),
+    "upsert остатка": (
+        lambda: build_upsert_per_call(uuid.uuid4(), uuid.uuid4(), 5),
+        StockItemDAO._upsert_quantity_stmt,
+    ),
+}
+
+
+def measure_build(calls: int) -> None:
+    print("Сборка запроса и ключа кэша компиляции, мкс на вызов:")
+    for name, (per_call, prepared) in BUILDERS.items():
+        results = []
+        for build in (per_call, prepared):
+            started = time.perf_counter()
+            for _ in range(calls):
+                build()._generate_cache_key()
+            results.append((time.perf_counter() - started) / calls * 1_000_000)
+        print(f"{name:>16}: каждый раз {results[0]:8.1f}, готовый {results[1]:8.1f}, x{results[0] / results[1]:.1f}")
+
+
+async def measure_db(calls: int) -> None:
+    variants = {
+        "stock, find_one_or_none": lambda: StockItemDAO.find_one_or_none(
+            warehouse_id=uuid.uuid4(), product_id=uuid.uuid4()
+        ),
+        "stock, find_by_key": lambda: StockItemDAO.find_by_key(uuid.uuid4(), uuid.uuid4()),
+        "movement_pair, find_one_or_none": lambda: MovementPairDAO.find_one_or_none(movement_id=uuid.uuid4()),
+        "movement_pair, find_by_movement_id": lambda: MovementPairDAO.find_by_movement_id(uuid.uuid4()),
+    }
+    print("Запрос к БД, последовательно:")
+    for name, call in variants.items():
+        # прогрев пула соединений и кэшей prepared statements
+        for _ in range(100):
+            await call()
+        latencies = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(
+            f"{name:>36}: p50 {statistics.median(latencies) * 1000:6.3f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.3f} ms"
+        )
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--no-db", action="store_true", help="только сборка запросов")
+    args = parser.parse_args()
+    measure_build(args.calls)
+    if not args.no_db:
+        asyncio.run(measure_db(args.calls))
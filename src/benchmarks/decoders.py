@@ -0,0 +1,69 @@
+"""
+Микро-бенчмарк декодеров сообщений Kafka из src/kafka/decoders.py.
+
+    python -m src.benchmarks.decoders --count 50000
+    python -m src.benchmarks.decoders --corpus messages.jsonl
+
+Корпус — файл JSON Lines, одно сообщение в строке. Без --corpus генерируется синтетический.
+Кроме скорости проверяется, что все декодеры принимают и отклоняют одни и те же сообщения и разбирают
+их в одинаковые значения, в том числе на граничных случаях из DECODER_EDGE_CASES.
+"""
+
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from src.benchmarks.events import generate_corpus, generate_edge_cases
+from src.kafka.decoders import DECODER_FACTORIES, get_decoder
+
+
+def load_corpus(path: Path) -> list[bytes]:
+    return [line for line in path.read_bytes().splitlines() if line.strip()]
+
+
+def main(corpus: list[bytes], repeat: int) -> None:
+    # невалидные сообщения декодеры логируют — в бенчмарке это шум
+    logging.disable(logging.ERROR)
+    decoded = {}
+    for name in DECODER_FACTORIES:
+        try:
+            decode = get_decoder(name)
+        except ImportError as e:
+            print(f"{name:>10}: пропущен ({e})")
+            continue
+
+        decoded[name] = [_fields(decode(raw)) for raw in corpus + generate_edge_cases()]
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for raw in corpus:
+                decode(raw)
+            best = min(best, time.perf_counter() - started)
+        print(f"{name:>10}: {best / len(corpus) * 1e6:7.2f} µs/msg, {len(corpus) / best:10.0f} msg/s")
+
+    results = list(decoded.values())
+    mismatches = sum(1 for values in zip(*results) if any(value != values[0] for value in values))
+    print(f"Расхождений в валидации: {mismatches} из {len(results[0])}")
+
+
+def _fields(message) -> tuple | None:
+    """Значения полей сообщения независимо от того, pydantic-модель это или msgspec.Struct"""
+    if message is None:
+        return None
+    data = message.data
+    return (
+        *(getattr(message, name) for name in ("id", "source", "specversion", "time", "subject")),
+        *(getattr(data, name) for name in ("movement_id", "warehouse_id", "timestamp", "event", "product_id")),
+        data.quantity,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="файл JSON Lines с сообщениями")
+    parser.add_argument("--count", type=int, default=50000, help="размер синтетического корпуса")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    main(load_corpus(args.corpus) if args.corpus else generate_corpus(args.count, args.seed), args.repeat)
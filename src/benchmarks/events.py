@@ -0,0 +1,230 @@
+"""
+Генерация синтетических сообщений Kafka в формате SKafkaMessageAll (CloudEvents).
+"""
+
+import itertools
+import json
+import random
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple
+
+from src.enums import EventType
+
+BASE_TIME = datetime(2025, 2, 18, 12, 0, tzinfo=timezone.utc)
+
+
+def make_event(
+    rng: random.Random,
+    event: EventType,
+    movement_id: uuid.UUID,
+    warehouse_id: uuid.UUID,
+    product_id: uuid.UUID,
+    quantity: int,
+    timestamp: datetime,
+    source: str,
+) -> dict:
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "source": source,
+        "specversion": "1.0",
+        "type": "ru.retail.warehouses.movement",
+        "datacontenttype": "application/json",
+        "dataschema": "ru.retail.warehouses.movement.v1.0",
+        "time": int(timestamp.timestamp() * 1000),
+        "subject": f"{source}:{event.value.upper()}",
+        "destination": "ru.retail.warehouses",
+        "data": {
+            "movement_id": str(movement_id),
+            "warehouse_id": str(warehouse_id),
+            "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "event": event.value,
+            "product_id": str(product_id),
+            "quantity": quantity,
+        },
+    }
+
+
+def generate_corpus(count: int, seed: int = 42) -> list[bytes]:
+    """Простой корпус случайных сообщений в виде сырых байтов, как они приходят из Kafka"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        event = rng.choice(list(EventType))
+        message = make_event(
+            rng,
+            event=event,
+            movement_id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            warehouse_id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            product_id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            quantity=rng.randint(1, 500),
+            timestamp=BASE_TIME + timedelta(seconds=i),
+            source=f"WH-{rng.randint(0, 9999):04d}",
+        )
+        corpus.append(json.dumps(message).encode("utf-8"))
+    return corpus
+
+
+# Значения полей на границе правил валидации: нестрогие приведения pydantic и форматы, которые разные
+# декодеры разбирают по-разному. Путь до поля и значение, ... — поле отсутствует.
+DECODER_EDGE_CASES = [
+    (("source",), "WH-0001\n"),
+    (("source",), " WH-0001"),
+    (("source",), "WH-00011"),
+    (("source",), "WH-٠١٢٣"),
+    (("data", "quantity"), True),
+    (("data", "quantity"), False),
+    (("data", "quantity"), 5.0),
+    (("data", "quantity"), 5.5),
+    (("data", "quantity"), "5"),
+    (("data", "quantity"), "5.0"),
+    (("data", "quantity"), "1e2"),
+    (("data", "quantity"), -1),
+    (("data", "quantity"), 2**31 - 1),
+    (("data", "quantity"), 2**31),
+    (("data", "quantity"), None),
+    (("time",), True),
+    (("time",), "1739880000000"),
+    (("time",), "1e3"),
+    (("data", "timestamp"), "2025-02-18"),
+    (("data", "timestamp"), "2025-02-18T12:00:00"),
+    (("data", "timestamp"), "2025-02-18 12:00:00"),
+    (("data", "timestamp"), "2025-02-18t12:00:00z"),
+    (("data", "timestamp"), "2025-02-18T12:00Z"),
+    (("data", "timestamp"), "2025-02-18T12:00:00+0300"),
+    (("data", "timestamp"), "2025-02-18T12:00:00,5Z"),
+    (("data", "timestamp"), "2025-02-18T12:00:00.1234567Z"),
+    (("data", "timestamp"), "2025-02-29T12:00:00Z"),
+    (("data", "timestamp"), "2025-02-18T24:00:00Z"),
+    (("data", "timestamp"), 1739880000),
+    (("data", "timestamp"), 1739880000.5),
+    (("data", "timestamp"), "1739880000"),
+    (("data", "timestamp"), True),
+    (("data", "movement_id"), "C1A0A4F5-6A2B-4D2C-9B1A-1C2D3E4F5A6B"),
+    (("data", "movement_id"), "c1a0a4f56a2b4d2c9b1a1c2d3e4f5a6b"),
+    (("data", "movement_id"), "urn:uuid:c1a0a4f5-6a2b-4d2c-9b1a-1c2d3e4f5a6b"),
+    (("data", "movement_id"), "{c1a0a4f5-6a2b-4d2c-9b1a-1c2d3e4f5a6b}"),
+    (("data", "movement_id"), " c1a0a4f5-6a2b-4d2c-9b1a-1c2d3e4f5a6b"),
+    (("data", "event"), "ARRIVAL"),
+    (("specversion",), 1.0),
+    (("id",), ...),
+]
+
+
+def generate_edge_cases(seed: int = 42) -> list[bytes]:
+    """Сообщения из DECODER_EDGE_CASES: в валидном сообщении заменено одно поле"""
+    rng = random.Random(seed)
+    messages = []
+    for path, value in DECODER_EDGE_CASES:
+        message = make_event(
+            rng,
+            EventType.arrival,
+            *(uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(3)),
+            rng.randint(1, 500),
+            BASE_TIME,
+            "WH-0001",
+        )
+        parent = message
+        for key in path[:-1]:
+            parent = parent[key]
+        if value is ...:
+            del parent[path[-1]]
+        else:
+            parent[path[-1]] = value
+        messages.append(json.dumps(message).encode("utf-8"))
+    return messages
+
+
+class SyntheticStream(NamedTuple):
+    messages: List[bytes]
+    warehouse_ids: List[uuid.UUID]
+    product_ids: List[uuid.UUID]
+
+
+def generate_stream(
+    count: int,
+    seed: int = 42,
+    warehouses: int = 20,
+    products: int = 1000,
+    sku_skew: float = 1.1,
+    paired: float = 0.7,
+    duplicates: float = 0.01,
+    bad: float = 0.005,
+    start: datetime = BASE_TIME,
+) -> SyntheticStream:
+    """
+    Поток сообщений, похожий на реальный: популярность товаров по Zipf, отправка и приёмка одного
+    перемещения с разных складов с задержкой в потоке, повторы уже отправленных сообщений и битые сообщения.
+    При одном seed поток всегда одинаковый.
+    :param sku_skew: Показатель Zipf для выбора товара, 0 — все товары одинаково популярны.
+    :param paired: Доля перемещений, у которых позже приходит приёмка; остальные — только отправка или приёмка.
+    :param duplicates: Доля повторно отправленных сообщений.
+    :param bad: Доля сообщений, которые не проходят разбор или валидацию.
+    :param start: Время первого события, дальше по секунде на сообщение.
+    """
+    rng = random.Random(seed)
+    warehouse_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(warehouses)]
+    product_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(products)]
+    sources = {warehouse_id: f"WH-{number:04d}" for number, warehouse_id in enumerate(warehouse_ids)}
+    product_weights = list(itertools.accumulate(1 / (rank**sku_skew) for rank in range(1, products + 1)))
+
+    # приёмки, которые придут позже: (номер сообщения, событие)
+    pending: deque = deque()
+    messages: List[bytes] = []
+    for i in range(count):
+        timestamp = start + timedelta(seconds=i)
+        roll = rng.random()
+        if messages and roll < duplicates:
+            messages.append(rng.choice(messages))
+            continue
+        if roll < duplicates + bad:
+            messages.append(_bad_message(rng, timestamp))
+            continue
+        if pending and pending[0][0] <= i:
+            _, arrival = pending.popleft()
+            arrival["data"]["timestamp"] = timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+            arrival["time"] = int(timestamp.timestamp() * 1000)
+            messages.append(json.dumps(arrival).encode("utf-8"))
+            continue
+
+        movement_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        product_id = rng.choices(product_ids, cum_weights=product_weights)[0]
+        sender, recipient = rng.sample(warehouse_ids, 2) if warehouses > 1 else (warehouse_ids[0],) * 2
+        quantity = rng.randint(1, 100)
+        event = EventType.departure if rng.random() < paired else rng.choice(list(EventType))
+        warehouse_id = sender if event == EventType.departure else recipient
+        message = make_event(
+            rng, event, movement_id, warehouse_id, product_id, quantity, timestamp, sources[warehouse_id]
+        )
+        messages.append(json.dumps(message).encode("utf-8"))
+        if event == EventType.departure and rng.random() < paired:
+            # при приёмке иногда недосчитываются товара
+            arrived = quantity - (rng.randint(1, quantity) if rng.random() < 0.05 else 0)
+            arrival = make_event(
+                rng, EventType.arrival, movement_id, recipient, product_id, arrived, timestamp, sources[recipient]
+            )
+            pending.append((i + rng.randint(1, 200), arrival))
+    return SyntheticStream(messages, warehouse_ids, product_ids)
+
+
+def _bad_message(rng: random.Random, timestamp: datetime) -> bytes:
+    """Битое сообщение одного из видов, которые встречаются в топике"""
+    message = make_event(
+        rng,
+        rng.choice(list(EventType)),
+        *(uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(3)),
+        rng.randint(1, 100),
+        timestamp,
+        "WH-0000",
+    )
+    kind = rng.randrange(4)
+    if kind == 0:
+        return json.dumps(message).encode("utf-8")[:-10]
+    if kind == 1:
+        message["data"]["quantity"] = -message["data"]["quantity"]
+    elif kind == 2:
+        message["data"]["event"] = "transfer"
+    else:
+        del message["data"]["product_id"]
+    return json.dumps(message).encode("utf-8")
@@ -0,0 +1,301 @@
+"""
+Сквозной бенчмарк приёма событий: KafkaConsumerService с обработчиками из src/kafka/handlers.py,
+вместо брокера — consumer в памяти с тем же интерфейсом.
+
+    python -m src.benchmarks.ingest --events 20000
+    python -m src.benchmarks.ingest --events 20000 --batch --sku-skew 1.3 --duplicates 0.05
+    python -m src.benchmarks.ingest --events 20000 --save stream.jsonl  # сохранить поток для повторного прогона
+    python -m src.benchmarks.ingest --corpus stream.jsonl
+
+Нужны поднятые БД с применёнными миграциями и Redis. События пишутся в текущий месяц, созданные
+склады, товары и их движения после прогона удаляются (--keep — оставить).
+
+Этапы:
+    decode  — разбор сообщения десериализатором;
+    queue   — от выдачи сообщения consumer'ом до начала обработки воркером;
+    handle  — обработчик: транзакция в БД и запись остатков в кэш;
+    lag     — от выдачи сообщения до конца обработчика. Кэш остатков обновляется внутри обработчика
+              (write-through), поэтому это задержка между приёмом события и тем, когда его видит чтение.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from aiokafka import TopicPartition
+from sqlalchemy import delete, event
+
+from src.benchmarks.events import SyntheticStream, generate_stream
+from src.db.database import _engine_async, async_session_maker, dispose_engines
+from src.db.models import Movement, MovementPair, Product, StockCheckpoint, StockItem, Warehouse
+from src.db.partitions import MovementPartitions
+from src.kafka.consumer import KafkaConsumerService
+from src.kafka.decoders import get_decoder
+from src.kafka.handlers import handle_batch, handle_message
+from src.redis.service import redis_service
+
+TOPIC = "benchmark"
+
+
+@dataclass
+class BenchRecord:
+    topic: str
+    partition: int
+    offset: int
+    value: Any
+
+
+@dataclass
+class Stats:
+    stages: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    fetched_at: Dict[int, float] = field(default_factory=dict)
+    db_round_trips: int = 0
+
+
+class InMemoryBroker:
+    """Сообщения топика, разложенные по партициям по складу, как их раскладывает продюсер"""
+
+    def __init__(self, messages: List[bytes], partitions: int):
+        self.partitions: Dict[int, deque] = {number: deque() for number in range(partitions)}
+        for raw in messages:
+            self.partitions[hash(_partition_key(raw)) % partitions].append(raw)
+        self.total = len(messages)
+        self.delivered = 0
+        self.committed: Dict[TopicPartition, int] = {}
+        self.exhausted = asyncio.Event()
+
+
+class InMemoryConsumer:
+    """Подмножество интерфейса AIOKafkaConsumer, которое использует KafkaConsumerService"""
+
+    def __init__(self, broker: InMemoryBroker, stats: Stats, value_deserializer: Callable, **kwargs):
+        self.broker = broker
+        self.stats = stats
+        self.value_deserializer = value_deserializer
+        self.offsets = {number: 0 for number in broker.partitions}
+        self._paused: set = set()
+
+    def subscribe(self, topics, listener=None):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def highwater(self, partition: TopicPartition):
+        return self.offsets[partition.partition] + len(self.broker.partitions[partition.partition])
+
+    def assignment(self):
+        return {TopicPartition(TOPIC, number) for number in self.broker.partitions}
+
+    def paused(self):
+        return set(self._paused)
+
+    def pause(self, *partitions):
+        self._paused.update(partitions)
+
+    def resume(self, *partitions):
+        self._paused.difference_update(partitions)
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int | None = None):
+        records: Dict[TopicPartition, List[BenchRecord]] = {}
+        budget = max_records or self.broker.total
+        for number, queue in self.broker.partitions.items():
+            topic_partition = TopicPartition(TOPIC, number)
+            if topic_partition in self._paused:
+                continue
+            while queue and budget:
+                raw = queue.popleft()
+                started = time.perf_counter()
+                value = self.value_deserializer(raw)
+                fetched_at = time.perf_counter()
+                self.stats.stages["decode"].append(fetched_at - started)
+                if value is not None:
+                    self.stats.fetched_at[id(value)] = fetched_at
+                records.setdefault(topic_partition, []).append(BenchRecord(TOPIC, number, self.offsets[number], value))
+                self.offsets[number] += 1
+                budget -= 1
+
+        self.broker.delivered += sum(len(batch) for batch in records.values())
+        if self.broker.delivered == self.broker.total:
+            self.broker.exhausted.set()
+        if not records:
+            await asyncio.sleep(timeout_ms / 1000)
+        return records
+
+    async def commit(self, offsets: Dict[TopicPartition, int]):
+        self.broker.committed.update(offsets)
+
+
+def _partition_key(raw: bytes) -> str:
+    try:
+        return json.loads(raw)["data"]["warehouse_id"]
+    except Exception:
+        return ""
+
+
+def _timed_handlers(stats: Stats):
+    """Обработчики из src/kafka/handlers.py с замером этапов queue, handle и lag"""
+
+    def started(values: List[Any]) -> float:
+        now = time.perf_counter()
+        for value in values:
+            if id(value) in stats.fetched_at:
+                stats.stages["queue"].append(now - stats.fetched_at[id(value)])
+        return now
+
+    def finished(values: List[Any], started_at: float) -> None:
+        now = time.perf_counter()
+        stats.stages["handle"].append(now - started_at)
+        for value in values:
+            fetched_at = stats.fetched_at.pop(id(value), None)
+            if fetched_at is not None:
+                stats.stages["lag"].append(now - fetched_at)
+
+    async def message_handler(message):
+        started_at = started([message])
+        try:
+            await handle_message(message)
+        finally:
+            finished([message], started_at)
+
+    async def batch_handler(messages):
+        started_at = started(messages)
+        try:
+            await handle_batch(messages)
+        finally:
+            finished(messages, started_at)
+
+    return message_handler, batch_handler
+
+
+async def run(stream: SyntheticStream, args: argparse.Namespace) -> None:
+    stats = Stats()
+    broker = InMemoryBroker(stream.messages, args.partitions)
+    message_handler, batch_handler = _timed_handlers(stats)
+
+    def count_round_trip(*_):
+        stats.db_round_trips += 1
+
+    event.listen(_engine_async.sync_engine, "before_cursor_execute", count_round_trip)
+    service = KafkaConsumerService(
+        topic=TOPIC,
+        bootstrap_servers="memory",
+        group_id="benchmark",
+        value_deserializer=get_decoder(args.decoder),
+        handler=message_handler,
+        batch_handler=batch_handler if args.batch else None,
+        workers=args.workers,
+        consumer_factory=lambda **kwargs: InMemoryConsumer(broker, stats, **kwargs),
+    )
+
+    await redis_service.init(local_cache=False)
+    try:
+        await MovementPartitions.ensure()
+        started = time.perf_counter()
+        consumer_task = asyncio.create_task(service.start())
+        await broker.exhausted.wait()
+        await service.stop()
+        await consumer_task
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(_engine_async.sync_engine, "before_cursor_execute", count_round_trip)
+        if not args.keep:
+            await cleanup(stream)
+        await redis_service.close()
+        await dispose_engines()
+
+    committed = sum(broker.committed.values())
+    mode = "batch" if args.batch else "message"
+    print(
+        f"{mode}: {broker.total} событий за {elapsed:.2f} сек, {broker.total / elapsed:.0f} событий/сек, "
+        f"закоммичено {committed}, запросов к БД на событие {stats.db_round_trips / broker.total:.2f}"
+    )
+    for stage in ("decode", "queue", "handle", "lag"):
+        latencies = sorted(stats.stages[stage])
+        if not latencies:
+            continue
+        print(
+            f"{stage:>8}: p50 {statistics.median(latencies) * 1000:8.3f} ms, "
+            f"p99 {latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000:8.3f} ms, n={len(latencies)}"
+        )
+
+
+async def cleanup(stream: SyntheticStream) -> None:
+    warehouse_ids, product_ids = stream.warehouse_ids, stream.product_ids
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(StockCheckpoint).where(StockCheckpoint.warehouse_id.in_(warehouse_ids)))
+            await session.execute(delete(StockItem).where(StockItem.warehouse_id.in_(warehouse_ids)))
+            await session.execute(delete(MovementPair).where(MovementPair.product_id.in_(product_ids)))
+            await session.execute(delete(Movement).where(Movement.product_id.in_(product_ids)))
+            await session.execute(delete(Warehouse).where(Warehouse.id.in_(warehouse_ids)))
+            await session.execute(delete(Product).where(Product.id.in_(product_ids)))
+
+
+def load_stream(path: Path) -> SyntheticStream:
+    """Поток из файла JSON Lines, id складов и товаров для очистки берутся из валидных сообщений"""
+    messages = [line for line in path.read_bytes().splitlines() if line.strip()]
+    warehouse_ids, product_ids = set(), set()
+    for raw in messages:
+        try:
+            data = json.loads(raw)["data"]
+            warehouse_ids.add(uuid.UUID(data["warehouse_id"]))
+            product_ids.add(uuid.UUID(data["product_id"]))
+        except Exception:
+            continue
+    return SyntheticStream(messages, list(warehouse_ids), list(product_ids))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--warehouses", type=int, default=20)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--sku-skew", type=float, default=1.1, help="показатель Zipf популярности товаров")
+    parser.add_argument("--paired", type=float, default=0.7, help="доля перемещений с приёмкой")
+    parser.add_argument("--duplicates", type=float, default=0.01, help="доля повторных сообщений")
+    parser.add_argument("--bad", type=float, default=0.005, help="доля битых сообщений")
+    parser.add_argument("--corpus", type=Path, default=None, help="поток из файла JSON Lines вместо генерации")
+    parser.add_argument("--save", type=Path, default=None, help="сохранить сгенерированный поток и выйти")
+    parser.add_argument("--partitions", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--decoder", default="pydantic")
+    parser.add_argument("--batch", action="store_true", help="пакетный режим обработки")
+    parser.add_argument("--keep", action="store_true", help="не удалять данные прогона")
+    args = parser.parse_args()
+
+    if args.corpus is not None:
+        stream = load_stream(args.corpus)
+    else:
+        stream = generate_stream(
+            args.events,
+            seed=args.seed,
+            warehouses=args.warehouses,
+            products=args.products,
+            sku_skew=args.sku_skew,
+            paired=args.paired,
+            duplicates=args.duplicates,
+            bad=args.bad,
+            start=datetime.now(timezone.utc).replace(microsecond=0),
+        )
+    if args.save is not None:
+        args.save.write_bytes(b"\n".join(stream.messages) + b"\n")
+        print(f"Сохранено {len(stream.messages)} сообщений в {args.save}")
+    else:
+        # битые сообщения декодер логирует — в бенчмарке это шум
+        logging.basicConfig(level=logging.WARNING)
+        logging.getLogger("src.kafka.decoders").setLevel(logging.CRITICAL)
+        asyncio.run(run(stream, args))
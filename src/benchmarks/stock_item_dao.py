@@ -0,0 +1,115 @@
+"""
+Сравнение реализаций изменения остатка в StockItemDAO под конкурентной нагрузкой.
+
+    python -m src.benchmarks.stock_item_dao --events 5000 --concurrency 50 --keys 20
+
+Нужна поднятая БД с применёнными миграциями. Создаёт временные склады/товары и удаляет их после прогона.
+Все реализации получают одну и ту же последовательность событий, остатки перед каждой обнуляются.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete
+
+from src.dao.base_dao import StockItemDAO
+from src.db.database import async_session_maker
+from src.db.models import Product, StockItem, Warehouse
+from src.db.schemas import SStockItemUpdate
+from src.enums import EventType
+
+IMPLEMENTATIONS = {
+    "select_for_update": StockItemDAO.find_one_or_create_or_update_quantity,
+    "upsert": StockItemDAO.upsert_quantity,
+}
+
+
+def generate_workload(events_count: int, keys: int, seed: int) -> tuple:
+    """Пары склад/товар и события к ним, одни на все реализации"""
+    rng = random.Random(seed)
+    pairs = [(uuid.UUID(int=rng.getrandbits(128)), uuid.UUID(int=rng.getrandbits(128))) for _ in range(keys)]
+    events = [
+        SStockItemUpdate(
+            warehouse_id=warehouse_id,
+            product_id=product_id,
+            quantity=rng.randint(1, 10),
+            event_type=rng.choice([EventType.arrival, EventType.arrival, EventType.departure]),
+        )
+        for warehouse_id, product_id in (rng.choice(pairs) for _ in range(events_count))
+    ]
+    return pairs, events
+
+
+async def prepare_keys(pairs: list) -> None:
+    async with async_session_maker() as session:
+        async with session.begin():
+            for warehouse_id, product_id in pairs:
+                session.add(Warehouse(id=warehouse_id, code="WH-0000"))
+                session.add(Product(id=product_id))
+
+
+async def reset_stock(pairs: list) -> None:
+    warehouse_ids = [warehouse_id for warehouse_id, _ in pairs]
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(StockItem).where(StockItem.warehouse_id.in_(warehouse_ids)))
+
+
+async def cleanup(pairs: list) -> None:
+    warehouse_ids = [warehouse_id for warehouse_id, _ in pairs]
+    product_ids = [product_id for _, product_id in pairs]
+    await reset_stock(pairs)
+    async with async_session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(Warehouse).where(Warehouse.id.in_(warehouse_ids)))
+            await session.execute(delete(Product).where(Product.id.in_(product_ids)))
+
+
+async def run(implementation, events: list, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def apply(data: SStockItemUpdate):
+        async with semaphore:
+            started = time.perf_counter()
+            async with async_session_maker() as session:
+                async with session.begin():
+                    await implementation(db_session_for_transaction=session, data=data)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(apply(data) for data in events))
+    return latencies
+
+
+async def main(events_count: int, concurrency: int, keys: int, seed: int) -> None:
+    pairs, events = generate_workload(events_count, keys, seed)
+    await prepare_keys(pairs)
+    try:
+        for name, implementation in IMPLEMENTATIONS.items():
+            await reset_stock(pairs)
+            started = time.perf_counter()
+            latencies = await run(implementation, events, concurrency)
+            elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            print(
+                f"{name:>18}: {events_count / elapsed:8.0f} events/s, "
+                f"p50 {statistics.median(latencies) * 1000:6.2f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f} ms"
+            )
+    finally:
+        await cleanup(pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=20, help="число горячих пар склад/товар")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(main(args.events, args.concurrency, args.keys, args.seed))
@@ -1,2 +1,27 @@
 class ModelFieldConstant:
     WH_CODE = 10
+    # quantity в movement и stock_item — integer (int4)
+    MAX_QUANTITY = 2**31 - 1
+
+
+class DAOConstant:
+    # asyncpg ограничивает число параметров в одном запросе (32767)
+    MAX_QUERY_PARAMS = 32000
+    # строк за одно чтение из серверного курсора при потоковой выдаче
+    STREAM_BATCH_SIZE = 1000
+
+
+class EntityCacheConstant:
+    MAX_SIZE = 100_000
+
+
+class StockLookupConstant:
+    # максимум пар склад/товар в одном запросе пакетного поиска остатков
+    MAX_KEYS = 1000
+
+
+class StockSnapshotConstant:
+    # сколько последних снимков остатков хранить
+    KEEP_SNAPSHOTS = 3
+    # параллельных соединений при пересборке stock_item
+    REBUILD_WORKERS = 4
@@ -1,20 +1,64 @@
 import logging
+import uuid
+from datetime import datetime
+from functools import cache
+from typing import AsyncIterator, Dict, List, Sequence, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    Select,
+    Uuid,
+    and_,
+    any_,
+    bindparam,
+    case,
+    column,
+    delete,
+    exists,
+    false,
+    func,
+    literal,
+    select,
+    text,
+    true,
+    tuple_,
+    union,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.exc import SQLAlchemyError
 
-from src.db.database import async_session_maker
-from src.db.models import Movement, Product, StockItem, Warehouse
+from src.constant import DAOConstant
+from src.dao.cursor import decode_cursor, encode_cursor
+from src.db.database import async_session_maker, read_session_maker
+from src.db.models import (
+    Movement,
+    MovementLeg,
+    MovementPair,
+    Product,
+    StockCheckpoint,
+    StockCheckpointRun,
+    StockItem,
+    StockSnapshot,
+    StockSnapshotItem,
+    Warehouse,
+)
 from src.db.schemas import (
     SMovementAll,
+    SMovementPairAll,
     SProductAll,
+    SStockCheckpointRunAll,
     SStockItemAll,
     SStockItemUpdate,
+    SStockSnapshotAll,
     SWarehouseAll,
 )
-from src.dependencies import SFilterPagination
+from src.dependencies import SFilterCursor, SFilterTimeRange
 from src.enums import EventType
+from src.metrics.metrics import observed
 
 logger = logging.getLogger(__name__)
 
@@ -24,27 +68,84 @@ class BaseDAO:
     schema_all_fields = None
 
     @classmethod
-    async def find_all(cls, pagination: SFilterPagination = SFilterPagination(), **filter_by):
+    async def find_all(
+        cls,
+        cursor: SFilterCursor = SFilterCursor(),
+        columns: Sequence[str] | None = None,
+        primary: bool = False,
+        **filter_by,
+    ) -> Tuple[list, str | None]:
+        """
+        Находит и возвращает все записи постранично в порядке первичного ключа. С возможным фильтром.
+        Страницы keyset, как у find_page: глубокая страница стоит столько же, сколько первая.
+        :param cursor: Курсор предыдущей страницы и размер страницы.
+        :param columns: Выбрать только эти колонки, вместо схем вернутся лёгкие строки Row.
+        :param primary: Читать из primary, а не из реплики.
+        :param filter_by: Фильтры для поиска записи.
+        :return: Список объектов schema_all_fields или Row и курсор следующей страницы.
+        """
+        return await cls.find_page(cursor, columns=columns, primary=primary, **filter_by)
+
+    @classmethod
+    @observed
+    async def find_page(
+        cls,
+        cursor: SFilterCursor = SFilterCursor(),
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None,
+        descending: bool = False,
+        where: Sequence = (),
+        primary: bool = False,
+        **filter_by,
+    ) -> Tuple[list, str | None]:
         """
-        Находит и возвращает все записи. С возможным фильтром и пагинацией.
+        Страница записей с keyset-пагинацией: WHERE (ключ сортировки) > (ключ из курсора) вместо OFFSET,
+        поэтому стоимость не зависит от глубины страницы.
+        :param cursor: Курсор предыдущей страницы и размер страницы.
+        :param order_by: Колонки сортировки, по умолчанию первичный ключ. Должны однозначно задавать порядок.
+        :param columns: Выбрать только эти колонки (колонки сортировки добавляются автоматически).
+        :param descending: Сортировка по убыванию, например от новых записей к старым.
+        :param where: Дополнительные условия, например диапазон по времени.
+        :param primary: Читать из primary, а не из реплики.
         :param filter_by: Фильтры для поиска записи.
-        :return: Список объектов schema_all_fields.
+        :return: Список объектов schema_all_fields или Row и курсор следующей страницы (None — страниц больше нет).
         """
+        order_columns = (
+            [getattr(cls.model, name) for name in order_by] if order_by else list(cls.model.__mapper__.primary_key)
+        )
+        if columns is not None:
+            columns = list(dict.fromkeys([*columns, *(column.key for column in order_columns)]))
+        query = cls._select(columns, **filter_by).where(*where)
+        if cursor.cursor:
+            sort_key = tuple_(*order_columns)
+            cursor_key = tuple_(*decode_cursor(cursor.cursor, order_columns))
+            query = query.where(sort_key < cursor_key if descending else sort_key > cursor_key)
+        order = [column.desc() for column in order_columns] if descending else order_columns
+        query = query.order_by(*order).limit(cursor.page_size)
         try:
-            async with async_session_maker() as session:
-                query = (
-                    select(cls.model)
-                    .filter_by(**filter_by)
-                    .limit(pagination.page_size)
-                    .offset((pagination.page - 1) * pagination.page_size)
-                )
-                result = await session.execute(query)
-                instances = result.scalars().all()
-                return [cls.schema_all_fields.model_validate(instance) for instance in instances]
+            async with cls._session_maker(primary)() as session:
+                rows = (await session.execute(query)).all()
         except SQLAlchemyError as e:
-            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при добавлении записи. {e}")
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при поиске записей. {e}")
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записи.{e}")
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при поиске записей.{e}")
+
+        next_cursor = None
+        if len(rows) == cursor.page_size:
+            next_cursor = encode_cursor([rows[-1]._mapping[column.key] for column in order_columns])
+        return cls._build(rows, columns), next_cursor
+
+    @classmethod
+    async def find_ids(cls, limit: int | None = None, primary: bool = False) -> list:
+        """
+        Возвращает id записей (без построения ORM-объектов).
+        :param limit: Максимальное количество id, None — все.
+        :param primary: Читать из primary, а не из реплики.
+        :return: Список id.
+        """
+        async with cls._session_maker(primary)() as session:
+            result = await session.execute(select(cls.model.id).limit(limit))
+            return list(result.scalars().all())
 
     @classmethod
     async def add(cls, db_session_for_transaction=None, **data):
@@ -71,16 +172,18 @@ class BaseDAO:
             raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записи.{e}")
 
     @classmethod
-    async def find_one_or_none(cls, db_session_for_transaction=None, **filter_by):
+    @observed
+    async def find_one_or_none(cls, db_session_for_transaction=None, primary: bool = False, **filter_by):
         """
         Находит и возвращает одну запись по фильтру.
+        :param primary: Без сессии читать из primary, а не из реплики.
         :param filter_by: Фильтры для поиска записи.
         :return: Сам объект schema_all_fields.
         """
         query = select(cls.model).filter_by(**filter_by)
         result = None
         if db_session_for_transaction is None:
-            async with async_session_maker() as session:
+            async with cls._session_maker(primary)() as session:
                 result = await session.execute(query)
         else:
             result = await db_session_for_transaction.execute(query)
@@ -122,6 +225,63 @@ class BaseDAO:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записи.{e}")
 
+    @classmethod
+    @observed
+    async def bulk_add_or_ignore(cls, db_session_for_transaction, rows: List[dict]) -> None:
+        """
+        Добавляет пачку записей через INSERT ... ON CONFLICT DO NOTHING.
+        Уже существующие записи пропускаются.
+        :param rows: Список словарей с данными для добавления.
+        """
+        session = db_session_for_transaction
+        try:
+            for chunk in cls._chunks(rows):
+                await session.execute(insert(cls.model).values(chunk).on_conflict_do_nothing())
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при добавлении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записей.{e}")
+
+    @classmethod
+    def _session_maker(cls, primary: bool = False):
+        """
+        Фабрика сессий для чтения без переданной сессии: по умолчанию реплики по кругу.
+        primary=True — для чтений, которые должны видеть только что записанные данные.
+        """
+        return async_session_maker if primary else read_session_maker
+
+    @classmethod
+    def _select(cls, columns: Sequence[str] | None = None, **filter_by) -> Select:
+        """
+        SELECT колонок таблицы без ORM-сущностей: строки не попадают в identity map сессии.
+        :param columns: Имена колонок, по умолчанию все колонки модели.
+        :param filter_by: Фильтры на равенство.
+        """
+        selected = [getattr(cls.model, name) for name in columns] if columns else cls.model.__table__.columns
+        return select(*selected).where(*(getattr(cls.model, name) == value for name, value in filter_by.items()))
+
+    @classmethod
+    def _build(cls, rows, columns: Sequence[str] | None = None) -> list:
+        """
+        Схемы из строк БД через model_construct — без повторной валидации данных, которые уже прошли ограничения БД.
+        При выборке отдельных колонок строки возвращаются как есть.
+        """
+        if columns:
+            return list(rows)
+        return [cls.schema_all_fields.model_construct(**row._mapping) for row in rows]
+
+    @classmethod
+    def _chunks(cls, rows: List[dict], params_per_row: int | None = None):
+        """
+        Делит пачку так, чтобы число параметров в одном запросе не превышало лимит драйвера.
+        :param params_per_row: Параметров запроса на строку, по умолчанию число полей строки.
+        """
+        if not rows:
+            return
+        chunk_size = max(1, DAOConstant.MAX_QUERY_PARAMS // (params_per_row or len(rows[0])))
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i : i + chunk_size]
+
 
 class WarehouseDAO(BaseDAO):
     model = Warehouse
@@ -137,6 +297,184 @@ class StockItemDAO(BaseDAO):
     model = StockItem
     schema_all_fields = SStockItemAll
 
+    @classmethod
+    @observed
+    async def find_by_key(
+        cls, warehouse_id: uuid.UUID, product_id: uuid.UUID, primary: bool = False
+    ) -> SStockItemAll | None:
+        """
+        Остаток по первичному ключу готовым запросом, без построения ORM-объекта.
+        :param primary: Читать из primary, а не из реплики.
+        """
+        try:
+            async with cls._session_maker(primary)() as session:
+                result = await session.execute(
+                    cls._find_by_key_stmt(), {"warehouse_id": warehouse_id, "product_id": product_id}
+                )
+                rows = result.all()
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при поиске записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при поиске записей.{e}")
+        return cls._build(rows)[0] if rows else None
+
+    @classmethod
+    @cache
+    def _find_by_key_stmt(cls):
+        return cls._select().where(
+            cls.model.warehouse_id == bindparam("warehouse_id"), cls.model.product_id == bindparam("product_id")
+        )
+
+    @classmethod
+    @observed
+    async def find_by_keys(cls, keys: List[Tuple[uuid.UUID, uuid.UUID]], primary: bool = False) -> List[SStockItemAll]:
+        """
+        Находит остатки по списку пар (warehouse_id, product_id) запросом WHERE (warehouse_id, product_id) IN (...).
+        :param keys: Пары (warehouse_id, product_id).
+        :param primary: Читать из primary, а не из реплики.
+        :return: Список найденных объектов SStockItemAll, отсутствующие пары пропускаются.
+        """
+        try:
+            result = []
+            async with cls._session_maker(primary)() as session:
+                for chunk in cls._chunks(keys):
+                    query = cls._select().where(tuple_(cls.model.warehouse_id, cls.model.product_id).in_(chunk))
+                    rows = await session.execute(query)
+                    result.extend(cls._build(rows.all()))
+            return result
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при поиске записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при поиске записей.{e}")
+
+    @classmethod
+    async def stream_by_warehouse(
+        cls, warehouse_id: uuid.UUID, after: uuid.UUID | None = None, primary: bool = False
+    ) -> AsyncIterator[List[SStockItemAll]]:
+        """
+        Все остатки склада из серверного курсора пачками по STREAM_BATCH_SIZE.
+        Память не зависит от числа строк. Ошибки не оборачиваются в HTTPException:
+        к моменту чтения ответ уже начат, их обрабатывает вызывающий код.
+        :param warehouse_id: ID склада.
+        :param after: product_id, после которого продолжить выдачу.
+        :param primary: Читать из primary, а не из реплики.
+        :return: Асинхронный итератор списков SStockItemAll.
+        """
+        async with cls._session_maker(primary)() as session:
+            query = cls._warehouse_stock_query(warehouse_id, after).execution_options(
+                yield_per=DAOConstant.STREAM_BATCH_SIZE
+            )
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield cls._build(rows)
+
+    @classmethod
+    def _warehouse_stock_query(cls, warehouse_id: uuid.UUID, after: uuid.UUID | None):
+        query = cls._select(warehouse_id=warehouse_id)
+        if after is not None:
+            query = query.where(cls.model.product_id > after)
+        return query.order_by(cls.model.product_id)
+
+    @classmethod
+    async def create_missing_for_rebuild(
+        cls, db_session_for_transaction, warehouse_id: uuid.UUID, snapshot: SStockSnapshotAll | None
+    ) -> None:
+        """
+        Создаёт нулевые записи для позиций склада из снимка и журнала движений, у которых записи нет.
+        Такое бывает только при рассинхронизации; без записи позицию нельзя заблокировать перед пересборкой.
+        """
+        session = db_session_for_transaction
+        keys = select(Movement.product_id).where(Movement.warehouse_id == warehouse_id)
+        if snapshot is not None:
+            keys = union(
+                keys.where(Movement.id > snapshot.high_watermark),
+                select(StockSnapshotItem.product_id).where(
+                    StockSnapshotItem.snapshot_id == snapshot.id, StockSnapshotItem.warehouse_id == warehouse_id
+                ),
+            )
+        else:
+            keys = keys.distinct()
+        keys = keys.subquery("keys")
+        try:
+            await session.execute(
+                insert(cls.model)
+                .from_select(
+                    ["warehouse_id", "product_id", "quantity"],
+                    select(literal(warehouse_id, Uuid), keys.c.product_id, literal(0)).order_by(keys.c.product_id),
+                )
+                .on_conflict_do_nothing(index_elements=[cls.model.warehouse_id, cls.model.product_id])
+            )
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при добавлении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записей.{e}")
+
+    @classmethod
+    async def rebuild_warehouse(
+        cls,
+        db_session_for_transaction,
+        warehouse_id: uuid.UUID,
+        snapshot: SStockSnapshotAll | None,
+    ) -> Tuple[int, int]:
+        """
+        Пересчитывает остатки склада из снимка и всех закоммиченных движений после него.
+        Сначала блокирует записи склада в порядке product_id, как и вставка движений: вставка по этим
+        позициям ждёт коммита пересборки и применяет своё изменение уже к пересчитанному остатку,
+        а всё закоммиченное до блокировки видно свёртке. Вставка по другим складам не ждёт.
+        Позиции, появившиеся после блокировки, не трогаются: весь их журнал применила сама вставка.
+        Записываются только изменившиеся остатки, у них растёт version.
+        Позиции, которых нет ни в снимке, ни в движениях после него, обнуляются.
+        :return: (число пересчитанных позиций, число обнулённых позиций).
+        """
+        session = db_session_for_transaction
+        try:
+            result = await session.execute(
+                select(cls.model.product_id)
+                .where(cls.model.warehouse_id == warehouse_id)
+                .order_by(cls.model.product_id)
+                .with_for_update()
+            )
+            locked = bindparam("locked", list(result.scalars().all()), type_=ARRAY(Uuid))
+            final = StockSnapshotDAO.ledger_fold_query(snapshot, None, [warehouse_id]).cte("final")
+
+            updated = (
+                update(cls.model)
+                .where(
+                    cls.model.warehouse_id == final.c.warehouse_id,
+                    cls.model.product_id == final.c.product_id,
+                    cls.model.product_id == any_(locked),
+                    cls.model.quantity != final.c.quantity,
+                )
+                .values(quantity=final.c.quantity, version=cls.model.version + 1)
+                .returning(cls.model.product_id)
+                .cte("updated")
+            )
+            zeroed = (
+                update(cls.model)
+                .where(
+                    cls.model.warehouse_id == warehouse_id,
+                    cls.model.product_id == any_(locked),
+                    cls.model.quantity != 0,
+                    ~exists().where(
+                        final.c.warehouse_id == cls.model.warehouse_id, final.c.product_id == cls.model.product_id
+                    ),
+                )
+                .values(quantity=0, version=cls.model.version + 1)
+                .returning(cls.model.product_id)
+                .cte("zeroed")
+            )
+            result = await session.execute(
+                select(
+                    select(func.count()).select_from(updated).scalar_subquery(),
+                    select(func.count()).select_from(zeroed).scalar_subquery(),
+                )
+            )
+            return tuple(result.one())
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при обновлении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при обновлении записей.{e}")
+
     @classmethod
     async def find_one_or_create_or_update_quantity(
         cls,
@@ -167,17 +505,10 @@ class StockItemDAO(BaseDAO):
                 return cls.schema_all_fields.model_validate(existing)
 
             # Если нет записи — создаём новую
-            initial_quantity = data.quantity if data.event_type == EventType.arrival else 0
-            if data.event_type == EventType.departure and data.quantity > 0:
-                logger.warning(
-                    f"Попытка ухода товара с пустого склада: "
-                    f"product_id={data.product_id}, warehouse_id={data.warehouse_id}, quantity={data.quantity}"
-                )
-
             instance = cls.model(
                 warehouse_id=data.warehouse_id,
                 product_id=data.product_id,
-                quantity=initial_quantity,
+                quantity=cls._calculate_initial_quantity(data),
             )
             session.add(instance)
             await session.flush()
@@ -188,20 +519,776 @@ class StockItemDAO(BaseDAO):
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при обновлении stock_item: {e}")
 
+    @classmethod
+    @observed
+    async def upsert_quantity(
+        cls,
+        db_session_for_transaction,
+        data: SStockItemUpdate,
+    ) -> SStockItemAll:
+        """
+        Создаёт запись или изменяет количество товара одним запросом:
+        INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + delta WHERE quantity + delta >= 0 RETURNING.
+        RETURNING отдаёт несрезанный quantity + delta по актуальной строке. Если уход превышает остаток,
+        строка не обновляется, но остаётся заблокированной, и вторым запросом остаток обнуляется с предупреждением.
+        :param data: Изменение количества (из Kafka)
+        :return: Объект SStockItemAll
+        """
+        session = db_session_for_transaction
+        delta = data.quantity if data.event_type == EventType.arrival else -data.quantity
+        params = {"warehouse_id": data.warehouse_id, "product_id": data.product_id}
+        try:
+            result = await session.execute(
+                cls._upsert_quantity_stmt(), {**params, "delta": delta, "initial_quantity": max(delta, 0)}
+            )
+            row = result.one_or_none()
+
+            if row is None:
+                row = (await session.execute(cls._clamp_quantity_stmt(), params)).one()
+                cls._calculate_quantity(
+                    row.old_quantity, data.quantity, data.event_type, data.product_id, data.warehouse_id
+                )
+            elif row.version == 1:
+                # version 1 только у только что созданной записи
+                cls._calculate_initial_quantity(data)
+
+            return cls.schema_all_fields.model_validate(row)
+
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка БД при изменении stock_item: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при обновлении stock_item: {e}")
+
+    @classmethod
+    @cache
+    def _upsert_quantity_stmt(cls):
+        """Строится один раз, значения передаются параметрами warehouse_id, product_id, delta, initial_quantity"""
+        delta = bindparam("delta", type_=Integer)
+        stmt = insert(cls.model).values(
+            warehouse_id=bindparam("warehouse_id", type_=Uuid),
+            product_id=bindparam("product_id", type_=Uuid),
+            quantity=bindparam("initial_quantity", type_=Integer),
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[cls.model.warehouse_id, cls.model.product_id],
+            set_={"quantity": cls.model.quantity + delta, "version": cls.model.version + 1},
+            where=cls.model.quantity + delta >= 0,
+        ).returning(cls.model.warehouse_id, cls.model.product_id, cls.model.quantity, cls.model.version)
+
+    @classmethod
+    @cache
+    def _clamp_quantity_stmt(cls):
+        """
+        Обнуляет остаток, строка уже заблокирована запросом _upsert_quantity_stmt. Подзапрос в RETURNING
+        видит остаток до обнуления: снимок нового запроса включает все изменения до блокировки.
+        """
+        warehouse_id = bindparam("warehouse_id", type_=Uuid)
+        product_id = bindparam("product_id", type_=Uuid)
+        key = (cls.model.warehouse_id == warehouse_id, cls.model.product_id == product_id)
+        old = select(cls.model.quantity).where(*key).scalar_subquery()
+        return (
+            update(cls.model)
+            .where(*key)
+            .values(quantity=0, version=cls.model.version + 1)
+            .returning(
+                cls.model.warehouse_id,
+                cls.model.product_id,
+                cls.model.quantity,
+                cls.model.version,
+                old.label("old_quantity"),
+            )
+        )
+
+    @classmethod
+    @observed
+    async def bulk_update_quantity(
+        cls,
+        db_session_for_transaction,
+        items: List[SStockItemUpdate],
+    ) -> List[SStockItemAll]:
+        """
+        Применяет пачку изменений количества товара, схлопывая их по ключу (warehouse_id, product_id).
+        Для ключа считаются сумма изменений net и минимум её префиксных сумм min_prefix.
+        GREATEST(quantity + net, net - min_prefix) совпадает с последовательным применением событий
+        с обрезанием остатка до нуля, поэтому каждая строка обновляется и блокируется один раз за пачку.
+        :param items: Изменения количества (из Kafka) в порядке поступления
+        :return: Список итоговых SStockItemAll
+        """
+        session = db_session_for_transaction
+        if not items:
+            return []
+        try:
+            deltas = cls._coalesce_deltas(items)
+            keys = sorted(deltas)
+
+            stock_items: List[SStockItemAll] = []
+            for chunk in cls._chunks(
+                [
+                    {"warehouse_id": warehouse_id, "product_id": product_id, "quantity": max(net, net - min_prefix)}
+                    for warehouse_id, product_id in keys
+                    for net, min_prefix in [deltas[(warehouse_id, product_id)]]
+                ]
+            ):
+                result = await session.execute(
+                    insert(cls.model)
+                    .values(chunk)
+                    .on_conflict_do_nothing()
+                    .returning(cls.model.warehouse_id, cls.model.product_id, cls.model.quantity, cls.model.version)
+                )
+                stock_items.extend(cls.schema_all_fields.model_validate(row) for row in result)
+
+            created = {(item.warehouse_id, item.product_id) for item in stock_items}
+            for warehouse_id, product_id in created:
+                net, min_prefix = deltas[(warehouse_id, product_id)]
+                if min_prefix < 0:
+                    logger.warning(
+                        f"Попытка ухода товара с пустого склада: "
+                        f"product_id={product_id}, warehouse_id={warehouse_id}, min_prefix={min_prefix}"
+                    )
+
+            existing = [key for key in keys if key not in created]
+            for chunk in cls._chunks(
+                [
+                    {"warehouse_id": warehouse_id, "product_id": product_id, "net": net, "min_prefix": min_prefix}
+                    for warehouse_id, product_id in existing
+                    for net, min_prefix in [deltas[(warehouse_id, product_id)]]
+                ]
+            ):
+                result = await session.execute(cls._update_quantity_by_deltas_stmt(chunk))
+                for row in result:
+                    if row.old_quantity + deltas[(row.warehouse_id, row.product_id)][1] < 0:
+                        logger.warning(
+                            f"Уход товара превысит остаток: "
+                            f"{row.old_quantity} + ({deltas[(row.warehouse_id, row.product_id)][1]}) < 0 "
+                            f"(product_id={row.product_id}, warehouse_id={row.warehouse_id})"
+                        )
+                    stock_items.append(cls.schema_all_fields.model_validate(row))
+
+            return stock_items
+
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка БД при изменении stock_item: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при обновлении stock_item: {e}")
+
+    @classmethod
+    def _coalesce_deltas(cls, items: List[SStockItemUpdate]) -> Dict[Tuple, Tuple[int, int]]:
+        """
+        Схлопывает изменения по ключу в порядке поступления.
+        :return: {(warehouse_id, product_id): (net, min_prefix)}
+        """
+        deltas: Dict[Tuple, Tuple[int, int]] = {}
+        for item in items:
+            key = (item.warehouse_id, item.product_id)
+            delta = item.quantity if item.event_type == EventType.arrival else -item.quantity
+            if key in deltas:
+                net, min_prefix = deltas[key]
+                deltas[key] = (net + delta, min(min_prefix, net + delta))
+            else:
+                deltas[key] = (delta, delta)
+        return deltas
+
+    @classmethod
+    def _update_quantity_by_deltas_stmt(cls, rows: List[dict]):
+        """
+        UPDATE ... FROM (SELECT ... FOR UPDATE) ... RETURNING.
+        Подзапрос блокирует строки в порядке ключа и отдаёт остаток до обновления.
+        """
+        deltas = values(
+            column("warehouse_id", Uuid),
+            column("product_id", Uuid),
+            column("net", Integer),
+            column("min_prefix", Integer),
+            name="deltas",
+        ).data([(row["warehouse_id"], row["product_id"], row["net"], row["min_prefix"]) for row in rows])
+        locked = (
+            select(cls.model.warehouse_id, cls.model.product_id, cls.model.quantity, deltas.c.net, deltas.c.min_prefix)
+            .join(
+                deltas,
+                and_(
+                    cls.model.warehouse_id == deltas.c.warehouse_id,
+                    cls.model.product_id == deltas.c.product_id,
+                ),
+            )
+            .order_by(cls.model.warehouse_id, cls.model.product_id)
+            .with_for_update(of=cls.model)
+            .subquery("locked")
+        )
+        return (
+            update(cls.model)
+            .where(
+                cls.model.warehouse_id == locked.c.warehouse_id,
+                cls.model.product_id == locked.c.product_id,
+            )
+            .values(
+                quantity=func.greatest(locked.c.quantity + locked.c.net, locked.c.net - locked.c.min_prefix),
+                version=cls.model.version + 1,
+            )
+            .returning(
+                cls.model.warehouse_id,
+                cls.model.product_id,
+                cls.model.quantity,
+                cls.model.version,
+                locked.c.quantity.label("old_quantity"),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def _calculate_initial_quantity(cls, data: SStockItemUpdate) -> int:
+        if data.event_type == EventType.departure and data.quantity > 0:
+            logger.warning(
+                f"Попытка ухода товара с пустого склада: "
+                f"product_id={data.product_id}, warehouse_id={data.warehouse_id}, quantity={data.quantity}"
+            )
+        return data.quantity if data.event_type == EventType.arrival else 0
+
     @classmethod
     def _update_quantity(cls, existing: StockItem, quantity: int, event_type: EventType):
+        existing.quantity = cls._calculate_quantity(
+            existing.quantity, quantity, event_type, existing.product_id, existing.warehouse_id
+        )
+        existing.version += 1
+
+    @classmethod
+    def _calculate_quantity(cls, current: int, quantity: int, event_type: EventType, product_id, warehouse_id) -> int:
         if event_type == EventType.arrival:
-            existing.quantity += quantity
-        elif event_type == EventType.departure:
-            if existing.quantity - quantity < 0:
-                logger.warning(
-                    f"Уход товара превысит остаток: "
-                    f"{existing.quantity} - {quantity} < 0 "
-                    f"(product_id={existing.product_id}, warehouse_id={existing.warehouse_id})"
-                )
-            existing.quantity = max(0, existing.quantity - quantity)
+            return current + quantity
+        if current - quantity < 0:
+            logger.warning(
+                f"Уход товара превысит остаток: "
+                f"{current} - {quantity} < 0 "
+                f"(product_id={product_id}, warehouse_id={warehouse_id})"
+            )
+        return max(0, current - quantity)
 
 
 class MovementDAO(BaseDAO):
     model = Movement
     schema_all_fields = SMovementAll
+
+    @classmethod
+    @observed
+    async def add_new_legs(cls, db_session_for_transaction, rows: List[dict]) -> List[SMovementAll]:
+        """
+        Добавляет движения, событие (movement_id, event_type) которых ещё не принималось.
+        Событие сначала занимается в movement_leg, движение вставляется только для занятых в том же запросе:
+        повторная доставка не добавляет движение, даже если timestamp у неё другой.
+        Из повторов внутри пачки остаётся первое. Движения получают id в порядке rows.
+        :param rows: Движения в порядке поступления.
+        :return: Действительно добавленные движения.
+        """
+        session = db_session_for_transaction
+        first: Dict[Tuple, dict] = {}
+        for row in rows:
+            first.setdefault((row["movement_id"], row["event_type"]), row)
+        rows = list(first.values())
+
+        table = cls.model.__table__
+        names = ["movement_id", "warehouse_id", "timestamp", "quantity", "event_type", "product_id"]
+        inserted = []
+        try:
+            # movement_leg — 3 параметра на строку, VALUES для movement — 7
+            for chunk in cls._chunks(rows, params_per_row=10):
+                claimed = (
+                    insert(MovementLeg)
+                    .values(
+                        [
+                            {
+                                "movement_id": row["movement_id"],
+                                "event_type": row["event_type"],
+                                "timestamp": row["timestamp"],
+                            }
+                            for row in chunk
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                    .returning(MovementLeg.movement_id, MovementLeg.event_type)
+                    .cte("claimed")
+                )
+                new = values(
+                    *(column(name, table.c[name].type) for name in names),
+                    column("position", Integer),
+                    name="new",
+                ).data([(*(row[name] for name in names), position) for position, row in enumerate(chunk)])
+                stmt = (
+                    insert(cls.model)
+                    .from_select(
+                        names,
+                        select(*(new.c[name] for name in names))
+                        .join(
+                            claimed,
+                            and_(claimed.c.movement_id == new.c.movement_id, claimed.c.event_type == new.c.event_type),
+                        )
+                        .order_by(new.c.position),
+                    )
+                    .returning(*table.columns)
+                )
+                result = await session.execute(stmt)
+                inserted.extend(cls._build(result.all()))
+            return inserted
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при добавлении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записей.{e}")
+
+    @classmethod
+    async def find_history(
+        cls, cursor: SFilterCursor, time_range: SFilterTimeRange, primary: bool = False, **filter_by
+    ) -> Tuple[List[SMovementAll], str | None]:
+        """
+        История перемещений от новых к старым с keyset-пагинацией по (timestamp, id).
+        Под фильтры по warehouse_id и product_id есть индексы (поле, timestamp, id).
+        :param cursor: Курсор предыдущей страницы и размер страницы.
+        :param time_range: Полуинтервал [timestamp_from, timestamp_to).
+        :param primary: Читать из primary, а не из реплики.
+        :param filter_by: warehouse_id или product_id.
+        :return: Список SMovementAll и курсор следующей страницы.
+        """
+        where = []
+        if time_range.timestamp_from is not None:
+            where.append(cls.model.timestamp >= time_range.timestamp_from)
+        if time_range.timestamp_to is not None:
+            where.append(cls.model.timestamp < time_range.timestamp_to)
+        return await cls.find_page(
+            cursor, order_by=["timestamp", "id"], descending=True, where=where, primary=primary, **filter_by
+        )
+
+
+class MovementPairDAO(BaseDAO):
+    model = MovementPair
+    schema_all_fields = SMovementPairAll
+
+    @classmethod
+    @observed
+    async def find_by_movement_id(cls, movement_id: uuid.UUID, primary: bool = False) -> SMovementPairAll | None:
+        """
+        Перемещение по movement_id готовым запросом, без построения ORM-объекта.
+        :param primary: Читать из primary, а не из реплики.
+        """
+        try:
+            async with cls._session_maker(primary)() as session:
+                rows = (await session.execute(cls._find_by_movement_id_stmt(), {"movement_id": movement_id})).all()
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при поиске записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при поиске записей.{e}")
+        return cls._build(rows)[0] if rows else None
+
+    @classmethod
+    @cache
+    def _find_by_movement_id_stmt(cls):
+        return cls._select().where(cls.model.movement_id == bindparam("movement_id"))
+
+    @classmethod
+    @observed
+    async def upsert_legs(cls, db_session_for_transaction, movements: List[SMovementAll]) -> None:
+        """
+        Записывает отправку и/или приёмку в проекцию movement_pair одной строкой на movement_id.
+        Пришедшая сторона дополняет уже сохранённую, разница во времени и количестве
+        пересчитывается, когда известны обе стороны.
+        :param movements: Только что добавленные записи movement.
+        """
+        session = db_session_for_transaction
+        pairs: Dict[uuid.UUID, dict] = {}
+        for movement in movements:
+            pair = pairs.setdefault(movement.movement_id, cls._empty_pair(movement))
+            prefix = "departure" if movement.event_type == EventType.departure else "arrival"
+            pair[f"{prefix}_id"] = movement.id
+            pair[f"{prefix}_at"] = movement.timestamp
+            pair[f"{prefix}_quantity"] = movement.quantity
+            pair["sender_warehouse" if prefix == "departure" else "recipient_warehouse"] = movement.warehouse_id
+
+        for pair in pairs.values():
+            if pair["departure_at"] is not None and pair["arrival_at"] is not None:
+                pair["time_diff"] = pair["arrival_at"] - pair["departure_at"]
+                pair["diff_in_quantity"] = pair["arrival_quantity"] - pair["departure_quantity"]
+
+        try:
+            # Одинаковый порядок блокировок во всех воркерах исключает взаимные блокировки
+            rows = [pairs[key] for key in sorted(pairs)]
+            for chunk in cls._chunks(rows):
+                await session.execute(cls._upsert_legs_stmt(chunk))
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при обновлении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при обновлении записей.{e}")
+
+    @classmethod
+    def _empty_pair(cls, movement: SMovementAll) -> dict:
+        pair = {column.key: None for column in cls.model.__table__.columns}
+        pair["movement_id"] = movement.movement_id
+        pair["product_id"] = movement.product_id
+        return pair
+
+    @classmethod
+    def _upsert_legs_stmt(cls, rows: List[dict]):
+        stmt = insert(cls.model).values(rows)
+        table = cls.model.__table__
+        merged = {
+            column.key: func.coalesce(stmt.excluded[column.key], column)
+            for column in table.columns
+            if column.key not in ("movement_id", "product_id", "time_diff", "diff_in_quantity")
+        }
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.movement_id],
+            set_={
+                **merged,
+                "time_diff": merged["arrival_at"] - merged["departure_at"],
+                "diff_in_quantity": merged["arrival_quantity"] - merged["departure_quantity"],
+            },
+        )
+
+
+class StockSnapshotDAO(BaseDAO):
+    model = StockSnapshot
+    schema_all_fields = SStockSnapshotAll
+
+    @classmethod
+    async def lock_high_watermark(cls, db_session_for_transaction) -> int:
+        """
+        Блокирует запись в movement до конца транзакции и возвращает последний выданный movement.id.
+        SHARE дожидается всех транзакций, уже вставивших движения, поэтому все id не больше результата
+        закоммичены или откатены, а новые движения получат id больше.
+        """
+        session = db_session_for_transaction
+        await session.execute(text("LOCK TABLE movement IN SHARE MODE"))
+        result = await session.execute(
+            text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM movement_id_seq")
+        )
+        return result.scalar_one()
+
+    @classmethod
+    async def find_latest(cls, db_session_for_transaction) -> SStockSnapshotAll | None:
+        result = await db_session_for_transaction.execute(cls._select().order_by(cls.model.id.desc()).limit(1))
+        rows = result.all()
+        return cls._build(rows)[0] if rows else None
+
+    @classmethod
+    async def create(
+        cls, db_session_for_transaction, base: SStockSnapshotAll | None, high_watermark: int
+    ) -> SStockSnapshotAll:
+        """
+        Новый снимок: предыдущий снимок плюс движения с id в (base.high_watermark, high_watermark].
+        :param base: Предыдущий снимок или None — тогда остатки считаются по всем движениям.
+        """
+        session = db_session_for_transaction
+        try:
+            result = await session.execute(
+                insert(cls.model).values(high_watermark=high_watermark).returning(*cls.model.__table__.columns)
+            )
+            snapshot = cls._build(result.all())[0]
+            final = cls.ledger_fold_query(base, high_watermark).subquery()
+            await session.execute(
+                insert(StockSnapshotItem).from_select(
+                    ["snapshot_id", "warehouse_id", "product_id", "quantity"],
+                    select(literal(snapshot.id), final.c.warehouse_id, final.c.product_id, final.c.quantity).where(
+                        final.c.quantity != 0
+                    ),
+                )
+            )
+            return snapshot
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при добавлении записи. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записи.{e}")
+
+    @classmethod
+    async def delete_old(cls, db_session_for_transaction, keep: int) -> None:
+        """Удаляет все снимки, кроме keep последних"""
+        latest = select(cls.model.id).order_by(cls.model.id.desc()).limit(keep).scalar_subquery()
+        await db_session_for_transaction.execute(delete(cls.model).where(cls.model.id.not_in(latest)))
+
+    @classmethod
+    def ledger_fold_query(
+        cls,
+        snapshot: SStockSnapshotAll | None,
+        high_watermark: int | None,
+        warehouse_ids: List[uuid.UUID] | None = None,
+    ) -> Select:
+        """
+        Остатки (warehouse_id, product_id, quantity) после применения к снимку движений
+        с id в (snapshot.high_watermark, high_watermark] в порядке id, при high_watermark=None —
+        всех движений после снимка, видимых запросу.
+        Каждое движение применяется как max(остаток + delta, 0), поэтому для ключа достаточно
+        net = S_n и min_prefix = min(S_1..S_n) по префиксным суммам S_k:
+        итог = max(начальный + net, net - min_prefix).
+        """
+        delta = case((Movement.event_type == EventType.arrival, Movement.quantity), else_=-Movement.quantity)
+        deltas = select(
+            Movement.warehouse_id,
+            Movement.product_id,
+            delta.label("delta"),
+            func.sum(delta)
+            .over(partition_by=(Movement.warehouse_id, Movement.product_id), order_by=Movement.id)
+            .label("prefix"),
+        ).where(Movement.warehouse_id.is_not(None))
+        if high_watermark is not None:
+            deltas = deltas.where(Movement.id <= high_watermark)
+        base = select(StockSnapshotItem.warehouse_id, StockSnapshotItem.product_id, StockSnapshotItem.quantity)
+        if snapshot is not None:
+            deltas = deltas.where(Movement.id > snapshot.high_watermark)
+            base = base.where(StockSnapshotItem.snapshot_id == snapshot.id)
+        else:
+            base = base.where(false())
+        if warehouse_ids is not None:
+            deltas = deltas.where(Movement.warehouse_id.in_(warehouse_ids))
+            base = base.where(StockSnapshotItem.warehouse_id.in_(warehouse_ids))
+        deltas = deltas.subquery("deltas")
+        base = base.subquery("base")
+
+        changes = (
+            select(
+                deltas.c.warehouse_id,
+                deltas.c.product_id,
+                func.sum(deltas.c.delta).label("net"),
+                func.min(deltas.c.prefix).label("min_prefix"),
+            )
+            .group_by(deltas.c.warehouse_id, deltas.c.product_id)
+            .subquery("changes")
+        )
+        quantity = case(
+            (changes.c.net.is_(None), base.c.quantity),
+            else_=func.greatest(
+                func.coalesce(base.c.quantity, 0) + changes.c.net, changes.c.net - changes.c.min_prefix
+            ),
+        )
+        return select(
+            func.coalesce(changes.c.warehouse_id, base.c.warehouse_id).label("warehouse_id"),
+            func.coalesce(changes.c.product_id, base.c.product_id).label("product_id"),
+            quantity.cast(Integer).label("quantity"),
+        ).select_from(
+            changes.join(
+                base,
+                and_(changes.c.warehouse_id == base.c.warehouse_id, changes.c.product_id == base.c.product_id),
+                full=True,
+            )
+        )
+
+
+class StockCheckpointDAO(BaseDAO):
+    model = StockCheckpoint
+    # нижняя граница, когда у позиции ещё нет контрольной точки
+    _MIN_TIMESTAMP = literal("-infinity").cast(DateTime(timezone=True))
+
+    @classmethod
+    @observed
+    async def quantity_as_of(
+        cls, warehouse_id: uuid.UUID, product_id: uuid.UUID, as_of: datetime, primary: bool = False
+    ) -> int | None:
+        """
+        Остаток позиции на момент as_of: последняя контрольная точка не позже as_of
+        плюс движения позиции после неё до as_of включительно в порядке (timestamp, id).
+        Обе части читаются по индексам, поэтому стоимость зависит от числа движений
+        между контрольными точками, а не от длины всей истории.
+        :param primary: Читать из primary, а не из реплики.
+        :return: Остаток или None, если ни контрольных точек, ни движений до as_of нет.
+        """
+        checkpoint = (
+            select(cls.model.timestamp, cls.model.quantity)
+            .where(
+                cls.model.warehouse_id == warehouse_id,
+                cls.model.product_id == product_id,
+                cls.model.timestamp <= as_of,
+            )
+            .order_by(cls.model.timestamp.desc())
+            .limit(1)
+            .cte("checkpoint")
+        )
+        delta = case((Movement.event_type == EventType.arrival, Movement.quantity), else_=-Movement.quantity)
+        deltas = (
+            select(
+                delta.label("delta"),
+                func.sum(delta).over(order_by=(Movement.timestamp, Movement.id)).label("prefix"),
+            )
+            .where(
+                Movement.warehouse_id == warehouse_id,
+                Movement.product_id == product_id,
+                Movement.timestamp <= as_of,
+                Movement.timestamp
+                > func.coalesce(select(checkpoint.c.timestamp).scalar_subquery(), cls._MIN_TIMESTAMP),
+            )
+            .subquery("deltas")
+        )
+        query = select(
+            select(checkpoint.c.quantity).scalar_subquery().label("base"),
+            func.sum(deltas.c.delta).label("net"),
+            func.min(deltas.c.prefix).label("min_prefix"),
+        ).select_from(deltas)
+        try:
+            async with cls._session_maker(primary)() as session:
+                base, net, min_prefix = (await session.execute(query)).one()
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при поиске записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при поиске записей.{e}")
+
+        if net is None:
+            return base
+        return max((base or 0) + net, net - min_prefix)
+
+    @classmethod
+    async def create(
+        cls,
+        db_session_for_transaction,
+        last_run: SStockCheckpointRunAll | None,
+        high_watermark: int,
+        checkpoint_at: datetime,
+    ) -> int:
+        """
+        Контрольные точки на checkpoint_at для позиций, у которых после прошлого прохода появились движения:
+        новые id (в том числе пришедшие задним числом) или timestamp в (last_run.checkpoint_at, checkpoint_at].
+        Остаток считается от последней контрольной точки позиции тем же max(остаток + delta, 0).
+        Блокировка movement не нужна: движение с timestamp до checkpoint_at, закоммиченное после подсчёта,
+        удаляет устаревшую точку само (delete_stale) или через delete_stale_between после коммита прохода.
+        :return: Число записанных контрольных точек.
+        """
+        session = db_session_for_transaction
+        keys = select(Movement.warehouse_id, Movement.product_id).where(
+            Movement.id <= high_watermark,
+            Movement.warehouse_id.is_not(None),
+            Movement.timestamp <= checkpoint_at,
+        )
+        if last_run is not None:
+            keys = union(
+                keys.where(Movement.id > last_run.high_watermark),
+                keys.where(Movement.timestamp > last_run.checkpoint_at),
+            )
+        keys = keys.cte("keys")
+
+        base = (
+            select(cls.model.timestamp, cls.model.quantity)
+            .where(
+                cls.model.warehouse_id == keys.c.warehouse_id,
+                cls.model.product_id == keys.c.product_id,
+                cls.model.timestamp <= checkpoint_at,
+            )
+            .order_by(cls.model.timestamp.desc())
+            .limit(1)
+            .lateral("base")
+        )
+        delta = case((Movement.event_type == EventType.arrival, Movement.quantity), else_=-Movement.quantity)
+        deltas = (
+            select(
+                keys.c.warehouse_id,
+                keys.c.product_id,
+                base.c.quantity.label("base"),
+                delta.label("delta"),
+                func.sum(delta)
+                .over(partition_by=(keys.c.warehouse_id, keys.c.product_id), order_by=(Movement.timestamp, Movement.id))
+                .label("prefix"),
+            )
+            .select_from(keys)
+            .outerjoin(base, true())
+            .join(
+                Movement,
+                and_(
+                    Movement.warehouse_id == keys.c.warehouse_id,
+                    Movement.product_id == keys.c.product_id,
+                    Movement.timestamp > func.coalesce(base.c.timestamp, cls._MIN_TIMESTAMP),
+                    Movement.timestamp <= checkpoint_at,
+                ),
+            )
+            .subquery("deltas")
+        )
+        net = func.sum(deltas.c.delta)
+        quantity = func.greatest(func.coalesce(func.max(deltas.c.base), 0) + net, net - func.min(deltas.c.prefix))
+        stmt = insert(cls.model).from_select(
+            ["warehouse_id", "product_id", "timestamp", "quantity"],
+            select(deltas.c.warehouse_id, deltas.c.product_id, literal(checkpoint_at), quantity.cast(Integer)).group_by(
+                deltas.c.warehouse_id, deltas.c.product_id
+            ),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.model.warehouse_id, cls.model.product_id, cls.model.timestamp],
+            set_={"quantity": stmt.excluded.quantity},
+        )
+        try:
+            result = await session.execute(stmt)
+            return result.rowcount
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при добавлении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при добавлении записей.{e}")
+
+    @classmethod
+    async def delete_stale_between(cls, db_session_for_transaction, after_id: int, up_to_id: int) -> int:
+        """
+        delete_stale для движений с id в (after_id, up_to_id]: их транзакции могли выполнить delete_stale
+        до коммита контрольных точек и не увидеть их. Все такие id уже закоммичены
+        (up_to_id из StockSnapshotDAO.lock_high_watermark).
+        :return: Число удалённых контрольных точек.
+        """
+        try:
+            result = await db_session_for_transaction.execute(
+                delete(cls.model).where(
+                    Movement.id > after_id,
+                    Movement.id <= up_to_id,
+                    Movement.warehouse_id == cls.model.warehouse_id,
+                    Movement.product_id == cls.model.product_id,
+                    cls.model.timestamp >= Movement.timestamp,
+                )
+            )
+            return result.rowcount
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при удалении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при удалении записей.{e}")
+
+    @classmethod
+    @observed
+    async def delete_stale(cls, db_session_for_transaction, movements: List[SMovementAll]) -> None:
+        """
+        Удаляет контрольные точки, которые не учли только что добавленные движения:
+        для позиции — все с timestamp не раньше самого раннего из её новых движений.
+        Обычно движения приходят по порядку и запрос ничего не удаляет.
+        :param movements: Только что добавленные записи movement.
+        """
+        session = db_session_for_transaction
+        earliest: Dict[Tuple[uuid.UUID, uuid.UUID], datetime] = {}
+        for movement in movements:
+            if movement.warehouse_id is None:
+                continue
+            key = (movement.warehouse_id, movement.product_id)
+            earliest[key] = min(earliest.get(key, movement.timestamp), movement.timestamp)
+
+        try:
+            # Одинаковый порядок блокировок во всех воркерах исключает взаимные блокировки
+            rows = [
+                {"warehouse_id": key[0], "product_id": key[1], "timestamp": earliest[key]} for key in sorted(earliest)
+            ]
+            for chunk in cls._chunks(rows):
+                stale = values(
+                    column("warehouse_id", Uuid),
+                    column("product_id", Uuid),
+                    column("timestamp", DateTime(timezone=True)),
+                    name="stale",
+                ).data([(row["warehouse_id"], row["product_id"], row["timestamp"]) for row in chunk])
+                await session.execute(
+                    delete(cls.model).where(
+                        cls.model.warehouse_id == stale.c.warehouse_id,
+                        cls.model.product_id == stale.c.product_id,
+                        cls.model.timestamp >= stale.c.timestamp,
+                    )
+                )
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка базы данных при удалении записей. {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Неизвестная ошибка при удалении записей.{e}")
+
+
+class StockCheckpointRunDAO(BaseDAO):
+    model = StockCheckpointRun
+    schema_all_fields = SStockCheckpointRunAll
+
+    @classmethod
+    async def find_latest(cls, db_session_for_transaction) -> SStockCheckpointRunAll | None:
+        result = await db_session_for_transaction.execute(cls._select().order_by(cls.model.id.desc()).limit(1))
+        rows = result.all()
+        return cls._build(rows)[0] if rows else None
+
+    @classmethod
+    async def create(cls, db_session_for_transaction, high_watermark: int, checkpoint_at: datetime) -> None:
+        await db_session_for_transaction.execute(
+            insert(cls.model).values(high_watermark=high_watermark, checkpoint_at=checkpoint_at)
+        )
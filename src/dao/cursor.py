@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Непрозрачный курсор из значений ключа сортировки последней записи страницы.
+    :param values: Значения колонок сортировки в порядке ORDER BY.
+    :return: Строка base64url.
+    """
+    payload = json.dumps([_to_json(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """
+    Восстанавливает значения ключа сортировки из курсора с приведением к python-типам колонок.
+    :param cursor: Строка из encode_cursor.
+    :param columns: Колонки сортировки в порядке ORDER BY.
+    :return: Список значений для сравнения tuple_(*columns) > tuple_(*values).
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(columns):
+            raise ValueError("число значений не совпадает с ключом сортировки")
+        return [_from_json(value, column.type.python_type) for value, column in zip(values, columns)]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный курсор пагинации. {e}")
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (int, str)) or value is None:
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _from_json(value: Any, python_type: type) -> Any:
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    return python_type(value)
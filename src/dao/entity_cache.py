@@ -0,0 +1,39 @@
+import uuid
+from collections import OrderedDict
+
+from src.constant import EntityCacheConstant
+
+
+class KnownEntityCache:
+    """
+    Ограниченный по размеру LRU-набор id сущностей, которые уже точно есть в БД.
+    Склады и товары не удаляются, поэтому попадание в кэш позволяет не делать запрос.
+    """
+
+    def __init__(self, max_size: int = EntityCacheConstant.MAX_SIZE):
+        self.max_size = max_size
+        self._ids: OrderedDict[uuid.UUID, None] = OrderedDict()
+
+    def __contains__(self, entity_id: uuid.UUID) -> bool:
+        if entity_id in self._ids:
+            self._ids.move_to_end(entity_id)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, *entity_ids: uuid.UUID) -> None:
+        """Добавить id. Вызывать только после коммита транзакции, в которой запись создана."""
+        for entity_id in entity_ids:
+            self._ids[entity_id] = None
+            self._ids.move_to_end(entity_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+
+known_warehouses = KnownEntityCache()
+known_products = KnownEntityCache()
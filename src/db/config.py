@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic_settings import BaseSettings
 
 
@@ -9,6 +11,22 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
+    # реплики для чтения через запятую, host или host:port, учётные данные и база те же, что у primary.
+    # Без реплик чтение идёт в primary через пул записи
+    DB_READ_REPLICAS: str = ""
+    # пулы соединений: запись — на процесс, чтение — на каждую реплику
+    DB_WRITE_POOL_SIZE: int = 20
+    DB_WRITE_MAX_OVERFLOW: int = 20
+    DB_READ_POOL_SIZE: int = 20
+    DB_READ_MAX_OVERFLOW: int = 20
+    # prepared statements asyncpg на соединение; за PgBouncer в режиме transaction их нужно отключить
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    DB_PGBOUNCER: bool = False
+
+    # месячные партиции movement: сколько месяцев создавать заранее и сколько хранить в БД
+    MOVEMENT_PARTITIONS_AHEAD: int = 3
+    MOVEMENT_RETENTION_MONTHS: int = 12
+    MOVEMENT_ARCHIVE_DIR: str = "archive/movement"
 
     REDIS_HOST: str
     REDIS_PORT: int
@@ -18,6 +36,16 @@ class Settings(BaseSettings):
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def READ_DATABASE_URLS(self) -> List[str]:
+        urls = []
+        for replica in filter(None, (item.strip() for item in self.DB_READ_REPLICAS.split(","))):
+            host, _, port = replica.partition(":")
+            urls.append(
+                f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{host}:{port or self.DB_PORT}/{self.DB_NAME}"
+            )
+        return urls
+
     @property
     def TEST_DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
@@ -1,3 +1,6 @@
+import itertools
+import time
+import uuid
 from typing import Annotated
 
 from fastapi import Depends
@@ -6,22 +9,101 @@ from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.db.config import settings
+from src.metrics.metrics import DB_POOL_CHECKOUT, DB_POOL_CONNECTIONS, registry
+
+
+def _connect_args() -> dict:
+    """
+    asyncpg готовит каждый запрос и кэширует prepared statement на соединении по тексту SQL.
+    PgBouncer в режиме transaction отдаёт транзакции разные серверные соединения, поэтому там кэши
+    отключаются, а имена prepared statements делаются уникальными.
+    """
+    if settings.DB_PGBOUNCER:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет ожидание свободного соединения в db_pool_checkout_seconds"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT.labels(self.logging_name).observe(time.perf_counter() - started)
+
 
 ASYNC_DATABASE_PARAMS = {
-    "poolclass": AsyncAdaptedQueuePool,
-    "pool_size": 20,
-    "max_overflow": 20,
+    "poolclass": TimedAsyncAdaptedQueuePool,
     "pool_timeout": 30,
+    "connect_args": _connect_args(),
 }
 
-_engine_async = create_async_engine(settings.DATABASE_URL, **ASYNC_DATABASE_PARAMS)
+# primary: запись и чтения, которым нужны только что записанные данные
+_engine_async = create_async_engine(
+    settings.DATABASE_URL,
+    pool_logging_name="write",
+    pool_size=settings.DB_WRITE_POOL_SIZE,
+    max_overflow=settings.DB_WRITE_MAX_OVERFLOW,
+    **ASYNC_DATABASE_PARAMS,
+)
 async_session_maker = async_sessionmaker(_engine_async, class_=AsyncSession, expire_on_commit=False)
 
+# реплики для чтения, соединения открываются при первом запросе; без реплик чтения идут через пул primary
+_read_engines_async = [
+    create_async_engine(
+        url,
+        pool_logging_name=f"read-{number}",
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=settings.DB_READ_MAX_OVERFLOW,
+        **ASYNC_DATABASE_PARAMS,
+    )
+    for number, url in enumerate(settings.READ_DATABASE_URLS)
+]
+
+
+class RoundRobinSessionMaker:
+    """Фабрика сессий, которая раздаёт сессии реплик по кругу"""
+
+    def __init__(self, engines):
+        self._session_makers = itertools.cycle(
+            [async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False) for engine in engines]
+        )
+
+    def __call__(self) -> AsyncSession:
+        return next(self._session_makers)()
+
+
+read_session_maker = RoundRobinSessionMaker(_read_engines_async) if _read_engines_async else async_session_maker
+
+
+def _collect_pool_metrics():
+    for engine in (_engine_async, *_read_engines_async):
+        pool = engine.pool
+        DB_POOL_CONNECTIONS.labels(pool.logging_name, "checked_out").set(pool.checkedout())
+        DB_POOL_CONNECTIONS.labels(pool.logging_name, "idle").set(pool.checkedin())
+        DB_POOL_CONNECTIONS.labels(pool.logging_name, "overflow").set(max(pool.overflow(), 0))
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
+async def dispose_engines():
+    await _engine_async.dispose()
+    for engine in _read_engines_async:
+        await engine.dispose()
+
 
 async def get_async_session() -> AsyncSession:
     async with async_session_maker() as session:
         yield session
 
+
 AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
 
 
@@ -1,8 +1,18 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 
-from sqlalchemy import CheckConstraint, DateTime, ForeignKey, String, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    CheckConstraint,
+    DateTime,
+    ForeignKey,
+    Index,
+    Interval,
+    String,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -31,20 +41,115 @@ class StockItem(Base):
     warehouse_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("warehouse.id"), primary_key=True)
     product_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("product.id"), primary_key=True)
     quantity: Mapped[int] = mapped_column(default=0)
+    # растёт при каждом изменении quantity, защищает кэш от перезаписи устаревшим значением
+    version: Mapped[int] = mapped_column(BigInteger, default=1, server_default="1")
 
 
 class Movement(Base):
     __tablename__ = "movement"
     __table_args__ = (
         CheckConstraint("quantity >= 0", name="check_quantity_non_negative"),
-        UniqueConstraint("movement_id", "event_type", name="uq_movement_id_event_type"),
+        # ключ партиционирования timestamp обязан входить в первичный ключ и уникальные ограничения
+        UniqueConstraint("movement_id", "event_type", "timestamp", name="uq_movement_id_event_type_timestamp"),
+        # история по складу и товару: фильтр по полю, сортировка и keyset по (timestamp, id)
+        Index("ix_movement_warehouse_id_timestamp_id", "warehouse_id", "timestamp", "id"),
+        Index("ix_movement_product_id_timestamp_id", "product_id", "timestamp", "id"),
+        # движения одной позиции после контрольной точки для остатка на момент времени
+        Index("ix_movement_warehouse_id_product_id_timestamp_id", "warehouse_id", "product_id", "timestamp", "id"),
+        # записи добавляются по времени, BRIN по timestamp почти ничего не весит
+        Index("ix_movement_timestamp_brin", "timestamp", postgresql_using="brin"),
+        # месячные партиции movement_pYYYYMM, см. src/db/partitions.py
+        {"postgresql_partition_by": "RANGE (timestamp)"},
     )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     movement_id: Mapped[uuid.UUID] = mapped_column()
     warehouse_id: Mapped[Optional[uuid.UUID]] = mapped_column()
-    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
     quantity: Mapped[int] = mapped_column(default=0)
     event_type: Mapped[EventType] = mapped_column(ENUM(EventType))
 
     product_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("product.id"))
+
+
+# Принятые события перемещений. Дубли отсекаются здесь, а не в movement: уникальные ограничения movement
+# обязаны включать timestamp, и повторное событие с другим timestamp прошло бы как новое
+class MovementLeg(Base):
+    __tablename__ = "movement_leg"
+    __table_args__ = (Index("ix_movement_leg_timestamp", "timestamp"),)
+
+    movement_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    event_type: Mapped[EventType] = mapped_column(ENUM(EventType), primary_key=True)
+    # timestamp первого принятого события, по нему записи удаляются вместе с партицией movement
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+# Выгруженные в архив и удалённые партиции movement: их движения в журнале больше не участвуют
+class MovementArchive(Base):
+    __tablename__ = "movement_archive"
+
+    partition_name: Mapped[str] = mapped_column(String, primary_key=True)
+    # наибольший movement.id в партиции, None для пустой
+    max_movement_id: Mapped[Optional[int]] = mapped_column(BigInteger)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+# Проекция movement: отправка и приёмка одного перемещения в одной строке, обновляется при обработке событий
+class MovementPair(Base):
+    __tablename__ = "movement_pair"
+
+    movement_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    product_id: Mapped[uuid.UUID] = mapped_column()
+
+    departure_id: Mapped[Optional[int]] = mapped_column()
+    sender_warehouse: Mapped[Optional[uuid.UUID]] = mapped_column()
+    departure_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    departure_quantity: Mapped[Optional[int]] = mapped_column()
+
+    arrival_id: Mapped[Optional[int]] = mapped_column()
+    recipient_warehouse: Mapped[Optional[uuid.UUID]] = mapped_column()
+    arrival_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    arrival_quantity: Mapped[Optional[int]] = mapped_column()
+
+    # заполняются, когда известны обе стороны
+    time_diff: Mapped[Optional[timedelta]] = mapped_column(Interval)
+    diff_in_quantity: Mapped[Optional[int]] = mapped_column()
+
+
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshot"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # последний movement.id, учтённый в снимке; все меньшие id на момент снимка уже закоммичены
+    high_watermark: Mapped[int] = mapped_column(BigInteger)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+# Остатки на момент снимка, нулевые не хранятся
+class StockSnapshotItem(Base):
+    __tablename__ = "stock_snapshot_item"
+
+    snapshot_id: Mapped[int] = mapped_column(ForeignKey("stock_snapshot.id", ondelete="CASCADE"), primary_key=True)
+    warehouse_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    product_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    quantity: Mapped[int] = mapped_column()
+
+
+# Остаток позиции на момент timestamp: учтены все движения с timestamp не больше этого.
+# Движение, пришедшее задним числом, удаляет контрольные точки позиции не раньше своего timestamp
+class StockCheckpoint(Base):
+    __tablename__ = "stock_checkpoint"
+
+    warehouse_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    product_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    quantity: Mapped[int] = mapped_column()
+
+
+# Проходы построения контрольных точек: следующий проход берёт только позиции с движениями id > high_watermark
+class StockCheckpointRun(Base):
+    __tablename__ = "stock_checkpoint_run"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    high_watermark: Mapped[int] = mapped_column(BigInteger)
+    checkpoint_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
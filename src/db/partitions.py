@@ -0,0 +1,275 @@
+"""
+Обслуживание месячных партиций movement.
+
+    python -m src.db.partitions                  # один проход
+    python -m src.db.partitions --interval 3600  # проход раз в час до SIGTERM/SIGINT
+
+Создаёт партиции за весь срок хранения MOVEMENT_RETENTION_MONTHS и на MOVEMENT_PARTITIONS_AHEAD месяцев вперёд,
+партиции для опоздавших и пришедших из будущего событий создаются при записи. Партиции старше
+MOVEMENT_RETENTION_MONTHS отсоединяются без блокировки записи, выгружаются в gzip CSV в MOVEMENT_ARCHIVE_DIR
+и удаляются целиком вместо DELETE по строкам. Удалённые партиции записываются в movement_archive,
+принятые события их месяцев удаляются из movement_leg.
+"""
+
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+import signal
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List, Set, Tuple
+
+from sqlalchemy import text
+
+from src.db.config import settings
+from src.db.database import _engine_async, async_session_maker
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME_RE = re.compile(r"^movement_p(\d{4})(\d{2})$")
+
+# Партиции movement_pYYYYMM, включая отсоединённые, и их состояние
+LIST_PARTITIONS_SQL = """
+SELECT c.relname,
+       CASE WHEN i.inhrelid IS NULL THEN 'detached'
+            WHEN i.inhdetachpending THEN 'detach_pending'
+            ELSE 'attached' END
+FROM pg_class c
+LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'movement'::regclass
+WHERE c.relkind = 'r'
+  AND c.relnamespace = current_schema()::regnamespace
+  AND c.relname ~ '^movement_p[0-9]{6}$'
+ORDER BY c.relname
+"""
+
+# Партиция существует и присоединена к movement: отсоединённая при архивации ещё может лежать в схеме
+PARTITION_ATTACHED_SQL = """
+SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhparent = 'movement'::regclass AND inhrelid = to_regclass(:name))
+"""
+
+RECORD_ARCHIVED_SQL = """
+INSERT INTO movement_archive (partition_name, max_movement_id)
+SELECT :name, max(id) FROM "{name}"
+ON CONFLICT (partition_name) DO NOTHING
+"""
+
+# Принятые события удалённых движений: повторная доставка события старше срока хранения не ожидается
+DELETE_ARCHIVED_LEGS_SQL = """
+DELETE FROM movement_leg WHERE timestamp >= :month_start AND timestamp < :next_month_start
+"""
+
+ARCHIVED_AFTER_SQL = """
+SELECT partition_name FROM movement_archive WHERE max_movement_id > :high_watermark ORDER BY partition_name
+"""
+
+
+class MovementPartitions:
+    # месяцы (год, месяц) не раньше срока хранения, партиции которых точно есть
+    _known_months: Set[Tuple[int, int]] = set()
+
+    @classmethod
+    async def ensure(
+        cls,
+        months_ahead: int = settings.MOVEMENT_PARTITIONS_AHEAD,
+        retention_months: int = settings.MOVEMENT_RETENTION_MONTHS,
+    ) -> int:
+        """
+        Создаёт недостающие партиции за срок хранения и на months_ahead месяцев вперёд:
+        опоздавшее событие за любой ещё не архивируемый месяц попадает в свою партицию.
+        :return: Число созданных партиций.
+        """
+        now = datetime.now(timezone.utc)
+        first_month = _retention_cutoff(now, retention_months)
+        last_month = _add_months(partition_month(now), months_ahead)
+        async with async_session_maker() as session:
+            async with session.begin():
+                created = await session.scalar(
+                    text("SELECT movement_ensure_partitions(:from_ts, :to_ts)"),
+                    {"from_ts": _month_start(first_month), "to_ts": _month_start(last_month)},
+                )
+        month = first_month
+        while month <= last_month:
+            cls._known_months.add(month)
+            month = _add_months(month, 1)
+        if created:
+            logger.info(f"Создано партиций movement: {created}")
+        return created
+
+    @classmethod
+    async def ensure_for(
+        cls, timestamps: Iterable[datetime], retention_months: int = settings.MOVEMENT_RETENTION_MONTHS
+    ) -> Set[Tuple[int, int]]:
+        """
+        Создаёт партиции для месяцев событий, которых ещё нет, например для событий из будущего.
+        Обычно все месяцы уже известны, и запросов к БД нет.
+        Месяцы раньше срока хранения не создаются: их партиции выгружены в архив или будут выгружены.
+        :return: Месяцы (год, месяц) без партиции — движения за них записать нельзя.
+        """
+        cutoff = _retention_cutoff(datetime.now(timezone.utc), retention_months)
+        # месяц из кэша мог с тех пор выйти за срок хранения и быть выгружен другим процессом
+        months = {partition_month(timestamp) for timestamp in timestamps}
+        months = {month for month in months if month < cutoff or month not in cls._known_months}
+        if not months:
+            return set()
+
+        missing = set()
+        async with async_session_maker() as session:
+            async with session.begin():
+                for month in sorted(months):
+                    if month >= cutoff:
+                        await session.scalar(
+                            text("SELECT movement_ensure_partitions(:from_ts, :to_ts)"),
+                            {"from_ts": _month_start(month), "to_ts": _month_start(month)},
+                        )
+                        cls._known_months.add(month)
+                    # партиция старше срока хранения может ещё не быть выгружена, но в кэш не попадает
+                    elif not await session.scalar(
+                        text(PARTITION_ATTACHED_SQL), {"name": f"movement_p{month[0]:04d}{month[1]:02d}"}
+                    ):
+                        missing.add(month)
+        return missing
+
+    @classmethod
+    async def archive_expired(
+        cls,
+        retention_months: int = settings.MOVEMENT_RETENTION_MONTHS,
+        archive_dir: str = settings.MOVEMENT_ARCHIVE_DIR,
+    ) -> List[str]:
+        """
+        Архивирует и удаляет партиции, целиком лежащие раньше текущего месяца минус retention_months.
+        Каждый шаг можно повторить: прерванное отсоединение завершается, отсоединённая,
+        но не выгруженная партиция выгружается при следующем запуске.
+        :return: Имена удалённых партиций.
+        """
+        cutoff = _retention_cutoff(datetime.now(timezone.utc), retention_months)
+
+        archived = []
+        for name, state in await cls._list_partitions():
+            year, month = PARTITION_NAME_RE.match(name).groups()
+            if (int(year), int(month)) >= cutoff:
+                continue
+            if state != "detached":
+                await cls._execute_autocommit(
+                    f'ALTER TABLE movement DETACH PARTITION "{name}" '
+                    + ("FINALIZE" if state == "detach_pending" else "CONCURRENTLY")
+                )
+            path = await cls._dump(name, Path(archive_dir))
+            await cls._drop_archived(name)
+            logger.info(f"Партиция {name} выгружена в {path} и удалена")
+            archived.append(name)
+        return archived
+
+    @classmethod
+    async def archived_after(cls, high_watermark: int) -> List[str]:
+        """
+        Удалённые при архивации партиции с движениями id > high_watermark: остатки, собранные
+        из снимка с этим high_watermark и журнала движений, без них неверны.
+        """
+        async with async_session_maker() as session:
+            result = await session.execute(text(ARCHIVED_AFTER_SQL), {"high_watermark": high_watermark})
+            return list(result.scalars().all())
+
+    @classmethod
+    async def _drop_archived(cls, name: str) -> None:
+        """
+        Удаляет выгруженную партицию и в той же транзакции записывает её в movement_archive
+        и удаляет принятые события её месяца из movement_leg.
+        """
+        year, month = PARTITION_NAME_RE.match(name).groups()
+        month = (int(year), int(month))
+        async with async_session_maker() as session:
+            async with session.begin():
+                await session.execute(text(RECORD_ARCHIVED_SQL.format(name=name)), {"name": name})
+                await session.execute(
+                    text(DELETE_ARCHIVED_LEGS_SQL),
+                    {"month_start": _month_start(month), "next_month_start": _month_start(_add_months(month, 1))},
+                )
+                await session.execute(text(f'DROP TABLE "{name}"'))
+
+    @classmethod
+    async def _list_partitions(cls) -> List[Tuple[str, str]]:
+        """Партиции movement_pYYYYMM, включая отсоединённые: (имя, attached | detach_pending | detached)"""
+        async with async_session_maker() as session:
+            result = await session.execute(text(LIST_PARTITIONS_SQL))
+            return [(name, state) for name, state in result.all()]
+
+    @classmethod
+    async def _dump(cls, name: str, archive_dir: Path) -> Path:
+        """Выгружает таблицу через COPY в gzip CSV. Файл появляется под итоговым именем только целиком."""
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        path = archive_dir / f"{name}.csv.gz"
+        tmp_path = archive_dir / f"{name}.csv.gz.tmp"
+        async with _engine_async.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            with gzip.open(tmp_path, "wb") as file:
+                await raw_connection.driver_connection.copy_from_table(name, output=file, format="csv", header=True)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    async def _execute_autocommit(cls, statement: str) -> None:
+        """DETACH ... CONCURRENTLY нельзя выполнять внутри транзакции"""
+        async with _engine_async.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(statement))
+
+
+def partition_month(timestamp: datetime) -> Tuple[int, int]:
+    """Месяц партиции (год, месяц) в UTC, время без зоны считается UTC"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.year, timestamp.month
+
+
+def _add_months(month: Tuple[int, int], count: int) -> Tuple[int, int]:
+    months = month[0] * 12 + month[1] - 1 + count
+    return months // 12, months % 12 + 1
+
+
+def _month_start(month: Tuple[int, int]) -> datetime:
+    return datetime(month[0], month[1], 1, tzinfo=timezone.utc)
+
+
+def _retention_cutoff(now: datetime, retention_months: int) -> Tuple[int, int]:
+    """Первый хранимый месяц: партиции раньше него архивируются"""
+    return _add_months(partition_month(now), -retention_months)
+
+
+async def run_maintenance(interval: int | None = None) -> None:
+    """Один проход обслуживания или проходы раз в interval секунд до отмены"""
+    while True:
+        try:
+            await MovementPartitions.ensure()
+            await MovementPartitions.archive_expired()
+        except Exception as e:
+            if interval is None:
+                raise
+            logger.error(f"Ошибка обслуживания партиций movement: {e}")
+        if interval is None:
+            return
+        await asyncio.sleep(interval)
+
+
+async def _main(interval: int | None) -> None:
+    task = asyncio.create_task(run_maintenance(interval))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info("Обслуживание партиций movement остановлено")
+    finally:
+        await _engine_async.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=int, default=None, help="Период повторения в секундах")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main(args.interval))
@@ -1,9 +1,10 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List
 
 from pydantic import BaseModel, Field
 
+from src.constant import StockLookupConstant
 from src.enums import EventType
 from src.kafka.constants import KafkaConstant
 
@@ -55,6 +56,8 @@ class SWarehouseAll(SIdUUIDMixin):
 
 
 class SStockItemAll(SWarehouseIdUUIDMixin, SProductIdUUIDMixin, SQuantityMixin):
+    version: int = 1
+
     model_config = {"from_attributes": True}
 
 
@@ -69,6 +72,21 @@ class SMovementAll(SMovementIdMixin, SWarehouseIdUUIDMixin, SProductIdUUIDMixin,
     model_config = {"from_attributes": True}
 
 
+class SMovementPairAll(SMovementIdMixin, SProductIdUUIDMixin):
+    departure_id: int | None = None
+    sender_warehouse: uuid.UUID | None = None
+    departure_at: datetime | None = None
+    departure_quantity: int | None = None
+    arrival_id: int | None = None
+    recipient_warehouse: uuid.UUID | None = None
+    arrival_at: datetime | None = None
+    arrival_quantity: int | None = None
+    time_diff: timedelta | None = None
+    diff_in_quantity: int | None = None
+
+    model_config = {"from_attributes": True}
+
+
 class SMovementStat(BaseModel):
     sender_warehouse: uuid.UUID
     recipient_warehouse: uuid.UUID
@@ -86,6 +104,60 @@ class SGetMovementByIdResult(BaseModel):
 
 
 class SGetProductWarehouseByIdResult(BaseModel):
-    product_quantity: int = Field(0, ge=0)
+    product_quantity: int | None = Field(0, ge=0)
+
+    model_config = {"from_attributes": True}
+
+
+class SStockLookupKey(SWarehouseIdUUIDMixin, SProductIdUUIDMixin):
+    model_config = {"from_attributes": True}
+
+
+class SWarehouseStockLookupRequest(BaseModel):
+    product_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=StockLookupConstant.MAX_KEYS)
+
+
+class SStockLookupRequest(BaseModel):
+    items: List[SStockLookupKey] = Field(..., min_length=1, max_length=StockLookupConstant.MAX_KEYS)
+
+
+class SStockLookupItem(SWarehouseIdUUIDMixin, SProductIdUUIDMixin):
+    product_quantity: int | None = None
+
+    model_config = {"from_attributes": True}
+
+
+class SStockLookupResult(BaseModel):
+    items: List[SStockLookupItem] = []
+
+    model_config = {"from_attributes": True}
+
+
+class SStockPage(BaseModel):
+    items: List[SStockItemAll] = []
+    next_cursor: str | None = None
+
+    model_config = {"from_attributes": True}
+
+
+class SMovementPage(BaseModel):
+    items: List[SMovementAll] = []
+    next_cursor: str | None = None
+
+    model_config = {"from_attributes": True}
+
+
+class SStockSnapshotAll(BaseModel):
+    id: int
+    high_watermark: int
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class SStockCheckpointRunAll(BaseModel):
+    id: int
+    high_watermark: int
+    checkpoint_at: datetime
 
     model_config = {"from_attributes": True}
@@ -1,12 +1,21 @@
+from datetime import datetime
 from typing import Annotated
 
 from fastapi import Depends
 from pydantic import BaseModel, Field
 
 
-class SFilterPagination(BaseModel):
-    page: int = Field(1, ge=1, description="Номер страницы для пагинации")
+class SFilterCursor(BaseModel):
+    cursor: str | None = Field(None, description="Курсор из ответа предыдущей страницы, пусто — первая страница")
     page_size: int = Field(20, ge=1, le=100, description="Количество элементов на странице, максимум 100")
 
 
-PaginationDep = Annotated[SFilterPagination, Depends(SFilterPagination)]
+CursorDep = Annotated[SFilterCursor, Depends(SFilterCursor)]
+
+
+class SFilterTimeRange(BaseModel):
+    timestamp_from: datetime | None = Field(None, description="Начало интервала включительно")
+    timestamp_to: datetime | None = Field(None, description="Конец интервала не включительно")
+
+
+TimeRangeDep = Annotated[SFilterTimeRange, Depends(SFilterTimeRange)]
@@ -10,6 +10,22 @@ class KafkaSettings(BaseSettings):
     KAFKA_BOOTSTRAP_SERVERS: str
     KAFKA_TOPIC: str = "stock-events"
     KAFKA_CONSUMER_GROUP: str = "default-group"
+    KAFKA_DECODER: str = "pydantic"
+
+    # False — API запускается без consumer, сообщения читает src.kafka.worker
+    KAFKA_CONSUMER_ENABLED: bool = True
+    KAFKA_WORKER_PROCESSES: int = 1
+
+    KAFKA_BATCH_MODE: bool = False
+    # пачка getmany делится между воркерами по ключу: транзакция на воркер, около MAX_RECORDS / воркеров сообщений
+    KAFKA_BATCH_MAX_RECORDS: int = 500
+    KAFKA_BATCH_MAX_WAIT_MS: int = 200
+
+    KAFKA_COMMIT_INTERVAL_MS: int = 5000
+    KAFKA_COMMIT_EVERY: int = 1000
+
+    # порт /metrics воркера N — KAFKA_METRICS_PORT + N; 0 — не отдавать метрики
+    KAFKA_METRICS_PORT: int = 0
 
     class Config:
         env_file = ".env"
@@ -1,5 +1,12 @@
 class KafkaConstant:
     MAX_CONCURRENT_TASKS = 20
+    WORKER_QUEUE_SIZE = 100
     RERUN_KAFKA_SLEEP = 5
+    WORKER_STOP_TIMEOUT = 30
+    # пауза перед повторной обработкой сообщений после ошибки, удваивается до RETRY_BACKOFF_MAX
+    RETRY_BACKOFF = 0.5
+    RETRY_BACKOFF_MAX = 30
+    # после стольких попыток сообщения пропускаются с записью в лог, примерно 8 минут повторов
+    MAX_ATTEMPTS = 20
 
     PATTERN_FOR_SOURCE_FIELD = r"^WH-\d{4}$"
@@ -1,23 +1,33 @@
 import asyncio
-import json
 import logging
-from typing import Awaitable, Callable
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
 
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener, ConsumerRecord, TopicPartition
+from aiokafka.errors import KafkaError
 
 from src.kafka.config import kafka_settings
 from src.kafka.constants import KafkaConstant
-from src.kafka.handlers import limited_handle_message
+from src.kafka.decoders import get_decoder
+from src.kafka.dispatcher import KeyOrderedDispatcher
+from src.kafka.handlers import handle_batch, handle_message, is_permanent_error, message_key
+from src.kafka.offsets import OffsetTracker
+from src.metrics.metrics import KAFKA_CONSUMER_LAG, KAFKA_MESSAGES
 
 logger = logging.getLogger(__name__)
 
 
-def safe_json_deserializer(m):
-    try:
-        return json.loads(m.decode("utf-8"))
-    except Exception as e:
-        logger.error(f"❌ Ошибка при десериализации JSON: {e}. Raw: {m}")
-        return None
+class OffsetCommitRebalanceListener(ConsumerRebalanceListener):
+    """Перед отзывом партиций дожидается обработки принятых сообщений и коммитит оффсеты"""
+
+    def __init__(self, service: "KafkaConsumerService"):
+        self.service = service
+
+    async def on_partitions_revoked(self, revoked):
+        await self.service.flush(revoked)
+
+    async def on_partitions_assigned(self, assigned):
+        pass
 
 
 class KafkaConsumerService:
@@ -27,17 +37,52 @@ class KafkaConsumerService:
         bootstrap_servers: str,
         group_id: str,
         value_deserializer: Callable,
-        handler: Callable[[dict], Awaitable[None]],
+        handler: Callable[[Any], Awaitable[None]],
+        batch_handler: Callable[[List[Any]], Awaitable[None]] | None = None,
+        batch_max_records: int = kafka_settings.KAFKA_BATCH_MAX_RECORDS,
+        batch_max_wait_ms: int = kafka_settings.KAFKA_BATCH_MAX_WAIT_MS,
+        key_func: Callable[[Any], Hashable] = message_key,
+        workers: int = KafkaConstant.MAX_CONCURRENT_TASKS,
+        worker_queue_size: int = KafkaConstant.WORKER_QUEUE_SIZE,
+        commit_interval_ms: int = kafka_settings.KAFKA_COMMIT_INTERVAL_MS,
+        commit_every: int = kafka_settings.KAFKA_COMMIT_EVERY,
         rerun_delay: int = KafkaConstant.RERUN_KAFKA_SLEEP,
+        retry_backoff: float = KafkaConstant.RETRY_BACKOFF,
+        retry_backoff_max: float = KafkaConstant.RETRY_BACKOFF_MAX,
+        max_attempts: int = KafkaConstant.MAX_ATTEMPTS,
+        is_permanent: Callable[[BaseException], bool] = is_permanent_error,
+        consumer_factory: Callable[..., AIOKafkaConsumer] = AIOKafkaConsumer,
     ):
         self.topic = topic
         self.bootstrap_servers = bootstrap_servers
         self.group_id = group_id
         self.value_deserializer = value_deserializer
         self.handler = handler
+        self.batch_handler = batch_handler
+        self.batch_max_records = batch_max_records
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self.key_func = key_func
+        self.workers = workers
+        self.worker_queue_size = worker_queue_size
+        self.commit_interval_ms = commit_interval_ms
+        self.commit_every = commit_every
         self.rerun_delay = rerun_delay
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.max_attempts = max_attempts
+        self.is_permanent = is_permanent
+        # в бенчмарках вместо брокера подставляется consumer в памяти с тем же интерфейсом
+        self.consumer_factory = consumer_factory
         self.stop_event = asyncio.Event()
+        self.consume_finished = asyncio.Event()
+        self.consume_finished.set()
         self.consumer: AIOKafkaConsumer | None = None
+        self.dispatcher: KeyOrderedDispatcher | None = None
+        self.offsets: OffsetTracker | None = None
+        # повторы обработки прекращаются для всех сообщений или для сообщений отзываемых партиций
+        self._abandon_retries = False
+        self._revoked: Set[TopicPartition] = set()
+        self._retry_wakeup = asyncio.Event()
 
     async def start(self):
         """Запуск consumer с автоматическим перезапуском при сбоях"""
@@ -51,28 +96,182 @@ class KafkaConsumerService:
 
     async def _consume(self):
         """Подключение и чтение сообщений"""
-        self.consumer = AIOKafkaConsumer(
-            self.topic,
+        self.consume_finished.clear()
+        self._abandon_retries = False
+        self._revoked.clear()
+        self._retry_wakeup.clear()
+        self.consumer = self.consumer_factory(
             bootstrap_servers=self.bootstrap_servers,
             group_id=self.group_id,
             value_deserializer=self.value_deserializer,
-            enable_auto_commit=True,
+            enable_auto_commit=False,
             auto_offset_reset="earliest",
         )
-        await self.consumer.start()
-        logger.info(f"Kafka consumer listening to topic: {self.topic}")
-
+        self.consumer.subscribe([self.topic], listener=OffsetCommitRebalanceListener(self))
+        self.offsets = OffsetTracker(self.commit_interval_ms, self.commit_every)
+        self.dispatcher = KeyOrderedDispatcher(
+            handler=self._process,
+            workers=self.workers,
+            queue_size=self.worker_queue_size,
+        )
         try:
-            async for msg in self.consumer:
-                asyncio.create_task(self.handler(msg.value))
+            await self.consumer.start()
+            logger.info(f"Kafka consumer listening to topic: {self.topic}")
+
+            self.dispatcher.start()
+            await self._consume_loop(self.dispatcher)
         finally:
+            self._interrupt_retries()
+            await self.dispatcher.stop()
+            await self._commit()
             await self.consumer.stop()
+            self.consume_finished.set()
+
+    async def _consume_loop(self, dispatcher: KeyOrderedDispatcher):
+        """
+        Чтение сообщений через getmany и раздача воркерам по ключу.
+        В пакетном режиме каждый воркер получает свою часть пачки целиком, и пачка из getmany
+        обрабатывается не одной транзакцией, а до workers транзакций параллельно. Так сохраняется
+        порядок по ключу, ошибка одной части не откатывает остальные, а запросы частей
+        к БД идут параллельно. Цена — транзакция в среднем в workers раз меньше пачки. Если нужны крупные
+        транзакции, KAFKA_BATCH_MAX_RECORDS увеличивается пропорционально числу воркеров. Разбиение
+        по партициям Kafka не подходит: ключи одной партиции обрабатывались бы последовательно.
+        Пока очереди воркеров заполнены, чтение партиций приостанавливается.
+        """
+        while not self.stop_event.is_set():
+            self._apply_backpressure(dispatcher)
+
+            records = await self.consumer.getmany(
+                timeout_ms=self.batch_max_wait_ms,
+                max_records=self.batch_max_records,
+            )
+            messages = [msg for partition_messages in records.values() for msg in partition_messages]
+            self._observe_lag(records)
+            for msg in messages:
+                self.offsets.track(TopicPartition(msg.topic, msg.partition), msg.offset)
+
+            if self.batch_handler is None:
+                for msg in messages:
+                    await dispatcher.submit(dispatcher.worker_for(self.key_func(msg.value)), [msg])
+            else:
+                batches = defaultdict(list)
+                for msg in messages:
+                    batches[dispatcher.worker_for(self.key_func(msg.value))].append(msg)
+                for worker, batch in batches.items():
+                    await dispatcher.submit(worker, batch)
+
+            if self.offsets.should_commit():
+                await self._commit()
+
+    def _observe_lag(self, records: Dict[TopicPartition, List[ConsumerRecord]]):
+        """Отставание по партициям: сколько сообщений в партиции после последнего прочитанного"""
+        for tp, partition_messages in records.items():
+            highwater = self.consumer.highwater(tp)
+            if highwater is not None and partition_messages:
+                KAFKA_CONSUMER_LAG.labels(tp.topic, tp.partition).set(highwater - partition_messages[-1].offset - 1)
+
+    async def _process(self, records: List[ConsumerRecord]):
+        """
+        Обработка сообщений воркером. Оффсеты отмечаются обработанными только после успешной обработки.
+        При ошибке обработка повторяется с нарастающей паузой: очередь воркера тем временем заполняется,
+        и чтение партиций приостанавливается. При остановке consumer или отзыве партиции повторы прекращаются,
+        оффсет остаётся незакоммиченным, и сообщения будут прочитаны снова.
+        Неисправимая ошибка (is_permanent) или max_attempts неудачных попыток — сообщения пропускаются:
+        они пишутся в лог с партицией и оффсетом, оффсеты отмечаются обработанными.
+        Повторная обработка не меняет остатки дважды: уже записанные движения пропускаются.
+        """
+        delay = self.retry_backoff
+        attempt = 1
+        while True:
+            try:
+                if self.batch_handler is None:
+                    await self.handler(records[0].value)
+                else:
+                    await self.batch_handler([msg.value for msg in records])
+                break
+            except Exception as e:
+                if self._retries_abandoned(records):
+                    logger.warning(f"🟡 Сообщения не обработаны, оффсеты не коммитятся до повторного чтения: {e}")
+                    return
+                if self.is_permanent(e) or attempt >= self.max_attempts:
+                    self._drop(records, "неисправимая ошибка" if self.is_permanent(e) else f"попыток: {attempt}", e)
+                    break
+                logger.warning(f"🟡 Ошибка обработки {len(records)} сообщений, повтор через {delay} сек: {e}")
+                try:
+                    await asyncio.wait_for(self._retry_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, self.retry_backoff_max)
+                attempt += 1
+
+        for msg in records:
+            self.offsets.done(TopicPartition(msg.topic, msg.partition), msg.offset)
+
+    def _drop(self, records: List[ConsumerRecord], reason: str, error: Exception):
+        """Пропускает сообщения, которые не удалось обработать: по партиции и оффсету их можно прочитать снова"""
+        KAFKA_MESSAGES.labels("dropped").inc(len(records))
+        for msg in records:
+            logger.error(
+                f"🔴 Сообщение {msg.topic}[{msg.partition}]@{msg.offset} пропущено ({reason}): {error}. "
+                f"Value: {msg.value}"
+            )
+
+    def _retries_abandoned(self, records: List[ConsumerRecord]) -> bool:
+        return self._abandon_retries or any(
+            TopicPartition(msg.topic, msg.partition) in self._revoked for msg in records
+        )
+
+    def _interrupt_retries(self, partitions: List[TopicPartition] | None = None):
+        """Прекращает повторы обработки всех сообщений или только сообщений партиций partitions"""
+        if partitions is None:
+            self._abandon_retries = True
+        else:
+            self._revoked.update(partitions)
+        self._retry_wakeup.set()
+
+    async def _commit(self, partitions: List[TopicPartition] | None = None):
+        """Коммит обработанных оффсетов"""
+        offsets: Dict[TopicPartition, int] = self.offsets.offsets_to_commit(partitions)
+        if not offsets:
+            return
+        try:
+            await self.consumer.commit(offsets)
+            self.offsets.mark_committed(offsets)
+        except KafkaError as e:
+            logger.warning(f"🟡 Не удалось закоммитить оффсеты {offsets}: {e}")
+
+    async def flush(self, partitions: List[TopicPartition] | None = None):
+        """
+        Дожидается обработки принятых сообщений и коммитит оффсеты партиций.
+        Сообщения отзываемых партиций, которые не удалось обработать, не повторяются: их прочитает новый владелец.
+        """
+        if partitions is not None:
+            self._interrupt_retries(partitions)
+        await self.dispatcher.join()
+        await self._commit(partitions)
+        if partitions is not None:
+            self.offsets.forget(partitions)
+            self._revoked.difference_update(partitions)
+            if not self._revoked and not self._abandon_retries:
+                self._retry_wakeup.clear()
+
+    def _apply_backpressure(self, dispatcher: KeyOrderedDispatcher):
+        """Ставит партиции на паузу при заполненных очередях и снимает паузу, когда они разгрузились"""
+        paused = self.consumer.paused()
+        if dispatcher.is_saturated():
+            if not paused:
+                logger.info("⏸ Очереди воркеров заполнены, чтение Kafka приостановлено")
+            self.consumer.pause(*self.consumer.assignment())
+        elif paused and dispatcher.is_drained():
+            logger.info("▶️ Очереди воркеров разгружены, чтение Kafka возобновлено")
+            self.consumer.resume(*paused)
 
     async def stop(self):
-        """Остановка consumer"""
+        """Остановка consumer: принятые сообщения дообрабатываются, оффсеты коммитятся"""
         self.stop_event.set()
-        if self.consumer:
-            await self.consumer.stop()
+        # воркер, который повторяет обработку, не освобождает очередь — чтение не дошло бы до stop_event
+        self._interrupt_retries()
+        await self.consume_finished.wait()
         logger.info("🛑 Kafka consumer остановлен")
 
 
@@ -80,13 +279,7 @@ consumer_service = KafkaConsumerService(
     topic=kafka_settings.KAFKA_TOPIC,
     bootstrap_servers=kafka_settings.KAFKA_BOOTSTRAP_SERVERS,
     group_id=kafka_settings.KAFKA_CONSUMER_GROUP,
-    value_deserializer=safe_json_deserializer,
-    handler=limited_handle_message,
+    value_deserializer=get_decoder(kafka_settings.KAFKA_DECODER),
+    handler=handle_message,
+    batch_handler=handle_batch if kafka_settings.KAFKA_BATCH_MODE else None,
 )
-
-if __name__ == "__main__":
-    # запуск как воркера, отдельно
-    try:
-        asyncio.run(consumer_service.start())
-    finally:
-        asyncio.run(consumer_service.stop())
@@ -0,0 +1,100 @@
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Annotated, Any, Callable, Dict
+
+from src.constant import ModelFieldConstant
+from src.enums import EventType
+from src.kafka.constants import KafkaConstant
+from src.kafka.schemas import SKafkaMessageAll
+
+logger = logging.getLogger(__name__)
+
+# msgspec проверяет pattern через re.search, где "$" допускает перевод строки в конце, а регулярные выражения
+# pydantic — нет. "\Z" совпадает только с концом строки.
+MSGSPEC_SOURCE_PATTERN = KafkaConstant.PATTERN_FOR_SOURCE_FIELD.removesuffix("$") + r"\Z"
+
+
+def json_decoder(raw: bytes) -> SKafkaMessageAll:
+    """Исходный путь: json.loads и построение pydantic-модели из словаря"""
+    return SKafkaMessageAll(**json.loads(raw.decode("utf-8")))
+
+
+def pydantic_decoder(raw: bytes) -> SKafkaMessageAll:
+    """Разбор и валидация JSON за один проход в pydantic-core"""
+    return SKafkaMessageAll.model_validate_json(raw)
+
+
+def _build_msgspec_decoder() -> Callable[[bytes], Any]:
+    """
+    Разбор байтов сразу в msgspec.Struct за один проход.
+    msgspec разбирает строго: только значения тех JSON-типов и форматов, что в схеме. Всё остальное —
+    нестрогие приведения SKafkaMessageAll (число строкой, дата без времени, UUID в фигурных скобках)
+    и невалидные сообщения — разбирает pydantic_decoder, поэтому принимаются и отклоняются те же
+    сообщения, что и у pydantic. Такие сообщения редки и на скорость основного потока не влияют.
+    """
+    import msgspec
+    from pydantic import TypeAdapter
+
+    # msgspec округляет доли секунды сверх микросекунд, pydantic отбрасывает: время разбирает pydantic
+    parse_timestamp = TypeAdapter(datetime).validate_python
+
+    class KafkaMessageData(msgspec.Struct):
+        movement_id: uuid.UUID
+        warehouse_id: uuid.UUID
+        timestamp: str
+        event: EventType
+        product_id: uuid.UUID
+        quantity: Annotated[int, msgspec.Meta(ge=0, le=ModelFieldConstant.MAX_QUANTITY)]
+
+        def __post_init__(self):
+            self.timestamp = parse_timestamp(self.timestamp)
+
+    class KafkaMessage(msgspec.Struct):
+        id: uuid.UUID
+        source: Annotated[str, msgspec.Meta(pattern=MSGSPEC_SOURCE_PATTERN)]
+        specversion: str
+        type: str
+        datacontenttype: str
+        dataschema: str
+        time: int
+        subject: str
+        destination: str
+        data: KafkaMessageData
+
+    decode = msgspec.json.Decoder(KafkaMessage).decode
+
+    def decode_or_fallback(raw: bytes):
+        try:
+            return decode(raw)
+        except msgspec.DecodeError:
+            return pydantic_decoder(raw)
+
+    return decode_or_fallback
+
+
+DECODER_FACTORIES: Dict[str, Callable[[], Callable[[bytes], Any]]] = {
+    "json": lambda: json_decoder,
+    "pydantic": lambda: pydantic_decoder,
+    "msgspec": _build_msgspec_decoder,
+}
+
+
+def get_decoder(name: str) -> Callable[[bytes], Any]:
+    """
+    Возвращает десериализатор сообщений Kafka по имени из настроек.
+    Невалидные сообщения логируются и превращаются в None.
+    """
+    if name not in DECODER_FACTORIES:
+        raise ValueError(f"Неизвестный декодер сообщений: {name}. Доступны: {', '.join(DECODER_FACTORIES)}")
+    decode = DECODER_FACTORIES[name]()
+
+    def safe_decode(raw: bytes):
+        try:
+            return decode(raw)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при разборе сообщения: {e}. Raw: {raw}")
+            return None
+
+    return safe_decode
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable, List
+
+from src.metrics.metrics import KAFKA_DISPATCHER_BUSY, KAFKA_DISPATCHER_QUEUED
+
+logger = logging.getLogger(__name__)
+
+
+class KeyOrderedDispatcher:
+    """
+    Распределяет задачи по фиксированному набору воркеров по хэшу ключа.
+    Задачи с одинаковым ключом выполняются последовательно в порядке поступления,
+    задачи с разными ключами — параллельно. Длина очереди каждого воркера ограничена.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int,
+        queue_size: int,
+    ):
+        self.handler = handler
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Запуск воркеров"""
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self) -> None:
+        """Дожидается обработки всех задач из очередей и останавливает воркеров"""
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self) -> None:
+        """Дожидается обработки всех задач из очередей"""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    def worker_for(self, key: Hashable) -> int:
+        """Номер воркера, который обрабатывает ключ"""
+        return hash(key) % len(self._queues)
+
+    async def submit(self, worker: int, item: Any) -> None:
+        """Ставит задачу в очередь воркера. Ждёт, если очередь заполнена."""
+        await self._queues[worker].put(item)
+        KAFKA_DISPATCHER_QUEUED.inc()
+
+    def is_saturated(self) -> bool:
+        """Хотя бы одна очередь заполнена"""
+        return any(queue.full() for queue in self._queues)
+
+    def is_drained(self) -> bool:
+        """Все очереди заполнены не больше чем наполовину"""
+        return all(queue.qsize() <= self.queue_size // 2 for queue in self._queues)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            KAFKA_DISPATCHER_QUEUED.dec()
+            KAFKA_DISPATCHER_BUSY.inc()
+            try:
+                await self.handler(item)
+            except Exception as e:
+                logger.error(f"Ошибка обработки задачи воркером: {e}")
+            finally:
+                KAFKA_DISPATCHER_BUSY.dec()
+                queue.task_done()
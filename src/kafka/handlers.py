@@ -1,23 +1,89 @@
-import asyncio
 import logging
+from typing import Hashable, List
+
+from pydantic import ValidationError
+from sqlalchemy.exc import DataError, IntegrityError
 
-from src.kafka.constants import KafkaConstant
 from src.kafka.schemas import SKafkaMessageAll
+from src.metrics.metrics import KAFKA_MESSAGES, observe_stage
 from src.services.stock_services import StockService
 
 logger = logging.getLogger(__name__)
 
-semaphore = asyncio.Semaphore(KafkaConstant.MAX_CONCURRENT_TASKS)
+# Повторная обработка не исправит: данные сообщения не проходят проверку схемы или ограничения БД
+PERMANENT_ERRORS = (ValidationError, DataError, IntegrityError)
+
+
+def message_key(message: SKafkaMessageAll | None) -> Hashable:
+    """
+    Ключ упорядочивания сообщения: (warehouse_id, product_id).
+    Сообщения с одним ключом обрабатываются строго по очереди.
+    """
+    if message is None:
+        return None
+    return message.data.warehouse_id, message.data.product_id
+
 
+def is_permanent_error(error: BaseException | None) -> bool:
+    """
+    Ошибка или одна из её причин из PERMANENT_ERRORS.
+    StockService и DAO оборачивают ошибки в HTTPException, исходная ошибка остаётся в __context__.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, PERMANENT_ERRORS):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
 
-async def handle_message(message: dict):
+
+async def handle_message(message: SKafkaMessageAll | None):
+    if message is None:
+        KAFKA_MESSAGES.labels("invalid").inc()
+        return
     try:
-        await StockService.processing_message(SKafkaMessageAll(**message))
+        with observe_stage("kafka.handle_message"):
+            await StockService.processing_message(message)
+        KAFKA_MESSAGES.labels("processed").inc()
     except Exception as e:
+        KAFKA_MESSAGES.labels("failed").inc()
         logger.exception(f"Failed to process message: {message} — {e}")
         raise e
 
 
-async def limited_handle_message(msg_value):
-    async with semaphore:
-        await handle_message(msg_value)
+async def handle_batch(messages: List[SKafkaMessageAll | None]):
+    """
+    Обрабатывает пачку сообщений в одной транзакции.
+    Если пачка целиком не прошла — обрабатывает сообщения по одному, в исходном порядке.
+    Сообщения с неисправимой ошибкой (is_permanent_error) пропускаются. Если хотя бы одно сообщение
+    не прошло по другой причине, выбрасывает исключение: пачка будет обработана повторно,
+    уже записанные сообщения при этом пропускаются.
+    """
+    valid_messages: List[SKafkaMessageAll] = [message for message in messages if message is not None]
+    KAFKA_MESSAGES.labels("invalid").inc(len(messages) - len(valid_messages))
+    if not valid_messages:
+        return
+
+    try:
+        with observe_stage("kafka.handle_batch"):
+            await StockService.processing_batch(valid_messages)
+        KAFKA_MESSAGES.labels("processed").inc(len(valid_messages))
+    except Exception as e:
+        logger.warning(f"Failed to process batch of {len(valid_messages)} messages, fallback to one by one — {e}")
+        error = None
+        for message in valid_messages:
+            try:
+                with observe_stage("kafka.handle_message"):
+                    await StockService.processing_message(message)
+                KAFKA_MESSAGES.labels("processed").inc()
+            except Exception as e:
+                if is_permanent_error(e):
+                    KAFKA_MESSAGES.labels("dropped").inc()
+                    logger.error(f"Message dropped, it cannot be processed: {message} — {e}")
+                    continue
+                KAFKA_MESSAGES.labels("failed").inc()
+                logger.exception(f"Failed to process message: {message} — {e}")
+                error = e
+        if error is not None:
+            raise error
@@ -0,0 +1,75 @@
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Set
+
+from aiokafka import TopicPartition
+
+
+class _PartitionOffsets:
+    def __init__(self):
+        self.in_flight: Deque[int] = deque()
+        self.done: Set[int] = set()
+        self.next_offset: int | None = None
+        self.committed: int | None = None
+
+
+class OffsetTracker:
+    """
+    Отслеживает обработку оффсетов по партициям.
+    Для коммита отдаётся нижняя граница: все сообщения партиции до неё обработаны полностью,
+    даже если воркеры завершили их не по порядку.
+    """
+
+    def __init__(self, commit_interval_ms: int, commit_every: int):
+        self.commit_interval = commit_interval_ms / 1000
+        self.commit_every = commit_every
+        self._partitions: Dict[TopicPartition, _PartitionOffsets] = {}
+        self._done_since_commit = 0
+        self._last_commit = time.monotonic()
+
+    def track(self, tp: TopicPartition, offset: int) -> None:
+        """Сообщение принято в обработку. Оффсеты внутри партиции поступают по возрастанию."""
+        self._partitions.setdefault(tp, _PartitionOffsets()).in_flight.append(offset)
+
+    def done(self, tp: TopicPartition, offset: int) -> None:
+        """Сообщение обработано"""
+        partition = self._partitions.get(tp)
+        if partition is None:
+            return
+        partition.done.add(offset)
+        while partition.in_flight and partition.in_flight[0] in partition.done:
+            finished = partition.in_flight.popleft()
+            partition.done.discard(finished)
+            partition.next_offset = finished + 1
+        self._done_since_commit += 1
+
+    def should_commit(self) -> bool:
+        """Пора ли коммитить: набралось достаточно обработанных сообщений или прошёл интервал"""
+        if self._done_since_commit == 0:
+            return False
+        return (
+            self._done_since_commit >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval
+        )
+
+    def offsets_to_commit(self, partitions: Iterable[TopicPartition] | None = None) -> Dict[TopicPartition, int]:
+        """Оффсеты, которые продвинулись с прошлого коммита"""
+        if partitions is None:
+            partitions = self._partitions.keys()
+        offsets = {}
+        for tp in partitions:
+            partition = self._partitions.get(tp)
+            if partition and partition.next_offset is not None and partition.next_offset != partition.committed:
+                offsets[tp] = partition.next_offset
+        return offsets
+
+    def mark_committed(self, offsets: Dict[TopicPartition, int]) -> None:
+        for tp, offset in offsets.items():
+            if tp in self._partitions:
+                self._partitions[tp].committed = offset
+        self._done_since_commit = 0
+        self._last_commit = time.monotonic()
+
+    def forget(self, partitions: Iterable[TopicPartition]) -> None:
+        """Перестать отслеживать партиции (после отзыва при ребалансе)"""
+        for tp in partitions:
+            self._partitions.pop(tp, None)
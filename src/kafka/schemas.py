@@ -3,6 +3,7 @@ from datetime import datetime
 
 from pydantic import BaseModel, Field
 
+from src.constant import ModelFieldConstant
 from src.enums import EventType
 from src.kafka.constants import KafkaConstant
 
@@ -13,7 +14,7 @@ class SKafkaMessageData(BaseModel):
     timestamp: datetime
     event: EventType
     product_id: uuid.UUID
-    quantity: int = Field(ge=0)
+    quantity: int = Field(ge=0, le=ModelFieldConstant.MAX_QUANTITY)
 
     model_config = {"from_attributes": True}
 
@@ -0,0 +1,113 @@
+"""
+Отдельный воркер Kafka consumer, независимый от API.
+
+    python -m src.kafka.worker --processes 4
+
+Супервизор запускает N процессов в одной consumer group и перезапускает упавшие.
+У каждого процесса свой event loop и свой пул соединений с БД.
+Если задан KAFKA_METRICS_PORT, воркер N отдаёт свои метрики на порту KAFKA_METRICS_PORT + N.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+
+from src.db.partitions import MovementPartitions
+from src.kafka.config import kafka_settings
+from src.kafka.constants import KafkaConstant
+from src.kafka.consumer import consumer_service
+from src.metrics.server import start_metrics_server
+from src.redis.service import redis_service
+from src.services.stock_services import StockService
+
+logger = logging.getLogger(__name__)
+
+
+async def run_consumer(metrics_port: int | None = None) -> None:
+    """
+    Запуск consumer в текущем процессе до получения SIGTERM/SIGINT.
+    :param metrics_port: Порт HTTP сервера метрик процесса, None — без метрик.
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(consumer_service.stop()))
+
+    metrics_server = None
+    if metrics_port is not None:
+        try:
+            metrics_server = await start_metrics_server(metrics_port)
+        except OSError as e:
+            logger.warning(f"🟡 Не удалось запустить сервер метрик на порту {metrics_port} - {e}")
+
+    await redis_service.init(local_cache=False)
+    try:
+        await StockService.prewarm_known_entities()
+    except Exception as e:
+        logger.warning(f"🟡 Не удалось прогреть кэш сущностей - {e}")
+    try:
+        await MovementPartitions.ensure()
+    except Exception as e:
+        logger.warning(f"🟡 Не удалось создать партиции movement - {e}")
+
+    try:
+        await consumer_service.start()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await redis_service.close()
+
+
+def _worker_process(number: int) -> None:
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker-{number}] %(levelname)s %(name)s: %(message)s")
+    metrics_port = kafka_settings.KAFKA_METRICS_PORT + number if kafka_settings.KAFKA_METRICS_PORT else None
+    asyncio.run(run_consumer(metrics_port))
+
+
+def supervise(processes: int) -> None:
+    """Запуск и перезапуск процессов consumer до получения SIGTERM/SIGINT"""
+    # spawn: дочерний процесс заново импортирует модули и создаёт свои пулы БД и Redis
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    def start_worker(number: int) -> multiprocessing.Process:
+        process = context.Process(target=_worker_process, args=(number,), name=f"kafka-worker-{number}")
+        process.start()
+        logger.info(f"🟢 Запущен воркер {number} (pid={process.pid})")
+        return process
+
+    workers = {number: start_worker(number) for number in range(processes)}
+    while not stopping:
+        time.sleep(KafkaConstant.RERUN_KAFKA_SLEEP)
+        for number, process in workers.items():
+            if not stopping and not process.is_alive():
+                logger.warning(f"🔴 Воркер {number} завершился с кодом {process.exitcode}, перезапуск")
+                workers[number] = start_worker(number)
+
+    for process in workers.values():
+        if process.is_alive():
+            process.terminate()
+    for number, process in workers.items():
+        process.join(timeout=KafkaConstant.WORKER_STOP_TIMEOUT)
+        if process.is_alive():
+            logger.warning(f"Воркер {number} не остановился за {KafkaConstant.WORKER_STOP_TIMEOUT} сек, kill")
+            process.kill()
+    logger.info("🛑 Воркеры Kafka остановлены")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=kafka_settings.KAFKA_WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [supervisor] %(levelname)s %(name)s: %(message)s")
+    supervise(args.processes)
@@ -1,7 +1,9 @@
 import uvicorn
 from fastapi import FastAPI
 
+from src.metrics.middleware import metrics_middleware
 from src.routers.main import router as main_router
+from src.routers.metrics import router as metrics_router
 from src.start_app import lifespan
 from src.utils.common import get_app_version
 
@@ -9,7 +11,10 @@ app_version = get_app_version()
 
 app = FastAPI(title="Warehouse API", lifespan=lifespan, version=app_version, root_path="/api")
 
+app.middleware("http")(metrics_middleware)
+
 app.include_router(main_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,75 @@
+"""
+Метрики сервиса. Имена и метки согласованы с дашбордами: этапы обработки — stage, HTTP — endpoint.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from src.metrics.registry import Counter, Gauge, Histogram, Registry
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram("http_request_duration_seconds", "Время обработки HTTP запроса", ["method", "endpoint", "status"])
+)
+HTTP_CACHE_REQUESTS = registry.register(
+    Counter("http_cache_requests_total", "Ответы эндпоинтов под @cache: hit или miss", ["endpoint", "result"])
+)
+STAGE_DURATION = registry.register(
+    Histogram("stage_duration_seconds", "Время этапов обработки: вызовы DAO, транзакции, запись в кэш", ["stage"])
+)
+
+KAFKA_MESSAGES = registry.register(
+    Counter("kafka_messages_total", "Сообщения Kafka: processed, failed, invalid или dropped", ["result"])
+)
+KAFKA_CONSUMER_LAG = registry.register(
+    Gauge("kafka_consumer_lag", "Сообщений в партиции после последнего прочитанного", ["topic", "partition"])
+)
+KAFKA_DISPATCHER_QUEUED = registry.register(
+    Gauge("kafka_dispatcher_queued", "Задач в очередях воркеров consumer, ждущих обработки")
+)
+KAFKA_DISPATCHER_BUSY = registry.register(
+    Gauge("kafka_dispatcher_busy_workers", "Воркеров consumer, которые сейчас обрабатывают задачу")
+)
+
+STOCK_CACHE_LOOKUPS = registry.register(
+    Counter("stock_cache_lookup_keys_total", "Ключи пакетного чтения остатков из кэша: hit или miss", ["result"])
+)
+SINGLE_FLIGHT = registry.register(
+    Counter(
+        "single_flight_total",
+        "Промахи кэша под single_flight: leader — запрос к БД, shared — ждал запрос в этом процессе, "
+        "waited — получил значение другой реплики, fallback — выполнил запрос сам после ожидания",
+        ["result"],
+    )
+)
+
+DB_POOL_CHECKOUT = registry.register(Histogram("db_pool_checkout_seconds", "Ожидание соединения из пула БД", ["pool"]))
+DB_POOL_CONNECTIONS = registry.register(
+    Gauge("db_pool_connections", "Соединения пула БД: checked_out, idle, overflow", ["pool", "state"])
+)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Замеряет время блока в stage_duration_seconds{stage=...}"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage).observe(time.perf_counter() - started)
+
+
+def observed(func):
+    """
+    Замеряет время async classmethod DAO в stage_duration_seconds{stage="dao.<Класс>.<метод>"}.
+    Ставится под @classmethod.
+    """
+
+    @wraps(func)
+    async def inner(cls, *args, **kwargs):
+        with observe_stage(f"dao.{cls.__name__}.{func.__name__}"):
+            return await func(cls, *args, **kwargs)
+
+    return inner
@@ -0,0 +1,28 @@
+import time
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+
+from src.metrics.metrics import HTTP_CACHE_REQUESTS, HTTP_REQUEST_DURATION
+from src.redis.constant import RedisConstant
+
+
+async def metrics_middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    """
+    Время обработки запросов по шаблону пути, а не по самому пути: id в пути не плодят серии метрик.
+    Для эндпоинтов под @cache считает попадания в кэш по заголовку ответа.
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        HTTP_REQUEST_DURATION.labels(request.method, endpoint, status).observe(time.perf_counter() - started)
+
+    cache_status = response.headers.get(RedisConstant.CACHE_STATUS_HEADER)
+    if cache_status is not None:
+        HTTP_CACHE_REQUESTS.labels(endpoint, cache_status.lower()).inc()
+    return response
@@ -0,0 +1,34 @@
+import asyncio
+import logging
+
+from src.metrics.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0") -> asyncio.AbstractServer:
+    """
+    HTTP сервер метрик для процессов без API, например воркеров Kafka.
+    На любой GET отвечает метриками процесса.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = registry.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                + f"Content-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Ошибка выдачи метрик: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"📈 Метрики доступны на порту {port}")
+    return server
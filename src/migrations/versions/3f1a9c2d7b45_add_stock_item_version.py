@@ -0,0 +1,28 @@
+"""Add stock_item version
+
+Revision ID: 3f1a9c2d7b45
+Revises: 8e5c8b4e62dd
+Create Date: 2025-08-20 10:12:41.118204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1a9c2d7b45"
+down_revision: Union[str, Sequence[str], None] = "8e5c8b4e62dd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("stock_item", sa.Column("version", sa.BigInteger(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("stock_item", "version")
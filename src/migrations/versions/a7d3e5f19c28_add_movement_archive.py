@@ -0,0 +1,34 @@
+"""Add movement archive
+
+Revision ID: a7d3e5f19c28
+Revises: f6c2d94a8b31
+Create Date: 2025-08-31 15:08:26.410927
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7d3e5f19c28"
+down_revision: Union[str, Sequence[str], None] = "f6c2d94a8b31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "movement_archive",
+        sa.Column("partition_name", sa.String(), nullable=False),
+        sa.Column("max_movement_id", sa.BigInteger(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("partition_name"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("movement_archive")
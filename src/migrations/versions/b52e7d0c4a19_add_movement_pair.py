@@ -0,0 +1,60 @@
+"""Add movement_pair projection
+
+Revision ID: b52e7d0c4a19
+Revises: 3f1a9c2d7b45
+Create Date: 2025-08-22 11:40:07.532981
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b52e7d0c4a19"
+down_revision: Union[str, Sequence[str], None] = "3f1a9c2d7b45"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "movement_pair",
+        sa.Column("movement_id", sa.Uuid(), nullable=False),
+        sa.Column("product_id", sa.Uuid(), nullable=False),
+        sa.Column("departure_id", sa.Integer(), nullable=True),
+        sa.Column("sender_warehouse", sa.Uuid(), nullable=True),
+        sa.Column("departure_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("departure_quantity", sa.Integer(), nullable=True),
+        sa.Column("arrival_id", sa.Integer(), nullable=True),
+        sa.Column("recipient_warehouse", sa.Uuid(), nullable=True),
+        sa.Column("arrival_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("arrival_quantity", sa.Integer(), nullable=True),
+        sa.Column("time_diff", sa.Interval(), nullable=True),
+        sa.Column("diff_in_quantity", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("movement_id"),
+    )
+    # заполнение проекции по уже сохранённым перемещениям
+    op.execute("""
+        INSERT INTO movement_pair (
+            movement_id, product_id,
+            departure_id, sender_warehouse, departure_at, departure_quantity,
+            arrival_id, recipient_warehouse, arrival_at, arrival_quantity,
+            time_diff, diff_in_quantity
+        )
+        SELECT
+            COALESCE(d.movement_id, a.movement_id), COALESCE(d.product_id, a.product_id),
+            d.id, d.warehouse_id, d.timestamp, d.quantity,
+            a.id, a.warehouse_id, a.timestamp, a.quantity,
+            a.timestamp - d.timestamp, a.quantity - d.quantity
+        FROM (SELECT * FROM movement WHERE event_type = 'departure') AS d
+        FULL OUTER JOIN (SELECT * FROM movement WHERE event_type = 'arrival') AS a
+            ON a.movement_id = d.movement_id
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("movement_pair")
@@ -0,0 +1,66 @@
+"""Add movement leg
+
+Revision ID: b9e4f2a6d173
+Revises: a7d3e5f19c28
+Create Date: 2025-09-01 10:17:52.604318
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "b9e4f2a6d173"
+down_revision: Union[str, Sequence[str], None] = "a7d3e5f19c28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# строк movement за одну транзакцию заполнения
+BACKFILL_BATCH_SIZE = 50_000
+
+# Из нескольких движений одного события раньше принятое (меньший id) остаётся первым
+BACKFILL_SQL = """
+INSERT INTO movement_leg (movement_id, event_type, timestamp)
+SELECT movement_id, event_type, timestamp FROM movement {where} ORDER BY id
+ON CONFLICT DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Обработчики предыдущей версии movement_leg не заполняют, на время заполнения их нужно остановить
+    op.create_table(
+        "movement_leg",
+        sa.Column("movement_id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "event_type", postgresql.ENUM("arrival", "departure", name="eventtype", create_type=False), nullable=False
+        ),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("movement_id", "event_type"),
+    )
+    op.create_index("ix_movement_leg_timestamp", "movement_leg", ["timestamp"])
+
+    if context.is_offline_mode():
+        op.execute(BACKFILL_SQL.format(where=""))
+        return
+
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT max(id) FROM movement")).scalar()
+        after_id = 0
+        while max_id is not None and after_id < max_id:
+            up_to_id = after_id + BACKFILL_BATCH_SIZE
+            bind.execute(
+                sa.text(BACKFILL_SQL.format(where="WHERE id > :after_id AND id <= :up_to_id")),
+                {"after_id": after_id, "up_to_id": up_to_id},
+            )
+            after_id = up_to_id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_movement_leg_timestamp", table_name="movement_leg")
+    op.drop_table("movement_leg")
@@ -0,0 +1,53 @@
+"""Add movement history indexes
+
+Revision ID: c81f3a6e2d57
+Revises: b52e7d0c4a19
+Create Date: 2025-08-23 09:15:52.204416
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c81f3a6e2d57"
+down_revision: Union[str, Sequence[str], None] = "b52e7d0c4a19"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в movement, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_movement_warehouse_id_timestamp_id",
+            "movement",
+            ["warehouse_id", "timestamp", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_movement_product_id_timestamp_id",
+            "movement",
+            ["product_id", "timestamp", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_movement_timestamp_brin",
+            "movement",
+            ["timestamp"],
+            postgresql_using="brin",
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_movement_timestamp_brin", table_name="movement", postgresql_concurrently=True)
+        op.drop_index("ix_movement_product_id_timestamp_id", table_name="movement", postgresql_concurrently=True)
+        op.drop_index("ix_movement_warehouse_id_timestamp_id", table_name="movement", postgresql_concurrently=True)
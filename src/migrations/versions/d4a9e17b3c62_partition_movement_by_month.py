@@ -0,0 +1,171 @@
+"""Partition movement by month
+
+Revision ID: d4a9e17b3c62
+Revises: c81f3a6e2d57
+Create Date: 2025-08-25 14:02:33.871290
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+from sqlalchemy.dialects import postgresql
+
+from src.db.config import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a9e17b3c62"
+down_revision: Union[str, Sequence[str], None] = "c81f3a6e2d57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MOVEMENT_COLUMNS = "id, movement_id, warehouse_id, timestamp, quantity, event_type, product_id"
+# строк movement_old за одну транзакцию переноса
+COPY_BATCH_SIZE = 50_000
+
+# Партиции с самого старого движения, но не позже первого хранимого месяца, и на MOVEMENT_PARTITIONS_AHEAD вперёд,
+# как у MovementPartitions.ensure
+ENSURE_INITIAL_PARTITIONS_SQL = """
+SELECT movement_ensure_partitions(
+    LEAST(
+        (SELECT min(timestamp) FROM movement_old),
+        date_trunc('month', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' - make_interval(months => :retention_months)
+    ),
+    now() + make_interval(months => :months_ahead)
+)
+"""
+
+COPY_BATCH_SQL = f"""
+INSERT INTO movement ({MOVEMENT_COLUMNS})
+SELECT {MOVEMENT_COLUMNS} FROM movement_old WHERE id > :after_id AND id <= :up_to_id
+ON CONFLICT DO NOTHING
+"""
+
+# Создаёт недостающие месячные партиции movement_pYYYYMM с from_ts по to_ts включительно (границы месяцев в UTC)
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION movement_ensure_partitions(from_ts timestamptz, to_ts timestamptz) RETURNS integer AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', from_ts AT TIME ZONE 'UTC');
+    last_month timestamp := date_trunc('month', to_ts AT TIME ZONE 'UTC');
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'movement_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF movement FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start AT TIME ZONE 'UTC',
+                (month_start + interval '1 month') AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _create_history_indexes() -> None:
+    op.create_index("ix_movement_warehouse_id_timestamp_id", "movement", ["warehouse_id", "timestamp", "id"])
+    op.create_index("ix_movement_product_id_timestamp_id", "movement", ["product_id", "timestamp", "id"])
+    op.create_index("ix_movement_timestamp_brin", "movement", ["timestamp"], postgresql_using="brin")
+
+
+def _drop_history_indexes(table_name: str) -> None:
+    op.drop_index("ix_movement_timestamp_brin", table_name=table_name)
+    op.drop_index("ix_movement_product_id_timestamp_id", table_name=table_name)
+    op.drop_index("ix_movement_warehouse_id_timestamp_id", table_name=table_name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Старая таблица освобождает имена, последовательность id переходит к новой: id в movement_pair остаются верными
+    _drop_history_indexes("movement")
+    op.rename_table("movement", "movement_old")
+    op.execute("ALTER TABLE movement_old RENAME CONSTRAINT movement_pkey TO movement_old_pkey")
+    op.execute("ALTER TABLE movement_old RENAME CONSTRAINT uq_movement_id_event_type TO uq_movement_old_id_event_type")
+    op.execute("ALTER TABLE movement_old ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE movement_id_seq OWNED BY NONE")
+
+    # Ключ партиционирования обязан входить в первичный ключ и уникальные ограничения
+    op.create_table(
+        "movement",
+        sa.Column("id", sa.Integer(), server_default=sa.text("nextval('movement_id_seq')"), nullable=False),
+        sa.Column("movement_id", sa.Uuid(), nullable=False),
+        sa.Column("warehouse_id", sa.Uuid(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column(
+            "event_type", postgresql.ENUM("arrival", "departure", name="eventtype", create_type=False), nullable=False
+        ),
+        sa.Column("product_id", sa.Uuid(), nullable=False),
+        sa.CheckConstraint("quantity >= 0", name="check_quantity_non_negative"),
+        sa.ForeignKeyConstraint(["product_id"], ["product.id"]),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        sa.UniqueConstraint("movement_id", "event_type", "timestamp", name="uq_movement_id_event_type_timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.execute("ALTER SEQUENCE movement_id_seq OWNED BY movement.id")
+    _create_history_indexes()
+
+    op.execute(ENSURE_PARTITIONS_FUNCTION)
+    op.execute(
+        sa.text(ENSURE_INITIAL_PARTITIONS_SQL).bindparams(
+            retention_months=settings.MOVEMENT_RETENTION_MONTHS, months_ahead=settings.MOVEMENT_PARTITIONS_AHEAD
+        )
+    )
+
+    if context.is_offline_mode():
+        op.execute(f"INSERT INTO movement ({MOVEMENT_COLUMNS}) SELECT {MOVEMENT_COLUMNS} FROM movement_old")
+        op.drop_table("movement_old")
+        return
+
+    # Пустая movement фиксируется до переноса, новые записи идут уже в неё. Старые строки переносятся
+    # пачками по id, каждая в своей транзакции: блокировка movement_old и WAL одной транзакции не растут
+    # с размером таблицы
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text("SELECT max(id) FROM movement_old")).scalar()
+        after_id = 0
+        while max_id is not None and after_id < max_id:
+            up_to_id = after_id + COPY_BATCH_SIZE
+            bind.execute(sa.text(COPY_BATCH_SQL), {"after_id": after_id, "up_to_id": up_to_id})
+            after_id = up_to_id
+        op.drop_table("movement_old")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table("movement", "movement_partitioned")
+    op.execute("ALTER TABLE movement_partitioned RENAME CONSTRAINT movement_pkey TO movement_partitioned_pkey")
+    op.execute("ALTER TABLE movement_partitioned ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE movement_id_seq OWNED BY NONE")
+    _drop_history_indexes("movement_partitioned")
+
+    op.create_table(
+        "movement",
+        sa.Column("id", sa.Integer(), server_default=sa.text("nextval('movement_id_seq')"), nullable=False),
+        sa.Column("movement_id", sa.Uuid(), nullable=False),
+        sa.Column("warehouse_id", sa.Uuid(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column(
+            "event_type", postgresql.ENUM("arrival", "departure", name="eventtype", create_type=False), nullable=False
+        ),
+        sa.Column("product_id", sa.Uuid(), nullable=False),
+        sa.CheckConstraint("quantity >= 0", name="check_quantity_non_negative"),
+        sa.ForeignKeyConstraint(["product_id"], ["product.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("movement_id", "event_type", name="uq_movement_id_event_type"),
+    )
+    op.execute("ALTER SEQUENCE movement_id_seq OWNED BY movement.id")
+    _create_history_indexes()
+
+    op.execute(f"INSERT INTO movement ({MOVEMENT_COLUMNS}) SELECT {MOVEMENT_COLUMNS} FROM movement_partitioned")
+    op.drop_table("movement_partitioned")
+    op.execute("DROP FUNCTION movement_ensure_partitions(timestamptz, timestamptz)")
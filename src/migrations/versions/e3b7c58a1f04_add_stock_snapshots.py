@@ -0,0 +1,44 @@
+"""Add stock snapshots
+
+Revision ID: e3b7c58a1f04
+Revises: d4a9e17b3c62
+Create Date: 2025-08-27 17:26:48.640513
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3b7c58a1f04"
+down_revision: Union[str, Sequence[str], None] = "d4a9e17b3c62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_snapshot",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("high_watermark", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "stock_snapshot_item",
+        sa.Column("snapshot_id", sa.BigInteger(), nullable=False),
+        sa.Column("warehouse_id", sa.Uuid(), nullable=False),
+        sa.Column("product_id", sa.Uuid(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["snapshot_id"], ["stock_snapshot.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("snapshot_id", "warehouse_id", "product_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("stock_snapshot_item")
+    op.drop_table("stock_snapshot")
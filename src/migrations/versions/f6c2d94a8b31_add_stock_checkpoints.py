@@ -0,0 +1,71 @@
+"""Add stock checkpoints
+
+Revision ID: f6c2d94a8b31
+Revises: e3b7c58a1f04
+Create Date: 2025-08-29 11:42:07.318265
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6c2d94a8b31"
+down_revision: Union[str, Sequence[str], None] = "e3b7c58a1f04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_movement_warehouse_id_product_id_timestamp_id"
+INDEX_COLUMNS = '(warehouse_id, product_id, "timestamp", id)'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_checkpoint",
+        sa.Column("warehouse_id", sa.Uuid(), nullable=False),
+        sa.Column("product_id", sa.Uuid(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("warehouse_id", "product_id", "timestamp"),
+    )
+    op.create_table(
+        "stock_checkpoint_run",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("high_watermark", sa.BigInteger(), nullable=False),
+        sa.Column("checkpoint_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    if context.is_offline_mode():
+        op.create_index(INDEX_NAME, "movement", ["warehouse_id", "product_id", "timestamp", "id"])
+        return
+
+    # На партиционированной таблице CONCURRENTLY не работает: индекс создаётся на родителе без построения,
+    # строится на каждой партиции без блокировки записи и присоединяется, после последней партиции он валиден
+    op.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON ONLY movement {INDEX_COLUMNS}")
+    partitions = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'movement'::regclass"
+            )
+        )
+        .scalars()
+        .all()
+    )
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            partition_index = f"{partition}_warehouse_id_product_id_timestamp_id_idx"
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{partition_index}" ON "{partition}" {INDEX_COLUMNS}')
+            op.execute(f'ALTER INDEX {INDEX_NAME} ATTACH PARTITION "{partition_index}"')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(INDEX_NAME, table_name="movement")
+    op.drop_table("stock_checkpoint_run")
+    op.drop_table("stock_checkpoint")
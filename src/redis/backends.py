@@ -0,0 +1,82 @@
+from typing import Optional, Tuple
+
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.types import Backend
+
+from redis.asyncio import Redis
+from src.redis.constant import RedisConstant
+from src.redis.local_cache import LocalCache
+from src.redis.utils import cache_key_tags, to_bytes
+
+
+class TaggedRedisBackend(RedisBackend):
+    """
+    RedisBackend, который при записи добавляет ключ в множества его тегов.
+    По тегу можно удалить сразу все зависящие от сущности ключи.
+    Клиент создан с decode_responses=True, поэтому прочитанные значения приводятся к bytes, как ждёт JsonCoder.
+    """
+
+    def __init__(self, redis: Redis):
+        super().__init__(redis)
+        self._fill_script = redis.register_script(RedisConstant.FILL_IF_UNVERSIONED_SCRIPT)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        ttl, value = await super().get_with_ttl(key)
+        return ttl, to_bytes(value)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return to_bytes(await super().get(key))
+
+    async def set(self, key: str, value: str | bytes, expire: Optional[int] = None) -> bool:
+        """
+        Заполнение кэша при промахе. Не перезаписывает уже сохранённое значение и не трогает ключи с версией:
+        их пишет только запись остатков через SET_IF_NEWER_SCRIPT.
+        :return: Записано ли значение.
+        """
+        stored = await self._fill_script(
+            keys=[key, f"{RedisConstant.VERSION_PREFIX}:{key}", *cache_key_tags(key)],
+            args=[value, expire or RedisConstant.CACHE_EXPIRE, RedisConstant.TAG_EXPIRE],
+        )
+        return bool(stored)
+
+
+class TwoTierBackend(Backend):
+    """
+    Backend для FastAPICache: локальный LocalCache перед Redis.
+    Локальная копия живёт не дольше LOCAL_CACHE_TTL и удаляется по сообщению инвалидации из pub/sub.
+    """
+
+    def __init__(self, remote: Backend, local: LocalCache, local_ttl: int = RedisConstant.LOCAL_CACHE_TTL):
+        self.remote = remote
+        self.local = local
+        self.local_ttl = local_ttl
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str | bytes]]:
+        cached = self.local.get_with_ttl(key)
+        if cached is not None:
+            return cached
+        ttl, value = await self.remote.get_with_ttl(key)
+        if value is not None:
+            self.local.set(key, value, self._local_expire(ttl))
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[str | bytes]:
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(self, key: str, value: str | bytes, expire: Optional[int] = None) -> None:
+        # значение, которое Redis отказался записать, может быть устаревшим — локально его тоже не держим
+        if await self.remote.set(key, value, expire):
+            self.local.set(key, value, self._local_expire(expire))
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            self.local.clear()
+        elif key:
+            self.local.delete(key)
+        return await self.remote.clear(namespace, key)
+
+    def _local_expire(self, expire: Optional[int]) -> int:
+        if expire is None or expire < 0:
+            return self.local_ttl
+        return min(expire, self.local_ttl)
@@ -1,2 +1,85 @@
 class RedisConstant:
-    CACHE_PREFIX = "cache"
\ No newline at end of file
+    CACHE_PREFIX = "cache"
+    # заголовок ответа эндпоинтов под @cache со значением HIT или MISS
+    CACHE_STATUS_HEADER = "X-FastAPI-Cache"
+    VERSION_PREFIX = "version"
+    TAG_PREFIX = "tag"
+    # тег всех вариантов ключа с query параметрами: tag:query:<ключ без query>
+    QUERY_VARIANTS_TAG = "query"
+
+    CACHE_EXPIRE = 100
+    # версия живёт дольше значения, чтобы опоздавшая запись не вернула устаревший остаток
+    VERSION_EXPIRE = 3600
+    TAG_EXPIRE = 3600
+
+    # локальный уровень кэша в каждом процессе API
+    LOCAL_CACHE_TTL = 5
+    LOCAL_CACHE_MAX_ENTRIES = 10_000
+    LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    INVALIDATION_RECONNECT_SLEEP = 1
+
+    # single-flight: один запрос к БД на ключ при промахе кэша
+    LOCK_PREFIX = "lock"
+    SINGLE_FLIGHT_LOCK_TTL_MS = 5000
+    SINGLE_FLIGHT_WAIT = 3
+    SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+    # Значение той же версии записывается, только если его нет: значение истекло раньше версии
+    # KEYS[1] — ключ значения, KEYS[2] — ключ версии, KEYS[3..] — ключи тегов
+    # ARGV: значение, версия, ttl значения, ttl версии, ttl тегов, канал инвалидации
+    SET_IF_NEWER_SCRIPT = """
+local current = redis.call('GET', KEYS[2])
+if current and tonumber(current) > tonumber(ARGV[2]) then
+    return 0
+end
+if current and tonumber(current) == tonumber(ARGV[2]) and redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+for i = 3, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    redis.call('EXPIRE', KEYS[i], ARGV[5])
+end
+redis.call('PUBLISH', ARGV[6], KEYS[1])
+return 1
+"""
+
+    # Заполнение кэша при промахе @cache. Ключ с версией пишется только через SET_IF_NEWER_SCRIPT:
+    # прочитанное с отстающей реплики значение не должно перезаписать более новое.
+    # Иначе значение записывается, только если ключа ещё нет.
+    # KEYS[1] — ключ значения, KEYS[2] — ключ версии, KEYS[3..] — ключи тегов
+    # ARGV: значение, ttl значения, ttl тегов
+    FILL_IF_UNVERSIONED_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+if not redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2], 'NX') then
+    return 0
+end
+for i = 3, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+return 1
+"""
+
+    # KEYS[1] — ключ тега; ARGV[1] — канал инвалидации
+    INVALIDATE_TAG_SCRIPT = """
+local keys = redis.call('SMEMBERS', KEYS[1])
+for _, key in ipairs(keys) do
+    redis.call('DEL', key)
+    redis.call('PUBLISH', ARGV[1], key)
+end
+redis.call('DEL', KEYS[1])
+return #keys
+"""
+
+    # KEYS[1] — ключ блокировки; ARGV[1] — токен владельца
+    RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
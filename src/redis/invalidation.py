@@ -0,0 +1,40 @@
+from typing import Dict, Set, Tuple
+
+from src.redis.constant import RedisConstant
+from src.redis.utils import build_cache_tag
+
+
+class CacheChanges:
+    """
+    Изменения кэша, накопленные во время транзакции.
+    Применяются после коммита одним pipeline через RedisService.apply_changes,
+    при откате транзакции просто отбрасываются.
+    """
+
+    def __init__(self):
+        self.tags: Set[str] = set()
+        self.entries: Dict[str, Tuple[str | bytes, int]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.tags or self.entries)
+
+    def invalidate(self, **tag_values) -> None:
+        """
+        Удалить все ключи с тегами сущностей.
+        Пример: changes.invalidate(movement_id=...)
+        """
+        for name, value in tag_values.items():
+            self.tags.add(build_cache_tag(name, value))
+
+    def invalidate_query_variants(self, cache_key: str) -> None:
+        """
+        Удалить все варианты ключа с query параметрами, сам ключ остаётся.
+        Пример: changes.invalidate_query_variants("cache:warehouse_id=...:product_id=...")
+        """
+        self.tags.add(build_cache_tag(RedisConstant.QUERY_VARIANTS_TAG, cache_key))
+
+    def set_if_newer(self, cache_key: str, value: str | bytes, version: int) -> None:
+        """Записать значение, если его версия не старше сохранённой в Redis"""
+        current = self.entries.get(cache_key)
+        if current is None or current[1] < version:
+            self.entries[cache_key] = (value, version)
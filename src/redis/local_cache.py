@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from src.redis.constant import RedisConstant
+
+
+class LocalCache:
+    """
+    In-process кэш с TTL и вытеснением LRU.
+    Ограничен и числом записей, и суммарным размером значений в байтах.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RedisConstant.LOCAL_CACHE_MAX_ENTRIES,
+        max_bytes: int = RedisConstant.LOCAL_CACHE_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, Tuple[float, str | bytes, int]] = OrderedDict()
+        self._bytes = 0
+
+    def get_with_ttl(self, key: str) -> Optional[Tuple[int, str | bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        ttl = expires_at - time.monotonic()
+        if ttl <= 0:
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return int(ttl), value
+
+    def set(self, key: str, value: str | bytes, expire: int) -> None:
+        size = len(value)
+        if expire <= 0 or size > self.max_bytes:
+            return
+        self.delete(key)
+        self._entries[key] = (time.monotonic() + expire, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
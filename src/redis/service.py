@@ -1,12 +1,19 @@
+import asyncio
 import logging
+import uuid
+from typing import Dict, List
 
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 
 from redis import Redis
 from redis import asyncio as aioredis
 from src.db.config import settings
+from src.metrics.metrics import STOCK_CACHE_LOOKUPS
+from src.redis.backends import TaggedRedisBackend, TwoTierBackend
 from src.redis.constant import RedisConstant
+from src.redis.invalidation import CacheChanges
+from src.redis.local_cache import LocalCache
+from src.redis.utils import build_cache_key, cache_key_tags, to_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -19,17 +26,62 @@ class RedisService:
 
     def __init__(self):
         self._redis_db: Redis | None = None
+        self._set_if_newer_script = None
+        self._invalidate_tag_script = None
+        self._release_lock_script = None
+        self._local_cache: LocalCache | None = None
+        self._invalidation_task: asyncio.Task | None = None
 
-    async def init(self) -> None:
+    async def init(self, local_cache: bool = True) -> None:
         """
         Асинхронная инициализация Redis клиента и FastAPICache.
         Вызывать один раз при старте приложения.
+        :param local_cache: Включить локальный уровень кэша перед Redis (нужен процессам, которые отдают API).
         """
         if self._redis_db is None:
             self._redis_db = await aioredis.from_url(settings.REDIS_CACHE_URL, encoding="utf8", decode_responses=True)
-            FastAPICache.init(RedisBackend(self._redis_db), prefix=RedisConstant.CACHE_PREFIX)
+            backend = TaggedRedisBackend(self._redis_db)
+            if local_cache:
+                self._local_cache = LocalCache()
+                backend = TwoTierBackend(backend, self._local_cache)
+                self._invalidation_task = asyncio.create_task(self._listen_invalidations())
+            FastAPICache.init(
+                backend, prefix=RedisConstant.CACHE_PREFIX, cache_status_header=RedisConstant.CACHE_STATUS_HEADER
+            )
+            self._set_if_newer_script = self._redis_db.register_script(RedisConstant.SET_IF_NEWER_SCRIPT)
+            self._invalidate_tag_script = self._redis_db.register_script(RedisConstant.INVALIDATE_TAG_SCRIPT)
+            self._release_lock_script = self._redis_db.register_script(RedisConstant.RELEASE_LOCK_SCRIPT)
             logger.info("Redis инициализирован и FastAPICache настроен")
 
+    async def close(self) -> None:
+        """Остановка подписки на инвалидации и закрытие клиента"""
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            await asyncio.gather(self._invalidation_task, return_exceptions=True)
+            self._invalidation_task = None
+        if self._redis_db is not None:
+            await self._redis_db.aclose()
+            self._redis_db = None
+
+    async def _listen_invalidations(self) -> None:
+        """
+        Удаляет локальные копии ключей по сообщениям из канала инвалидации.
+        После переподключения локальный кэш очищается целиком: сообщения за время разрыва потеряны.
+        """
+        while True:
+            try:
+                async with self._redis_db.pubsub() as pubsub:
+                    await pubsub.subscribe(RedisConstant.INVALIDATION_CHANNEL)
+                    self._local_cache.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._local_cache.delete(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Подписка на инвалидации кэша прервана, переподключение: {e}")
+                await asyncio.sleep(RedisConstant.INVALIDATION_RECONNECT_SLEEP)
+
     def get_redis(self) -> Redis:
         """
         Получить инициализированный Redis клиент.
@@ -40,6 +92,45 @@ class RedisService:
             raise RuntimeError("Redis не инициализирован. Вызовите init() при старте.")
         return self._redis_db
 
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """
+        Читает несколько ключей кэша: сначала из локального уровня, остальные одним MGET.
+        :param keys: Ключи кэша.
+        :return: Словарь ключ -> значение только для найденных ключей.
+        """
+        redis_db = self.get_redis()
+        found = {}
+        missed = []
+        for key in keys:
+            cached = self._local_cache.get_with_ttl(key) if self._local_cache is not None else None
+            if cached is not None:
+                found[key] = cached[1]
+            else:
+                missed.append(key)
+        if missed:
+            for key, value in zip(missed, await redis_db.mget(missed)):
+                if value is not None:
+                    found[key] = to_bytes(value)
+        STOCK_CACHE_LOOKUPS.labels("hit").inc(len(found))
+        STOCK_CACHE_LOOKUPS.labels("miss").inc(len(keys) - len(found))
+        return found
+
+    async def acquire_lock(self, key: str, ttl_ms: int) -> str | None:
+        """
+        Короткая блокировка между репликами через SET NX PX.
+        :param key: Ключ, для которого берётся блокировка.
+        :param ttl_ms: Время жизни блокировки, после него она снимается сама.
+        :return: Токен владельца или None, если блокировку держит кто-то другой.
+        """
+        token = uuid.uuid4().hex
+        acquired = await self.get_redis().set(f"{RedisConstant.LOCK_PREFIX}:{key}", token, nx=True, px=ttl_ms)
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Снимает блокировку, только если она всё ещё принадлежит владельцу токена"""
+        self.get_redis()
+        await self._release_lock_script(keys=[f"{RedisConstant.LOCK_PREFIX}:{key}"], args=[token])
+
     async def clear_cache_by_path_params(self, namespace: str = RedisConstant.CACHE_PREFIX, **path_params) -> None:
         """
         Очистить кэш по namespace и path параметрам.
@@ -54,14 +145,45 @@ class RedisService:
         if not path_params:
             raise ValueError("Не указаны path параметры для очистки кэша")
 
-        key_parts = [namespace] + [str(value) for value in path_params.values()]
-        cache_key = ":".join(key_parts)
+        cache_key = build_cache_key(namespace, **path_params)
 
-        deleted = await self._redis_db.delete(cache_key)
+        async with self._redis_db.pipeline(transaction=False) as pipe:
+            deleted, _ = await pipe.delete(cache_key).publish(RedisConstant.INVALIDATION_CHANNEL, cache_key).execute()
         if deleted:
             logger.info(f"Кэш очищен для ключа {cache_key}")
         else:
             logger.info(f"Ключ {cache_key} не найден в кэше")
 
+    async def apply_changes(self, changes: CacheChanges, expire: int = RedisConstant.CACHE_EXPIRE) -> None:
+        """
+        Применяет накопленные за транзакцию изменения кэша одним pipeline.
+        Сначала удаляются ключи по тегам, затем записываются новые значения, если их версия не старше сохранённой.
+        Локальные копии ключей во всех процессах API сбрасываются через pub/sub.
+        """
+        if self._redis_db is None:
+            logger.warning("Redis не инициализирован")
+            raise RuntimeError("Redis не инициализирован. Вызовите init() при старте.")
+
+        if not changes:
+            return
+
+        async with self._redis_db.pipeline(transaction=False) as pipe:
+            for tag in changes.tags:
+                await self._invalidate_tag_script(keys=[tag], args=[RedisConstant.INVALIDATION_CHANNEL], client=pipe)
+            for cache_key, (value, version) in changes.entries.items():
+                await self._set_if_newer_script(
+                    keys=[cache_key, f"{RedisConstant.VERSION_PREFIX}:{cache_key}", *cache_key_tags(cache_key)],
+                    args=[
+                        value,
+                        version,
+                        expire,
+                        RedisConstant.VERSION_EXPIRE,
+                        RedisConstant.TAG_EXPIRE,
+                        RedisConstant.INVALIDATION_CHANNEL,
+                    ],
+                    client=pipe,
+                )
+            await pipe.execute()
+
 
 redis_service = RedisService()
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Sequence
+
+from fastapi_cache import FastAPICache
+
+from src.metrics.metrics import SINGLE_FLIGHT
+from src.redis.constant import RedisConstant
+from src.redis.service import redis_service
+from src.redis.utils import build_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в один.
+    Первый вызов выполняет функцию, остальные ждут его результат или исключение.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            SINGLE_FLIGHT.labels("shared").inc()
+        # shield: отмена одного из ожидающих запросов не отменяет общий запрос к БД
+        return await asyncio.shield(task)
+
+
+single_flight_group = SingleFlight()
+
+
+def single_flight(
+    namespace: str = RedisConstant.CACHE_PREFIX, distributed: bool = True, query_params: Sequence[str] = ()
+):
+    """
+    Декоратор для эндпоинтов под @cache: при промахе кэша запрос к БД по ключу выполняется один раз.
+    Ставится под @cache, поэтому срабатывает только на промахе.
+
+    :param namespace: Namespace ключа, должен совпадать с ключом, который строит path_param_key_builder.
+    :param distributed: Дополнительно брать короткую блокировку в Redis, чтобы запрос выполняла одна реплика.
+    :param query_params: Аргументы эндпоинта из query, в ключе они идут после "?", как у path_param_key_builder.
+    """
+
+    def wrapper(func):
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            path_params = {name: value for name, value in kwargs.items() if name not in query_params}
+            cache_key = build_cache_key(namespace, {name: kwargs.get(name) for name in query_params}, **path_params)
+
+            async def call():
+                if not distributed:
+                    SINGLE_FLIGHT.labels("leader").inc()
+                    return await func(*args, **kwargs)
+                return await _call_with_lock(cache_key, lambda: func(*args, **kwargs))
+
+            return await single_flight_group.do(cache_key, call)
+
+        return inner
+
+    return wrapper
+
+
+async def _call_with_lock(cache_key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Выполняет func, если удалось взять блокировку в Redis.
+    Иначе ждёт, пока другая реплика положит значение в кэш, и возвращает его.
+    Если значение не появилось за SINGLE_FLIGHT_WAIT или Redis недоступен — выполняет func сам.
+    """
+    try:
+        token = await redis_service.acquire_lock(cache_key, RedisConstant.SINGLE_FLIGHT_LOCK_TTL_MS)
+    except Exception as e:
+        logger.warning(f"Не удалось взять блокировку для {cache_key}: {e}")
+        SINGLE_FLIGHT.labels("fallback").inc()
+        return await func()
+
+    if token is not None:
+        SINGLE_FLIGHT.labels("leader").inc()
+        try:
+            return await func()
+        finally:
+            try:
+                await redis_service.release_lock(cache_key, token)
+            except Exception as e:
+                logger.warning(f"Не удалось снять блокировку для {cache_key}: {e}")
+
+    cached = await _wait_for_cached(cache_key)
+    if cached is not None:
+        SINGLE_FLIGHT.labels("waited").inc()
+        return FastAPICache.get_coder().decode(cached)
+    SINGLE_FLIGHT.labels("fallback").inc()
+    return await func()
+
+
+async def _wait_for_cached(cache_key: str) -> str | bytes | None:
+    """Опрашивает кэш, пока другая реплика не запишет значение, но не дольше SINGLE_FLIGHT_WAIT"""
+    backend = FastAPICache.get_backend()
+    deadline = time.monotonic() + RedisConstant.SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(RedisConstant.SINGLE_FLIGHT_POLL_INTERVAL)
+        try:
+            cached = await backend.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша {cache_key}: {e}")
+            return None
+        if cached is not None:
+            return cached
+    return None
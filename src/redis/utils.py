@@ -1,14 +1,55 @@
+from typing import List, Mapping
+
+from src.redis.constant import RedisConstant
+
+
+def build_cache_key(namespace: str, query_params: Mapping | None = None, **path_params) -> str:
+    """
+    Ключ кэша из namespace и параметров пути вида cache:warehouse_id=...:product_id=...
+    Используется и для записи из эндпоинтов, и для инвалидации/записи из сервисов.
+    Имена параметров в ключе нужны, чтобы по ключу можно было восстановить его теги.
+    Заданные query параметры добавляются после "?" и в теги не попадают.
+    """
+    key_parts = [namespace.rstrip(":")] + [f"{name}={value}" for name, value in path_params.items()]
+    key = ":".join(key_parts)
+    query = {name: value for name, value in (query_params or {}).items() if value is not None}
+    if query:
+        key += "?" + "&".join(f"{name}={query[name]}" for name in sorted(query))
+    return key
+
+
+def build_cache_tag(name: str, value) -> str:
+    """Тег объединяет все ключи кэша, зависящие от одной сущности, например склада"""
+    return f"{RedisConstant.TAG_PREFIX}:{name}:{value}"
+
+
+def cache_key_tags(cache_key: str) -> List[str]:
+    """
+    Теги ключа кэша: по одному на каждый параметр пути.
+    Ключ с query параметрами дополнительно получает тег всех вариантов ключа без query.
+    """
+    path, _, query = cache_key.partition("?")
+    tags = [build_cache_tag(*part.split("=", 1)) for part in path.split(":") if "=" in part]
+    if query:
+        tags.append(build_cache_tag(RedisConstant.QUERY_VARIANTS_TAG, path))
+    return tags
+
+
+def to_bytes(value: str | bytes | None) -> bytes | None:
+    """Значение кэша в bytes: JsonCoder декодирует только bytes"""
+    return value.encode() if isinstance(value, str) else value
+
+
 def path_param_key_builder(func, namespace: str, request, *args, **kwargs) -> str:
     """
     Универсальный key_builder для разных эндпоинтов с path параметрами.
-    Формирует ключ из namespace и параметров пути.
+    Формирует ключ из namespace и параметров пути, остальные аргументы эндпоинта — query параметры ключа.
     """
     path_params = request.path_params
 
     if not path_params:
         raise ValueError("Не удалось получить path параметры из запроса")
 
-    key_parts = [namespace] + [str(value) for value in path_params.values()]
-    cache_key = ":".join(key_parts)
-
-    return cache_key
+    endpoint_kwargs = kwargs.get("kwargs") or {}
+    query_params = {name: value for name, value in endpoint_kwargs.items() if name not in path_params}
+    return build_cache_key(namespace, query_params, **path_params)
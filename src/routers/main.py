@@ -1,8 +1,20 @@
+from datetime import datetime
 from uuid import UUID
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
 from fastapi_cache.decorator import cache
 
+from src.db.schemas import (
+    SMovementPage,
+    SStockLookupRequest,
+    SStockLookupResult,
+    SStockPage,
+    SWarehouseStockLookupRequest,
+)
+from src.dependencies import CursorDep, TimeRangeDep
+from src.redis.constant import RedisConstant
+from src.redis.single_flight import single_flight
 from src.redis.utils import path_param_key_builder
 from src.services.movement_service import MovementService, SGetMovementByIdResult
 from src.services.warehouse_service import (
@@ -14,7 +26,8 @@ router = APIRouter(prefix="", tags=["API"])
 
 
 @router.get("/movements/{movement_id}")
-@cache(expire=100, key_builder=path_param_key_builder)
+@cache(expire=RedisConstant.CACHE_EXPIRE, key_builder=path_param_key_builder)
+@single_flight()
 async def get_movement(movement_id: UUID) -> SGetMovementByIdResult:
     """
     Возвращает информацию о перемещении по его ID, включая отправителя, получателя, время, прошедшее между отправкой и приемкой, и разницу в количестве товара.
@@ -23,9 +36,74 @@ async def get_movement(movement_id: UUID) -> SGetMovementByIdResult:
 
 
 @router.get("/warehouses/{warehouse_id}/products/{product_id}")
-@cache(expire=100, key_builder=path_param_key_builder)
-async def get_remains_product_warehouse(warehouse_id: UUID, product_id: UUID) -> SGetProductWarehouseByIdResult:
+@cache(expire=RedisConstant.CACHE_EXPIRE, key_builder=path_param_key_builder)
+@single_flight(query_params=("as_of",))
+async def get_remains_product_warehouse(
+    warehouse_id: UUID,
+    product_id: UUID,
+    as_of: datetime | None = Query(None, description="Момент времени, на который нужен остаток"),
+) -> SGetProductWarehouseByIdResult:
     """
     Возвращает информацию текущем запасе товара в конкретном складе.
+    С as_of — запас на этот момент по времени событий.
+    Для товара без остатка на складе product_quantity = null.
+    """
+    return await WarehouseService.get_product_warehouse_by_id(warehouse_id, product_id, as_of)
+
+
+@router.post("/warehouses/{warehouse_id}/products:lookup")
+async def lookup_products_warehouse(warehouse_id: UUID, body: SWarehouseStockLookupRequest) -> SStockLookupResult:
+    """
+    Возвращает текущие запасы нескольких товаров на одном складе.
+    Для товаров без остатка на складе product_quantity = null.
+    """
+    return await WarehouseService.lookup_stock([(warehouse_id, product_id) for product_id in body.product_ids])
+
+
+@router.post("/stock:lookup")
+async def lookup_stock(body: SStockLookupRequest) -> SStockLookupResult:
+    """
+    Возвращает текущие запасы по списку пар склад/товар, склады могут быть разными.
+    Для пар без остатка product_quantity = null.
+    """
+    return await WarehouseService.lookup_stock([(item.warehouse_id, item.product_id) for item in body.items])
+
+
+@router.get("/warehouses/{warehouse_id}/stock", response_class=StreamingResponse)
+async def stream_stock_warehouse(
+    warehouse_id: UUID,
+    after: UUID | None = Query(None, description="product_id, после которого продолжить выдачу"),
+) -> StreamingResponse:
+    """
+    Возвращает все запасы склада потоком в формате NDJSON, по одной позиции на строку, в порядке product_id.
+    Прерванную выгрузку можно продолжить, передав в after последний полученный product_id.
+    """
+    return StreamingResponse(
+        WarehouseService.stream_stock_ndjson(warehouse_id, after), media_type="application/x-ndjson"
+    )
+
+
+@router.get("/warehouses/{warehouse_id}/stock/pages")
+async def get_stock_page_warehouse(warehouse_id: UUID, cursor: CursorDep) -> SStockPage:
+    """
+    Возвращает страницу запасов склада в порядке product_id. Для следующей страницы передайте next_cursor в cursor.
+    """
+    return await WarehouseService.get_stock_page(warehouse_id, cursor)
+
+
+@router.get("/warehouses/{warehouse_id}/movements")
+async def get_movements_warehouse(warehouse_id: UUID, cursor: CursorDep, time_range: TimeRangeDep) -> SMovementPage:
+    """
+    Возвращает историю перемещений склада от новых к старым с фильтром по времени.
+    Для следующей страницы передайте next_cursor в cursor.
+    """
+    return await MovementService.get_history(cursor, time_range, warehouse_id=warehouse_id)
+
+
+@router.get("/products/{product_id}/movements")
+async def get_movements_product(product_id: UUID, cursor: CursorDep, time_range: TimeRangeDep) -> SMovementPage:
+    """
+    Возвращает историю перемещений товара по всем складам от новых к старым с фильтром по времени.
+    Для следующей страницы передайте next_cursor в cursor.
     """
-    return await WarehouseService.get_product_warehouse_by_id(warehouse_id, product_id)
+    return await MovementService.get_history(cursor, time_range, product_id=product_id)
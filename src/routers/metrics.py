@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.metrics.metrics import registry
+from src.metrics.server import CONTENT_TYPE
+
+router = APIRouter(prefix="", tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Метрики процесса API в текстовом формате Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
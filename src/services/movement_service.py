@@ -1,8 +1,9 @@
 import uuid
 from typing import List
 
-from src.dao.base_dao import MovementDAO
-from src.db.schemas import SGetMovementByIdResult, SMovementAll, SMovementStat
+from src.dao.base_dao import MovementDAO, MovementPairDAO
+from src.db.schemas import SGetMovementByIdResult, SMovementAll, SMovementPage, SMovementPairAll, SMovementStat
+from src.dependencies import SFilterCursor, SFilterTimeRange
 from src.enums import EventType
 
 
@@ -10,23 +11,52 @@ class MovementService:
 
     @classmethod
     async def get_movements_by_id(cls, movement_id: uuid.UUID) -> SGetMovementByIdResult:
-        moves: List[SMovementAll] = await MovementDAO.find_all(movement_id=movement_id)
-        departure = None
-        arrival = None
+        pair: SMovementPairAll | None = await MovementPairDAO.find_by_movement_id(movement_id)
+        if pair is None:
+            return SGetMovementByIdResult()
 
-        for m in moves:
-            if m.event_type == EventType.departure:
-                departure = m
-            elif m.event_type == EventType.arrival:
-                arrival = m
+        moves: List[SMovementAll] = []
+        if pair.departure_at is not None:
+            moves.append(
+                SMovementAll(
+                    id=pair.departure_id,
+                    movement_id=pair.movement_id,
+                    warehouse_id=pair.sender_warehouse,
+                    product_id=pair.product_id,
+                    timestamp=pair.departure_at,
+                    quantity=pair.departure_quantity,
+                    event_type=EventType.departure,
+                )
+            )
+        if pair.arrival_at is not None:
+            moves.append(
+                SMovementAll(
+                    id=pair.arrival_id,
+                    movement_id=pair.movement_id,
+                    warehouse_id=pair.recipient_warehouse,
+                    product_id=pair.product_id,
+                    timestamp=pair.arrival_at,
+                    quantity=pair.arrival_quantity,
+                    event_type=EventType.arrival,
+                )
+            )
 
         stats = None
-        if departure and arrival:
+        if pair.time_diff is not None:
             stats = SMovementStat(
-                sender_warehouse=departure.warehouse_id,
-                recipient_warehouse=arrival.warehouse_id,
-                time_diff=str(arrival.timestamp - departure.timestamp),
-                diff_in_quantity=arrival.quantity - departure.quantity,
+                sender_warehouse=pair.sender_warehouse,
+                recipient_warehouse=pair.recipient_warehouse,
+                time_diff=str(pair.time_diff),
+                diff_in_quantity=pair.diff_in_quantity,
             )
 
         return SGetMovementByIdResult(movements=moves, stats=stats)
+
+    @classmethod
+    async def get_history(cls, cursor: SFilterCursor, time_range: SFilterTimeRange, **filter_by) -> SMovementPage:
+        """
+        Страница истории перемещений склада или товара, от новых к старым.
+        :param filter_by: warehouse_id или product_id.
+        """
+        items, next_cursor = await MovementDAO.find_history(cursor, time_range, **filter_by)
+        return SMovementPage(items=items, next_cursor=next_cursor)
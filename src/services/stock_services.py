@@ -1,67 +1,211 @@
+import logging
+from typing import List
+
 from fastapi import HTTPException
+from fastapi_cache import FastAPICache
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.dao.base_dao import MovementDAO, ProductDAO, StockItemDAO, WarehouseDAO
+from src.dao.base_dao import (
+    MovementDAO,
+    MovementPairDAO,
+    ProductDAO,
+    StockCheckpointDAO,
+    StockItemDAO,
+    WarehouseDAO,
+)
+from src.dao.entity_cache import known_products, known_warehouses
 from src.db.database import async_session_maker
-from src.db.schemas import SStockItemUpdate
+from src.db.partitions import MovementPartitions, partition_month
+from src.db.schemas import SGetProductWarehouseByIdResult, SMovementAll, SStockItemAll, SStockItemUpdate
 from src.kafka.schemas import SKafkaMessageAll
+from src.metrics.metrics import observe_stage
+from src.redis.constant import RedisConstant
+from src.redis.invalidation import CacheChanges
 from src.redis.service import redis_service
+from src.redis.utils import build_cache_key
+
+logger = logging.getLogger(__name__)
 
 
 class StockService:
 
+    @classmethod
+    async def prewarm_known_entities(cls):
+        """
+        Заполняет кэш известных складов и товаров из БД.
+        Вызывается при старте consumer, читает из primary: consumer не использует реплики.
+        """
+        known_warehouses.add(*await WarehouseDAO.find_ids(limit=known_warehouses.max_size, primary=True))
+        known_products.add(*await ProductDAO.find_ids(limit=known_products.max_size, primary=True))
+        logger.info(f"Кэш сущностей прогрет: складов {len(known_warehouses)}, товаров {len(known_products)}")
+
     @classmethod
     async def processing_message(cls, data: SKafkaMessageAll):
+        if not await cls._skip_archived([data]):
+            return
+        cache_changes = CacheChanges()
         async with async_session_maker() as session:
             try:
                 async with session.begin():
+                    await cls._apply_message(session, data, cache_changes)
 
-                    await WarehouseDAO.find_one_or_create(
-                        db_session_for_transaction=session,
-                        defaults={
-                            "id": data.data.warehouse_id,
-                            "code": data.source,
-                        },
-                        id=data.data.warehouse_id,
-                    )
-                    await ProductDAO.find_one_or_create(
-                        db_session_for_transaction=session,
-                        defaults={
-                            "id": data.data.product_id,
-                        },
-                        id=data.data.product_id,
-                    )
-                    await MovementDAO.find_one_or_create(
-                        db_session_for_transaction=session,
-                        defaults={
-                            "movement_id": data.data.movement_id,
-                            "warehouse_id": data.data.warehouse_id,
-                            "timestamp": data.data.timestamp,
-                            "quantity": data.data.quantity,
-                            "event_type": data.data.event,
-                            "product_id": data.data.product_id,
-                        },
-                        movement_id=data.data.movement_id,
-                        event_type=data.data.event,
-                    )
-                    await StockItemDAO.find_one_or_create_or_update_quantity(
-                        db_session_for_transaction=session,
-                        data=SStockItemUpdate(
-                            event_type=data.data.event,
-                            quantity=data.data.quantity,
-                            product_id=data.data.product_id,
-                            warehouse_id=data.data.warehouse_id,
-                        ),
-                    )
-                    await redis_service.clear_cache_by_path_params(
-                        warehouse_id=str(data.data.warehouse_id),
-                        product_id=str(data.data.product_id)
-                    )
-                    await redis_service.clear_cache_by_path_params(
-                        movement_id=str(data.data.movement_id)
+                known_warehouses.add(data.data.warehouse_id)
+                known_products.add(data.data.product_id)
+                await cls.apply_cache_changes(cache_changes)
+
+            except SQLAlchemyError as e:
+                raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {e}")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Неизвестная ошибка: {e}")
+
+    @classmethod
+    async def processing_batch(cls, messages: List[SKafkaMessageAll]):
+        """
+        Обрабатывает пачку сообщений в одной транзакции.
+        Число запросов к БД не зависит от размера пачки.
+        При ошибке откатывается вся пачка.
+        Остатки меняют только действительно добавленные движения: повторно доставленные сообщения
+        и дубли внутри пачки пропускаются, поэтому пачку можно обработать повторно.
+        """
+        messages = await cls._skip_archived(messages)
+        if not messages:
+            return
+        cache_changes = CacheChanges()
+        async with async_session_maker() as session:
+            try:
+                async with session.begin():
+                    warehouses = {}
+                    products = {}
+                    for data in messages:
+                        if data.data.warehouse_id not in known_warehouses:
+                            warehouses.setdefault(
+                                data.data.warehouse_id, {"id": data.data.warehouse_id, "code": data.source}
+                            )
+                        if data.data.product_id not in known_products:
+                            products.setdefault(data.data.product_id, {"id": data.data.product_id})
+
+                    # Одинаковый порядок вставки во всех воркерах исключает взаимные блокировки
+                    await WarehouseDAO.bulk_add_or_ignore(session, [warehouses[key] for key in sorted(warehouses)])
+                    await ProductDAO.bulk_add_or_ignore(session, [products[key] for key in sorted(products)])
+                    movements = await MovementDAO.add_new_legs(session, [cls._movement_row(data) for data in messages])
+                    await MovementPairDAO.upsert_legs(session, movements)
+                    await StockCheckpointDAO.delete_stale(session, movements)
+                    # id выдаются в порядке вставки, то есть в порядке поступления сообщений
+                    stock_items = await StockItemDAO.bulk_update_quantity(
+                        session,
+                        [
+                            SStockItemUpdate.model_validate(movement)
+                            for movement in sorted(movements, key=lambda movement: movement.id)
+                        ],
                     )
 
+                    for stock_item in stock_items:
+                        cls.write_through_stock_cache(cache_changes, stock_item)
+                    for movement in movements:
+                        cls.invalidate_stock_as_of_cache(cache_changes, movement)
+                    for data in messages:
+                        cache_changes.invalidate(movement_id=data.data.movement_id)
+
+                known_warehouses.add(*warehouses)
+                known_products.add(*products)
+                await cls.apply_cache_changes(cache_changes)
+
             except SQLAlchemyError as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {e}")
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Неизвестная ошибка: {e}")
+
+    @classmethod
+    async def _apply_message(cls, session: AsyncSession, data: SKafkaMessageAll, cache_changes: CacheChanges):
+        if data.data.warehouse_id not in known_warehouses:
+            await WarehouseDAO.bulk_add_or_ignore(session, [{"id": data.data.warehouse_id, "code": data.source}])
+        if data.data.product_id not in known_products:
+            await ProductDAO.bulk_add_or_ignore(session, [{"id": data.data.product_id}])
+        movements = await MovementDAO.add_new_legs(session, [cls._movement_row(data)])
+        if not movements:
+            # движение уже записано: сообщение доставлено повторно, остаток уже изменён
+            return
+        await MovementPairDAO.upsert_legs(session, movements)
+        await StockCheckpointDAO.delete_stale(session, movements)
+        stock_item = await StockItemDAO.upsert_quantity(
+            db_session_for_transaction=session,
+            data=SStockItemUpdate.model_validate(movements[0]),
+        )
+        cls.write_through_stock_cache(cache_changes, stock_item)
+        cls.invalidate_stock_as_of_cache(cache_changes, movements[0])
+        cache_changes.invalidate(movement_id=data.data.movement_id)
+
+    @classmethod
+    async def _skip_archived(cls, messages: List[SKafkaMessageAll]) -> List[SKafkaMessageAll]:
+        """
+        Создаёт недостающие партиции movement для месяцев сообщений.
+        Сообщения за месяцы, партиции которых уже выгружены в архив, пропускаются: записать их некуда,
+        и повторная обработка этого не исправит.
+        """
+        missing = await MovementPartitions.ensure_for(data.data.timestamp for data in messages)
+        if not missing:
+            return messages
+        kept = []
+        for data in messages:
+            if partition_month(data.data.timestamp) in missing:
+                logger.warning(
+                    f"Событие {data.data.event} перемещения {data.data.movement_id} от "
+                    f"{data.data.timestamp.isoformat()} пропущено: партиция movement за этот месяц выгружена в архив"
+                )
+            else:
+                kept.append(data)
+        return kept
+
+    @classmethod
+    def _movement_row(cls, data: SKafkaMessageAll) -> dict:
+        return {
+            "movement_id": data.data.movement_id,
+            "warehouse_id": data.data.warehouse_id,
+            "timestamp": data.data.timestamp,
+            "quantity": data.data.quantity,
+            "event_type": data.data.event,
+            "product_id": data.data.product_id,
+        }
+
+    @classmethod
+    def write_through_stock_cache(cls, cache_changes: CacheChanges, stock_item: SStockItemAll):
+        """
+        Новый остаток для кэша GET /warehouses/{warehouse_id}/products/{product_id}
+        в том же формате, что и @cache.
+        """
+        cache_changes.set_if_newer(
+            build_cache_key(
+                RedisConstant.CACHE_PREFIX,
+                warehouse_id=stock_item.warehouse_id,
+                product_id=stock_item.product_id,
+            ),
+            FastAPICache.get_coder().encode(SGetProductWarehouseByIdResult(product_quantity=stock_item.quantity)),
+            stock_item.version,
+        )
+
+    @classmethod
+    def invalidate_stock_as_of_cache(cls, cache_changes: CacheChanges, movement: SMovementAll):
+        """
+        Сбрасывает кэш остатков позиции на момент (?as_of=...): новое движение меняет остаток
+        на любой момент не раньше своего timestamp, в том числе пришедшее задним числом.
+        """
+        cache_changes.invalidate_query_variants(
+            build_cache_key(
+                RedisConstant.CACHE_PREFIX,
+                warehouse_id=movement.warehouse_id,
+                product_id=movement.product_id,
+            )
+        )
+
+    @classmethod
+    async def apply_cache_changes(cls, cache_changes: CacheChanges):
+        """
+        Отправляет изменения кэша после коммита одним pipeline. Ошибки только логируются:
+        транзакция уже закоммичена, устаревшее значение уйдёт со следующей записью или по TTL.
+        """
+        try:
+            with observe_stage("stock.cache_apply"):
+                await redis_service.apply_changes(cache_changes)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить кэш: {e}")
@@ -0,0 +1,190 @@
+"""
+Снимки остатков и пересборка stock_item из журнала движений.
+
+    python -m src.services.stock_snapshot_service snapshot                  # один снимок
+    python -m src.services.stock_snapshot_service snapshot --interval 3600  # снимок и контрольные точки раз в час
+    python -m src.services.stock_snapshot_service checkpoint                # контрольные точки остатков
+    python -m src.services.stock_snapshot_service rebuild --workers 8       # пересборка stock_item
+
+Снимок хранит ненулевые остатки и high_watermark — последний учтённый movement.id. Следующий снимок
+строится из предыдущего и только новых движений. Пересборка берёт последний снимок, применяет движения
+после него и исправляет только разошедшиеся позиции, склады обрабатываются параллельно.
+Пока склад пересобирается, ждёт только вставка движений по его позициям: иначе её изменение остатка
+было бы перезаписано. Если движения после снимка уже выгружены в архив партиций, пересборка отказывается.
+
+Контрольные точки — остатки позиций на момент прохода по времени событий, из них и движений после них
+отвечает GET /warehouses/{warehouse_id}/products/{product_id}?as_of=...
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from src.constant import StockSnapshotConstant
+from src.dao.base_dao import (
+    StockCheckpointDAO,
+    StockCheckpointRunDAO,
+    StockItemDAO,
+    StockSnapshotDAO,
+    WarehouseDAO,
+)
+from src.db.database import async_session_maker
+from src.db.partitions import MovementPartitions
+from src.db.schemas import SStockSnapshotAll
+from src.redis.invalidation import CacheChanges
+from src.redis.service import redis_service
+from src.services.stock_services import StockService
+
+logger = logging.getLogger(__name__)
+
+
+class StockSnapshotService:
+
+    @classmethod
+    async def take_snapshot(cls, keep: int = StockSnapshotConstant.KEEP_SNAPSHOTS) -> SStockSnapshotAll:
+        """
+        Строит новый снимок из предыдущего и движений после него, старые снимки сверх keep удаляет.
+        Запись в movement блокируется только на время чтения high_watermark.
+        """
+        async with async_session_maker() as session:
+            async with session.begin():
+                high_watermark = await StockSnapshotDAO.lock_high_watermark(session)
+            async with session.begin():
+                base = await StockSnapshotDAO.find_latest(session)
+                snapshot = await StockSnapshotDAO.create(session, base, high_watermark)
+                await StockSnapshotDAO.delete_old(session, keep)
+        logger.info(f"Снимок остатков {snapshot.id} создан, high_watermark={snapshot.high_watermark}")
+        return snapshot
+
+    @classmethod
+    async def take_checkpoints(cls) -> int:
+        """
+        Записывает контрольные точки на текущий момент для позиций с движениями после прошлого прохода.
+        Запись в movement блокируется только на время чтения high_watermark до и после подсчёта.
+        Движения, вставленные во время подсчёта, могли не увидеть новые точки в delete_stale:
+        после коммита устаревшие из-за них точки удаляются отдельно.
+        :return: Число записанных контрольных точек.
+        """
+        checkpoint_at = datetime.now(timezone.utc)
+        async with async_session_maker() as session:
+            async with session.begin():
+                high_watermark = await StockSnapshotDAO.lock_high_watermark(session)
+            async with session.begin():
+                last_run = await StockCheckpointRunDAO.find_latest(session)
+                created = await StockCheckpointDAO.create(session, last_run, high_watermark, checkpoint_at)
+                await StockCheckpointRunDAO.create(session, high_watermark=high_watermark, checkpoint_at=checkpoint_at)
+            async with session.begin():
+                concurrent_watermark = await StockSnapshotDAO.lock_high_watermark(session)
+            async with session.begin():
+                deleted = await StockCheckpointDAO.delete_stale_between(session, high_watermark, concurrent_watermark)
+        logger.info(
+            f"Контрольные точки остатков на {checkpoint_at.isoformat()}: {created}, "
+            f"удалено из-за движений во время подсчёта: {deleted}"
+        )
+        return created
+
+    @classmethod
+    async def rebuild(cls, workers: int = StockSnapshotConstant.REBUILD_WORKERS) -> None:
+        """
+        Пересобирает stock_item из последнего снимка и движений после него.
+        Каждый склад пересчитывается отдельной транзакцией, workers складов параллельно.
+        :raises RuntimeError: Движения после снимка есть в удалённых при архивации партициях.
+        """
+        started = time.monotonic()
+        async with async_session_maker() as session:
+            snapshot = await StockSnapshotDAO.find_latest(session)
+        archived = await MovementPartitions.archived_after(snapshot.high_watermark if snapshot is not None else 0)
+        if archived:
+            raise RuntimeError(
+                f"Пересборка невозможна: движения после снимка выгружены в архив ({', '.join(archived)}). "
+                "Нужен снимок, созданный до архивации этих партиций"
+            )
+        if snapshot is None:
+            logger.warning("Снимков остатков нет, пересборка по всему журналу движений")
+
+        queue: asyncio.Queue[uuid.UUID] = asyncio.Queue()
+        for warehouse_id in await WarehouseDAO.find_ids(primary=True):
+            queue.put_nowait(warehouse_id)
+        total = queue.qsize()
+
+        results = await asyncio.gather(*(cls._rebuild_worker(queue, snapshot) for _ in range(workers)))
+        updated = sum(result[0] for result in results)
+        zeroed = sum(result[1] for result in results)
+        logger.info(
+            f"stock_item пересобран за {time.monotonic() - started:.1f} сек: складов {total}, "
+            f"исправлено позиций {updated}, обнулено {zeroed}"
+        )
+
+    @classmethod
+    async def _rebuild_worker(cls, queue: asyncio.Queue, snapshot: SStockSnapshotAll | None) -> List[int]:
+        updated, zeroed = 0, 0
+        while not queue.empty():
+            warehouse_id = queue.get_nowait()
+            async with async_session_maker() as session:
+                # отдельная транзакция: вставленные записи не держат блокировки вне порядка product_id
+                async with session.begin():
+                    await StockItemDAO.create_missing_for_rebuild(session, warehouse_id, snapshot)
+                async with session.begin():
+                    warehouse_updated, warehouse_zeroed = await StockItemDAO.rebuild_warehouse(
+                        session, warehouse_id, snapshot
+                    )
+            updated += warehouse_updated
+            zeroed += warehouse_zeroed
+            if warehouse_updated or warehouse_zeroed:
+                cache_changes = CacheChanges()
+                cache_changes.invalidate(warehouse_id=warehouse_id)
+                await StockService.apply_cache_changes(cache_changes)
+        return [updated, zeroed]
+
+
+async def _snapshot_loop(interval: int | None) -> None:
+    while True:
+        try:
+            await StockSnapshotService.take_snapshot()
+            await StockSnapshotService.take_checkpoints()
+        except Exception as e:
+            if interval is None:
+                raise
+            logger.error(f"Ошибка создания снимка остатков: {e}")
+        if interval is None:
+            return
+        await asyncio.sleep(interval)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    if args.command == "snapshot":
+        task = asyncio.create_task(_snapshot_loop(args.interval))
+    elif args.command == "checkpoint":
+        task = asyncio.create_task(StockSnapshotService.take_checkpoints())
+    else:
+        await redis_service.init(local_cache=False)
+        task = asyncio.create_task(StockSnapshotService.rebuild(args.workers))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info("Остановлено")
+    finally:
+        await redis_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = subparsers.add_parser("snapshot", help="Создать снимок остатков и контрольные точки")
+    snapshot_parser.add_argument("--interval", type=int, default=None, help="Период повторения в секундах")
+    subparsers.add_parser("checkpoint", help="Создать контрольные точки остатков")
+    rebuild_parser = subparsers.add_parser("rebuild", help="Пересобрать stock_item из снимка и журнала движений")
+    rebuild_parser.add_argument("--workers", type=int, default=StockSnapshotConstant.REBUILD_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main(args))
@@ -1,18 +1,117 @@
+import logging
 import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Tuple
 
-from src.dao.base_dao import StockItemDAO
-from src.db.schemas import SGetProductWarehouseByIdResult, SStockItemAll
+from fastapi_cache import FastAPICache
+
+from src.dao.base_dao import StockCheckpointDAO, StockItemDAO
+from src.db.schemas import (
+    SGetProductWarehouseByIdResult,
+    SStockItemAll,
+    SStockLookupItem,
+    SStockLookupResult,
+    SStockPage,
+)
+from src.dependencies import SFilterCursor
+from src.redis.constant import RedisConstant
+from src.redis.invalidation import CacheChanges
+from src.redis.service import redis_service
+from src.redis.utils import build_cache_key
+from src.services.stock_services import StockService
+
+logger = logging.getLogger(__name__)
 
 
 class WarehouseService:
 
     @classmethod
     async def get_product_warehouse_by_id(
-        cls, warehouse_id: uuid.UUID, product_id: uuid.UUID
+        cls, warehouse_id: uuid.UUID, product_id: uuid.UUID, as_of: datetime | None = None
     ) -> SGetProductWarehouseByIdResult:
+        """
+        Текущий остаток позиции или, при заданном as_of, остаток на этот момент.
+        Для позиции без записи (без движений до as_of) product_quantity = None.
+        Остаток на момент применяет движения в порядке timestamp, а не поступления,
+        с тем же обрезанием до нуля, что и обработка событий. Его кэш сбрасывается каждым новым движением позиции.
+        Текущий остаток кладётся в кэш с версией строки: @cache не перезаписывает ключи с версией,
+        и прочитанный с отстающей реплики остаток не заменит более новый.
+        :param as_of: Момент времени, без часового пояса считается UTC.
+        """
+        if as_of is not None:
+            if as_of.tzinfo is None:
+                as_of = as_of.replace(tzinfo=timezone.utc)
+            quantity = await StockCheckpointDAO.quantity_as_of(warehouse_id, product_id, as_of)
+            return SGetProductWarehouseByIdResult(product_quantity=quantity)
+
+        stock_item: SStockItemAll | None = await StockItemDAO.find_by_key(warehouse_id, product_id)
+        if stock_item is None:
+            return SGetProductWarehouseByIdResult(product_quantity=None)
+
+        cache_changes = CacheChanges()
+        StockService.write_through_stock_cache(cache_changes, stock_item)
+        await StockService.apply_cache_changes(cache_changes)
+        return SGetProductWarehouseByIdResult(product_quantity=stock_item.quantity)
+
+    @classmethod
+    async def lookup_stock(cls, keys: List[Tuple[uuid.UUID, uuid.UUID]]) -> SStockLookupResult:
+        """
+        Остатки по списку пар (warehouse_id, product_id).
+        Попадания в кэш читаются одним MGET, промахи — одним запросом к БД,
+        найденные в БД остатки записываются в кэш одним pipeline.
+        :param keys: Пары (warehouse_id, product_id), повторы схлопываются.
+        :return: SStockLookupResult в порядке запроса, для отсутствующих пар product_quantity = None.
+        """
+        keys = list(dict.fromkeys(keys))
+        cache_keys = {
+            key: build_cache_key(RedisConstant.CACHE_PREFIX, warehouse_id=key[0], product_id=key[1]) for key in keys
+        }
+        coder = FastAPICache.get_coder()
+
+        try:
+            cached = await redis_service.get_many(list(cache_keys.values()))
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш остатков: {e}")
+            cached = {}
 
-        stock_item: SStockItemAll | None = await StockItemDAO.find_one_or_none(
-            warehouse_id=warehouse_id,
-            product_id=product_id,
+        quantities: Dict[Tuple[uuid.UUID, uuid.UUID], int | None] = {}
+        for key, cache_key in cache_keys.items():
+            if cache_key in cached:
+                quantities[key] = coder.decode(cached[cache_key])["product_quantity"]
+
+        missed = [key for key in keys if key not in quantities]
+        if missed:
+            cache_changes = CacheChanges()
+            for stock_item in await StockItemDAO.find_by_keys(missed):
+                quantities[(stock_item.warehouse_id, stock_item.product_id)] = stock_item.quantity
+                StockService.write_through_stock_cache(cache_changes, stock_item)
+            await StockService.apply_cache_changes(cache_changes)
+
+        return SStockLookupResult(
+            items=[
+                SStockLookupItem(warehouse_id=key[0], product_id=key[1], product_quantity=quantities.get(key))
+                for key in keys
+            ]
         )
-        return SGetProductWarehouseByIdResult(product_quantity=stock_item.quantity if stock_item else None)
+
+    @classmethod
+    async def get_stock_page(cls, warehouse_id: uuid.UUID, cursor: SFilterCursor) -> SStockPage:
+        """
+        Страница остатков склада в порядке product_id. next_cursor передаётся в cursor для следующей страницы,
+        None — страниц больше нет.
+        """
+        items, next_cursor = await StockItemDAO.find_page(cursor, order_by=["product_id"], warehouse_id=warehouse_id)
+        return SStockPage(items=items, next_cursor=next_cursor)
+
+    @classmethod
+    async def stream_stock_ndjson(cls, warehouse_id: uuid.UUID, after: uuid.UUID | None = None) -> AsyncIterator[str]:
+        """
+        Все остатки склада в формате NDJSON: одна строка на позицию, одна порция ответа на пачку из курсора.
+        При ошибке посреди выдачи поток обрывается, клиент продолжает с after = последний полученный product_id.
+        """
+        try:
+            async for stock_items in StockItemDAO.stream_by_warehouse(warehouse_id, after):
+                yield "".join(f"{stock_item.model_dump_json()}\n" for stock_item in stock_items)
+        except Exception as e:
+            logger.error(f"Потоковая выдача остатков склада {warehouse_id} прервана: {e}")
+            raise
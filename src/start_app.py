@@ -5,8 +5,12 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from src.db.database import dispose_engines
+from src.db.partitions import MovementPartitions
+from src.kafka.config import kafka_settings
 from src.kafka.consumer import consumer_service
 from src.redis.service import redis_service
+from src.services.stock_services import StockService
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +24,26 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     try:
         await redis_service.init()
 
-        consumer_task = asyncio.create_task(consumer_service.start())
+        if kafka_settings.KAFKA_CONSUMER_ENABLED:
+            try:
+                await StockService.prewarm_known_entities()
+            except Exception as e:
+                logger.warning(f"🟡 Не удалось прогреть кэш сущностей - {e}")
+            try:
+                await MovementPartitions.ensure()
+            except Exception as e:
+                logger.warning(f"🟡 Не удалось создать партиции movement - {e}")
+
+            consumer_task = asyncio.create_task(consumer_service.start())
+        else:
+            logger.info("Kafka consumer в API отключён (KAFKA_CONSUMER_ENABLED=false)")
         yield
     except Exception as e:
         logger.info(f"🟡 Ошибка при старте - {e}")
     finally:
-        await consumer_service.stop()
-        consumer_task.cancel()
-        await consumer_task
+        if consumer_task is not None:
+            await consumer_service.stop()
+            consumer_task.cancel()
+            await consumer_task
+        await redis_service.close()
+        await dispose_engines()
@@ -0,0 +1,16 @@
+import os
+
+# Настройки читаются при импорте модулей src. Тестам без БД, Redis и Kafka хватает значений по умолчанию,
+# переменные окружения и .env имеют приоритет.
+for name, value in {
+    "MODE": "TEST",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_USER": "postgres",
+    "DB_PASS": "postgres",
+    "DB_NAME": "warehouse",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "KAFKA_BOOTSTRAP_SERVERS": "localhost:9092",
+}.items():
+    os.environ.setdefault(name, value)
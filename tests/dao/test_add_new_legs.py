@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from src.constant import DAOConstant
+from src.dao.base_dao import MovementDAO
+from src.enums import EventType
+
+STARTED = datetime(2025, 8, 1, tzinfo=timezone.utc)
+
+
+class _Result:
+    def all(self):
+        return []
+
+
+class _Session:
+    def __init__(self):
+        self.queries = []
+
+    async def execute(self, query):
+        self.queries.append(query)
+        return _Result()
+
+
+def _row(number: int, event_type: EventType = EventType.arrival, minutes: int = 0) -> dict:
+    return {
+        "movement_id": uuid.UUID(int=number),
+        "warehouse_id": uuid.UUID(int=1),
+        "timestamp": STARTED + timedelta(minutes=minutes),
+        "quantity": number,
+        "event_type": event_type,
+        "product_id": uuid.UUID(int=2),
+    }
+
+
+def _params(query) -> dict:
+    return query.compile(dialect=postgresql.dialect()).params
+
+
+def test_movement_inserted_only_for_claimed_legs():
+    session = _Session()
+    asyncio.run(MovementDAO.add_new_legs(session, [_row(1)]))
+
+    sql = str(session.queries[0].compile(dialect=postgresql.dialect()))
+    assert "WITH claimed AS" in sql
+    assert "INSERT INTO movement_leg" in sql and "ON CONFLICT DO NOTHING" in sql
+    assert "JOIN claimed ON" in sql
+    assert "RETURNING movement.id" in sql
+
+
+def test_redelivery_in_batch_keeps_first_occurrence():
+    session = _Session()
+    rows = [_row(1, minutes=0), _row(2), _row(1, minutes=5), _row(1, EventType.departure)]
+    asyncio.run(MovementDAO.add_new_legs(session, rows))
+
+    params = _params(session.queries[0])
+    timestamps = [value for value in params.values() if isinstance(value, datetime)]
+    # по 2 значения timestamp на строку: в movement_leg и в VALUES для movement
+    assert len(timestamps) == 6
+    assert STARTED + timedelta(minutes=5) not in timestamps
+
+
+def test_chunks_respect_query_params_limit():
+    session = _Session()
+    count = DAOConstant.MAX_QUERY_PARAMS // 10 + 1
+    asyncio.run(MovementDAO.add_new_legs(session, [_row(number) for number in range(count)]))
+
+    assert len(session.queries) == 2
+    assert all(len(_params(query)) <= DAOConstant.MAX_QUERY_PARAMS for query in session.queries)
@@ -0,0 +1,53 @@
+import random
+import uuid
+
+import pytest
+
+from src.dao.base_dao import StockItemDAO
+from src.db.schemas import SStockItemUpdate
+from src.enums import EventType
+
+WAREHOUSES = [uuid.UUID(int=number) for number in range(1, 3)]
+PRODUCTS = [uuid.UUID(int=number) for number in range(10, 13)]
+
+
+def _update(warehouse_id: uuid.UUID, product_id: uuid.UUID, delta: int) -> SStockItemUpdate:
+    return SStockItemUpdate(
+        warehouse_id=warehouse_id,
+        product_id=product_id,
+        quantity=abs(delta),
+        event_type=EventType.arrival if delta >= 0 else EventType.departure,
+    )
+
+
+def _apply_sequentially(quantity: int, deltas) -> int:
+    for delta in deltas:
+        quantity = max(quantity + delta, 0)
+    return quantity
+
+
+def test_deltas_are_coalesced_per_key_in_arrival_order():
+    first, second = (WAREHOUSES[0], PRODUCTS[0]), (WAREHOUSES[0], PRODUCTS[1])
+    items = [_update(*first, 5), _update(*second, -2), _update(*first, -8), _update(*first, 4)]
+
+    assert StockItemDAO._coalesce_deltas(items) == {first: (1, -3), second: (-2, -2)}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_clamped_sum_matches_sequential_application(seed):
+    rng = random.Random(seed)
+    items = [
+        _update(rng.choice(WAREHOUSES), rng.choice(PRODUCTS), rng.randint(-10, 10)) for _ in range(rng.randint(1, 60))
+    ]
+    initial = {(warehouse_id, product_id): rng.randint(0, 15) for warehouse_id in WAREHOUSES for product_id in PRODUCTS}
+
+    for key, (net, min_prefix) in StockItemDAO._coalesce_deltas(items).items():
+        deltas = [
+            item.quantity if item.event_type == EventType.arrival else -item.quantity
+            for item in items
+            if (item.warehouse_id, item.product_id) == key
+        ]
+        # существующая строка: GREATEST(quantity + net, net - min_prefix)
+        assert max(initial[key] + net, net - min_prefix) == _apply_sequentially(initial[key], deltas)
+        # новая строка: остаток от нуля
+        assert max(net, net - min_prefix) == _apply_sequentially(0, deltas)
@@ -0,0 +1,104 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from src.dao.base_dao import MovementDAO
+from src.dao.cursor import decode_cursor, encode_cursor
+from src.db.models import Movement
+from src.dependencies import SFilterCursor
+from src.enums import EventType
+
+ORDER_BY = ["timestamp", "id"]
+ORDER_COLUMNS = [Movement.timestamp, Movement.id]
+STARTED = datetime(2025, 8, 1, tzinfo=timezone.utc)
+
+
+class _Row:
+    def __init__(self, number: int):
+        self._mapping = {
+            "id": number,
+            "movement_id": uuid.UUID(int=number),
+            "warehouse_id": uuid.UUID(int=1),
+            "product_id": uuid.UUID(int=2),
+            "timestamp": STARTED + timedelta(minutes=number),
+            "quantity": number,
+            "event_type": EventType.arrival,
+        }
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class _Session:
+    def __init__(self, rows, queries):
+        self._rows = rows
+        self._queries = queries
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query):
+        self._queries.append(query)
+        return _Result(self._rows)
+
+
+def _find_page(monkeypatch, rows, cursor: SFilterCursor, descending: bool = False):
+    queries = []
+    monkeypatch.setattr(
+        MovementDAO, "_session_maker", classmethod(lambda cls, primary=False: lambda: _Session(rows, queries))
+    )
+    items, next_cursor = asyncio.run(MovementDAO.find_page(cursor, order_by=ORDER_BY, descending=descending))
+    return items, next_cursor, str(queries[0].compile(dialect=postgresql.dialect()))
+
+
+def test_full_page_returns_cursor_of_its_last_row(monkeypatch):
+    items, next_cursor, sql = _find_page(monkeypatch, [_Row(1), _Row(2)], SFilterCursor(page_size=2))
+
+    assert [item.id for item in items] == [1, 2]
+    assert decode_cursor(next_cursor, ORDER_COLUMNS) == [STARTED + timedelta(minutes=2), 2]
+    assert "(movement.timestamp, movement.id) >" not in sql
+    assert "ORDER BY movement.timestamp, movement.id" in sql
+
+
+def test_short_page_is_the_last_one(monkeypatch):
+    _, next_cursor, _ = _find_page(monkeypatch, [_Row(1)], SFilterCursor(page_size=2))
+    assert next_cursor is None
+
+
+@pytest.mark.parametrize("descending, operator", [(False, ">"), (True, "<")])
+def test_cursor_continues_strictly_after_the_previous_page(monkeypatch, descending, operator):
+    cursor = encode_cursor([STARTED, 7])
+    _, _, sql = _find_page(monkeypatch, [], SFilterCursor(cursor=cursor, page_size=2), descending=descending)
+    assert f"(movement.timestamp, movement.id) {operator} (" in sql
+
+
+def test_malformed_cursor_is_a_client_error():
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor([STARTED]), ORDER_COLUMNS)
+    assert error.value.status_code == 400
+
+
+def test_find_all_pages_by_primary_key_without_offset(monkeypatch):
+    queries = []
+    monkeypatch.setattr(
+        MovementDAO, "_session_maker", classmethod(lambda cls, primary=False: lambda: _Session([_Row(1)], queries))
+    )
+    cursor = encode_cursor([1, STARTED])
+    asyncio.run(MovementDAO.find_all(SFilterCursor(cursor=cursor, page_size=2), warehouse_id=uuid.UUID(int=1)))
+
+    sql = str(queries[0].compile(dialect=postgresql.dialect()))
+    assert "(movement.id, movement.timestamp) > (" in sql
+    assert "ORDER BY movement.id, movement.timestamp" in sql
+    assert "OFFSET" not in sql
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import uuid
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from src.dao.base_dao import StockItemDAO
+from src.db.schemas import SStockItemUpdate
+from src.enums import EventType
+
+WAREHOUSE_ID = uuid.UUID(int=1)
+PRODUCT_ID = uuid.UUID(int=2)
+
+
+class _Result:
+    def __init__(self, row):
+        self._row = row
+
+    def one(self):
+        return self._row
+
+    def one_or_none(self):
+        return self._row
+
+
+class _Session:
+    def __init__(self, *rows):
+        self._rows = list(rows)
+        self.queries = []
+
+    async def execute(self, query, params=None):
+        self.queries.append((query, params))
+        return _Result(self._rows.pop(0))
+
+
+def _row(quantity: int, version: int, **extra):
+    return SimpleNamespace(
+        warehouse_id=WAREHOUSE_ID, product_id=PRODUCT_ID, quantity=quantity, version=version, **extra
+    )
+
+
+def _update(quantity: int, event_type: EventType) -> SStockItemUpdate:
+    return SStockItemUpdate(warehouse_id=WAREHOUSE_ID, product_id=PRODUCT_ID, quantity=quantity, event_type=event_type)
+
+
+def test_upsert_applies_unclamped_delta_only_when_non_negative():
+    sql = str(StockItemDAO._upsert_quantity_stmt().compile(dialect=postgresql.dialect()))
+
+    assert "SET quantity = (stock_item.quantity + %(delta)s::INTEGER)" in sql
+    assert "WHERE stock_item.quantity + %(delta)s::INTEGER >= " in sql
+    assert "WITH" not in sql
+
+
+def test_departure_within_stock_is_a_single_statement(caplog):
+    session = _Session(_row(3, 5))
+    with caplog.at_level(logging.WARNING):
+        item = asyncio.run(StockItemDAO.upsert_quantity(session, _update(2, EventType.departure)))
+
+    assert item.quantity == 3
+    assert len(session.queries) == 1
+    assert session.queries[0][1]["delta"] == -2
+    assert not caplog.records
+
+
+def test_departure_over_stock_is_clamped_with_warning(caplog):
+    session = _Session(None, _row(0, 6, old_quantity=1))
+    with caplog.at_level(logging.WARNING):
+        item = asyncio.run(StockItemDAO.upsert_quantity(session, _update(4, EventType.departure)))
+
+    assert item.quantity == 0
+    assert session.queries[1][0] is StockItemDAO._clamp_quantity_stmt()
+    assert "1 - 4 < 0" in caplog.text
+
+
+def test_departure_creating_item_warns_about_empty_warehouse(caplog):
+    session = _Session(_row(0, 1))
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(StockItemDAO.upsert_quantity(session, _update(4, EventType.departure)))
+
+    assert session.queries[0][1]["initial_quantity"] == 0
+    assert "пустого склада" in caplog.text
@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.db.partitions import MovementPartitions, _retention_cutoff, partition_month
+
+
+def test_partition_month_is_taken_in_utc():
+    moscow = timezone(timedelta(hours=3))
+    assert partition_month(datetime(2025, 9, 1, 1, 0, tzinfo=moscow)) == (2025, 8)
+    assert partition_month(datetime(2025, 9, 1, 1, 0)) == (2025, 9)
+
+
+def test_retention_cutoff_crosses_year_boundary():
+    now = datetime(2025, 3, 15, tzinfo=timezone.utc)
+    assert _retention_cutoff(now, 12) == (2024, 3)
+    assert _retention_cutoff(now, 3) == (2024, 12)
+    assert _retention_cutoff(now, 0) == (2025, 3)
+
+
+def test_known_months_need_no_database(monkeypatch):
+    now = datetime.now(timezone.utc)
+    monkeypatch.setattr(MovementPartitions, "_known_months", {partition_month(now)})
+    assert asyncio.run(MovementPartitions.ensure_for([now, now - timedelta(seconds=1)], retention_months=12)) == set()
@@ -0,0 +1,144 @@
+import asyncio
+import json
+from collections import Counter
+from typing import Callable
+
+from aiokafka import TopicPartition
+from fastapi import HTTPException
+from sqlalchemy.exc import DataError
+
+from src.benchmarks.ingest import TOPIC, InMemoryBroker, InMemoryConsumer, Stats
+from src.kafka.consumer import KafkaConsumerService
+
+PARTITIONS = 2
+
+
+def _messages(count: int):
+    # ключи — числа: hash строки зависит от PYTHONHASHSEED, и все ключи могли бы попасть в одну партицию
+    return [json.dumps({"data": {"warehouse_id": number % 5, "n": number}}).encode() for number in range(count)]
+
+
+def _service(broker: InMemoryBroker, handler, batch: bool = False, max_attempts: int = 10_000) -> KafkaConsumerService:
+    return KafkaConsumerService(
+        topic=TOPIC,
+        bootstrap_servers="memory",
+        group_id="test",
+        value_deserializer=json.loads,
+        handler=handler if not batch else None,
+        batch_handler=handler if batch else None,
+        key_func=lambda value: value["data"]["warehouse_id"],
+        workers=4,
+        retry_backoff=0.001,
+        retry_backoff_max=0.01,
+        max_attempts=max_attempts,
+        consumer_factory=lambda **kwargs: InMemoryConsumer(broker, Stats(), **kwargs),
+    )
+
+
+async def _run_until(service: KafkaConsumerService, done: Callable[[], bool], timeout: float = 5):
+    """Останавливает консьюмер, когда done() истинно, но не позже timeout; оффсеты коммитятся при остановке"""
+    task = asyncio.create_task(service.start())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not done() and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    await service.stop()
+    await task
+
+
+def test_failed_message_is_retried_until_it_succeeds():
+    broker = InMemoryBroker(_messages(100), PARTITIONS)
+    calls = Counter()
+    handled = set()
+
+    async def handler(value):
+        calls[value["data"]["n"]] += 1
+        if value["data"]["n"] == 7 and calls[7] <= 3:
+            raise RuntimeError("БД недоступна")
+        handled.add(value["data"]["n"])
+
+    asyncio.run(_run_until(_service(broker, handler), lambda: len(handled) == 100))
+
+    assert calls[7] == 4
+    assert sum(broker.committed.values()) == 100
+
+
+def test_failed_batch_is_retried_until_it_succeeds():
+    broker = InMemoryBroker(_messages(100), PARTITIONS)
+    failures = {"left": 2}
+    handled = set()
+
+    async def handler(values):
+        if any(value["data"]["n"] == 7 for value in values) and failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("БД недоступна")
+        handled.update(value["data"]["n"] for value in values)
+
+    asyncio.run(_run_until(_service(broker, handler, batch=True), lambda: len(handled) == 100))
+
+    assert failures["left"] == 0
+    assert sum(broker.committed.values()) == 100
+
+
+def test_offset_of_failing_message_is_not_committed():
+    broker = InMemoryBroker(_messages(100), PARTITIONS)
+    sizes = {number: len(queue) for number, queue in broker.partitions.items()}
+    partition, failing_offset = next(
+        (number, offset)
+        for number, queue in broker.partitions.items()
+        for offset, raw in enumerate(queue)
+        if json.loads(raw)["data"]["n"] == 7
+    )
+
+    handled = set()
+
+    async def handler(value):
+        if value["data"]["n"] == 7:
+            raise RuntimeError("БД недоступна")
+        handled.add(value["data"]["n"])
+
+    other = 1 - partition
+    other_numbers = {json.loads(raw)["data"]["n"] for raw in broker.partitions[other]}
+    asyncio.run(_run_until(_service(broker, handler), lambda: other_numbers <= handled))
+
+    # сообщения после упавшего обработаны, но коммит не проходит дальше него
+    assert broker.committed.get(TopicPartition(TOPIC, partition), 0) == failing_offset
+    assert broker.committed[TopicPartition(TOPIC, other)] == sizes[other]
+
+
+def test_permanent_error_is_dropped_without_retries():
+    broker = InMemoryBroker(_messages(100), PARTITIONS)
+    calls = Counter()
+    handled = set()
+
+    async def handler(value):
+        calls[value["data"]["n"]] += 1
+        if value["data"]["n"] == 7:
+            try:
+                raise DataError("INSERT", {}, Exception("integer out of range"))
+            except DataError:
+                # как StockService: исходная ошибка остаётся причиной HTTPException
+                raise HTTPException(status_code=500, detail="Ошибка базы данных")
+        handled.add(value["data"]["n"])
+
+    asyncio.run(_run_until(_service(broker, handler), lambda: len(handled) == 99))
+
+    assert calls[7] == 1
+    assert sum(broker.committed.values()) == 100
+
+
+def test_message_is_dropped_after_max_attempts():
+    broker = InMemoryBroker(_messages(100), PARTITIONS)
+    calls = Counter()
+    handled = set()
+
+    async def handler(value):
+        calls[value["data"]["n"]] += 1
+        if value["data"]["n"] == 7:
+            raise RuntimeError("БД недоступна")
+        handled.add(value["data"]["n"])
+
+    asyncio.run(_run_until(_service(broker, handler, max_attempts=3), lambda: len(handled) == 99))
+
+    assert calls[7] == 3
+    assert sum(broker.committed.values()) == 100
@@ -0,0 +1,48 @@
+import pytest
+
+from src.benchmarks.events import DECODER_EDGE_CASES, generate_corpus, generate_edge_cases
+from src.kafka.decoders import DECODER_FACTORIES, get_decoder
+
+EDGE_CASES = generate_edge_cases()
+
+
+def _fields(message) -> tuple | None:
+    if message is None:
+        return None
+    data = message.data
+    return (
+        *(getattr(message, name) for name in ("id", "source", "specversion", "time", "subject")),
+        *(getattr(data, name) for name in ("movement_id", "warehouse_id", "timestamp", "event", "product_id")),
+        data.quantity,
+    )
+
+
+@pytest.mark.parametrize("name", [name for name in DECODER_FACTORIES if name != "pydantic"])
+@pytest.mark.parametrize("raw", EDGE_CASES, ids=[f"{'.'.join(path)}={value!r}" for path, value in DECODER_EDGE_CASES])
+def test_decoder_matches_pydantic_on_edge_cases(name, raw):
+    assert _fields(get_decoder(name)(raw)) == _fields(get_decoder("pydantic")(raw))
+
+
+@pytest.mark.parametrize("name", list(DECODER_FACTORIES))
+def test_decoders_accept_generated_corpus(name):
+    decode = get_decoder(name)
+    for raw in generate_corpus(200):
+        assert decode(raw) is not None
+
+
+def test_source_with_trailing_newline_is_rejected():
+    raw = EDGE_CASES[DECODER_EDGE_CASES.index((("source",), "WH-0001\n"))]
+    assert get_decoder("msgspec")(raw) is None
+
+
+def test_lax_values_are_coerced_like_pydantic():
+    boolean = get_decoder("msgspec")(EDGE_CASES[DECODER_EDGE_CASES.index((("data", "quantity"), True))])
+    date_only = get_decoder("msgspec")(EDGE_CASES[DECODER_EDGE_CASES.index((("data", "timestamp"), "2025-02-18"))])
+    assert boolean.data.quantity == 1
+    assert (date_only.data.timestamp.year, date_only.data.timestamp.hour) == (2025, 0)
+
+
+@pytest.mark.parametrize("name", list(DECODER_FACTORIES))
+def test_quantity_overflowing_int4_is_rejected(name):
+    raw = EDGE_CASES[DECODER_EDGE_CASES.index((("data", "quantity"), 2**31))]
+    assert get_decoder(name)(raw) is None
@@ -0,0 +1,120 @@
+import asyncio
+
+from src.kafka.dispatcher import KeyOrderedDispatcher
+
+WORKERS = 4
+
+
+def test_same_key_items_are_handled_in_submission_order():
+    handled = {}
+
+    async def handler(item):
+        key, number = item
+        # пауза даёт воркерам других ключей вклиниться между задачами
+        await asyncio.sleep(0.001 * (number % 3))
+        handled.setdefault(key, []).append(number)
+
+    async def main():
+        dispatcher = KeyOrderedDispatcher(handler, workers=WORKERS, queue_size=10)
+        dispatcher.start()
+        for number in range(60):
+            key = f"wh-{number % 6}"
+            await dispatcher.submit(dispatcher.worker_for(key), (key, number))
+        await dispatcher.stop()
+
+    asyncio.run(main())
+    assert len(handled) == 6
+    for numbers in handled.values():
+        assert numbers == sorted(numbers)
+
+
+def test_different_workers_handle_items_concurrently():
+    async def main():
+        running = 0
+        peak = 0
+
+        async def handler(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        dispatcher = KeyOrderedDispatcher(handler, workers=WORKERS, queue_size=10)
+        dispatcher.start()
+        for worker in range(WORKERS):
+            await dispatcher.submit(worker, worker)
+        await dispatcher.stop()
+        return peak
+
+    assert asyncio.run(main()) == WORKERS
+
+
+def test_one_worker_handles_items_one_at_a_time():
+    async def main():
+        running = 0
+        peak = 0
+
+        async def handler(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+        dispatcher = KeyOrderedDispatcher(handler, workers=WORKERS, queue_size=10)
+        dispatcher.start()
+        for number in range(5):
+            await dispatcher.submit(0, number)
+        await dispatcher.stop()
+        return peak
+
+    assert asyncio.run(main()) == 1
+
+
+def test_submit_blocks_while_the_worker_queue_is_full():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(item):
+            await release.wait()
+
+        dispatcher = KeyOrderedDispatcher(handler, workers=WORKERS, queue_size=2)
+        dispatcher.start()
+        # первая задача уже у воркера, две следующие заполняют очередь
+        for number in range(3):
+            await dispatcher.submit(0, number)
+        await asyncio.sleep(0)
+        saturated = dispatcher.is_saturated()
+
+        blocked = asyncio.create_task(dispatcher.submit(0, 3))
+        await asyncio.sleep(0.01)
+        was_blocked = not blocked.done()
+        # очереди других воркеров свободны
+        await asyncio.wait_for(dispatcher.submit(1, 4), timeout=1)
+
+        release.set()
+        await asyncio.wait_for(blocked, timeout=1)
+        await dispatcher.stop()
+        return saturated, was_blocked, dispatcher.is_drained()
+
+    assert asyncio.run(main()) == (True, True, True)
+
+
+def test_handler_error_does_not_stop_the_worker():
+    handled = []
+
+    async def handler(item):
+        if item == 0:
+            raise RuntimeError("ошибка обработки")
+        handled.append(item)
+
+    async def main():
+        dispatcher = KeyOrderedDispatcher(handler, workers=1, queue_size=10)
+        dispatcher.start()
+        for number in range(3):
+            await dispatcher.submit(0, number)
+        await dispatcher.stop()
+
+    asyncio.run(main())
+    assert handled == [1, 2]
@@ -0,0 +1,77 @@
+from aiokafka import TopicPartition
+
+from src.kafka.offsets import OffsetTracker
+
+TP = TopicPartition("movements", 0)
+OTHER_TP = TopicPartition("movements", 1)
+
+
+def _tracker(commit_every: int = 100, commit_interval_ms: int = 60_000) -> OffsetTracker:
+    return OffsetTracker(commit_interval_ms=commit_interval_ms, commit_every=commit_every)
+
+
+def test_low_watermark_waits_for_the_oldest_in_flight_offset():
+    tracker = _tracker()
+    for offset in (10, 11, 12, 13):
+        tracker.track(TP, offset)
+
+    tracker.done(TP, 12)
+    tracker.done(TP, 11)
+    assert tracker.offsets_to_commit() == {}
+
+    tracker.done(TP, 10)
+    assert tracker.offsets_to_commit() == {TP: 13}
+
+    tracker.done(TP, 13)
+    assert tracker.offsets_to_commit() == {TP: 14}
+
+
+def test_committed_offsets_are_not_offered_again():
+    tracker = _tracker()
+    tracker.track(TP, 0)
+    tracker.track(OTHER_TP, 0)
+    tracker.done(TP, 0)
+
+    offsets = tracker.offsets_to_commit()
+    assert offsets == {TP: 1}
+    tracker.mark_committed(offsets)
+    assert tracker.offsets_to_commit() == {}
+
+    tracker.done(OTHER_TP, 0)
+    assert tracker.offsets_to_commit() == {OTHER_TP: 1}
+    assert tracker.offsets_to_commit([TP]) == {}
+
+
+def test_should_commit_after_enough_done_messages_or_interval():
+    tracker = _tracker(commit_every=2)
+    assert not tracker.should_commit()
+    for offset in range(3):
+        tracker.track(TP, offset)
+
+    tracker.done(TP, 0)
+    assert not tracker.should_commit()
+    tracker.done(TP, 1)
+    assert tracker.should_commit()
+
+    tracker.mark_committed(tracker.offsets_to_commit())
+    assert not tracker.should_commit()
+
+    by_interval = _tracker(commit_every=100, commit_interval_ms=0)
+    by_interval.track(TP, 0)
+    assert not by_interval.should_commit()
+    by_interval.done(TP, 0)
+    assert by_interval.should_commit()
+
+
+def test_forgotten_partition_is_no_longer_tracked():
+    tracker = _tracker()
+    tracker.track(TP, 5)
+    tracker.forget([TP])
+
+    tracker.done(TP, 5)
+    assert tracker.offsets_to_commit() == {}
+
+    # после повторного назначения партиция отслеживается заново
+    tracker.track(TP, 7)
+    tracker.done(TP, 7)
+    assert tracker.offsets_to_commit() == {TP: 8}
@@ -0,0 +1,32 @@
+import uuid
+
+from src.redis.constant import RedisConstant
+from src.redis.invalidation import CacheChanges
+from src.redis.utils import build_cache_key, build_cache_tag, cache_key_tags
+
+WAREHOUSE_ID = uuid.UUID("11111111-1111-1111-1111-111111111111")
+PRODUCT_ID = uuid.UUID("22222222-2222-2222-2222-222222222222")
+
+
+def test_key_without_query_is_tagged_by_path_params_only():
+    key = build_cache_key(RedisConstant.CACHE_PREFIX, warehouse_id=WAREHOUSE_ID, product_id=PRODUCT_ID)
+    assert cache_key_tags(key) == [
+        build_cache_tag("warehouse_id", WAREHOUSE_ID),
+        build_cache_tag("product_id", PRODUCT_ID),
+    ]
+
+
+def test_query_variants_are_invalidated_by_their_path_key():
+    path_key = build_cache_key(RedisConstant.CACHE_PREFIX, warehouse_id=WAREHOUSE_ID, product_id=PRODUCT_ID)
+    key = build_cache_key(
+        RedisConstant.CACHE_PREFIX,
+        {"as_of": "2025-08-01T00:00:00+00:00"},
+        warehouse_id=WAREHOUSE_ID,
+        product_id=PRODUCT_ID,
+    )
+
+    changes = CacheChanges()
+    changes.invalidate_query_variants(path_key)
+
+    assert changes.tags <= set(cache_key_tags(key))
+    assert not changes.tags & set(cache_key_tags(path_key))
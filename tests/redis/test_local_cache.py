@@ -0,0 +1,74 @@
+from src.redis import local_cache
+from src.redis.local_cache import LocalCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs) -> tuple:
+    clock = _Clock()
+    monkeypatch.setattr(local_cache.time, "monotonic", clock)
+    return LocalCache(**kwargs), clock
+
+
+def test_least_recently_used_entry_is_evicted_first(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=2, max_bytes=1000)
+    cache.set("a", "1", expire=60)
+    cache.set("b", "2", expire=60)
+    cache.get_with_ttl("a")
+    cache.set("c", "3", expire=60)
+
+    assert cache.get_with_ttl("b") is None
+    assert cache.get_with_ttl("a") == (60, "1")
+    assert cache.get_with_ttl("c") == (60, "3")
+
+
+def test_total_size_limit_evicts_oldest_entries(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=10, max_bytes=10)
+    cache.set("a", b"xxxx", expire=60)
+    cache.set("b", b"yyyy", expire=60)
+    cache.set("c", b"zzzz", expire=60)
+
+    assert cache.get_with_ttl("a") is None
+    assert cache.get_with_ttl("b") is not None
+    assert cache.get_with_ttl("c") is not None
+
+
+def test_value_larger_than_the_limit_is_not_stored(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=10, max_bytes=4)
+    cache.set("a", b"xx", expire=60)
+    cache.set("b", b"xxxxx", expire=60)
+
+    assert cache.get_with_ttl("b") is None
+    assert cache.get_with_ttl("a") is not None
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch)
+    cache.set("a", "1", expire=60)
+
+    clock.now += 45.5
+    assert cache.get_with_ttl("a") == (14, "1")
+    clock.now += 14.5
+    assert cache.get_with_ttl("a") is None
+
+
+def test_non_positive_expire_is_not_stored(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.set("a", "1", expire=0)
+    assert cache.get_with_ttl("a") is None
+
+
+def test_overwrite_replaces_value_and_size(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=10, max_bytes=8)
+    cache.set("a", b"xxxx", expire=60)
+    cache.set("a", b"yyyy", expire=60)
+    cache.set("b", b"zzzz", expire=60)
+
+    assert cache.get_with_ttl("a") == (60, b"yyyy")
+    assert cache.get_with_ttl("b") == (60, b"zzzz")
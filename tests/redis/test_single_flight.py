@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.coder import JsonCoder
+
+from src.metrics.metrics import SINGLE_FLIGHT
+from src.redis import single_flight as single_flight_module
+from src.redis.constant import RedisConstant
+from src.redis.single_flight import single_flight
+
+
+class _Redis:
+    def __init__(self, token: str | None = "token", error: Exception | None = None):
+        self.token = token
+        self.error = error
+        self.released = []
+
+    async def acquire_lock(self, key: str, ttl_ms: int) -> str | None:
+        if self.error is not None:
+            raise self.error
+        return self.token
+
+    async def release_lock(self, key: str, token: str) -> None:
+        self.released.append((key, token))
+
+
+class _Backend:
+    def __init__(self, values: list):
+        self._values = values
+
+    async def get(self, key: str):
+        return self._values.pop(0) if self._values else None
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    def install(redis: _Redis, cached: list = ()):
+        monkeypatch.setattr(single_flight_module, "redis_service", redis)
+        monkeypatch.setattr(FastAPICache, "get_backend", classmethod(lambda cls: _Backend(list(cached))))
+        monkeypatch.setattr(FastAPICache, "get_coder", classmethod(lambda cls: JsonCoder))
+        monkeypatch.setattr(RedisConstant, "SINGLE_FLIGHT_POLL_INTERVAL", 0.001)
+        monkeypatch.setattr(RedisConstant, "SINGLE_FLIGHT_WAIT", 0.05)
+        return redis
+
+    return install
+
+
+def _outcome(label: str) -> float:
+    return SINGLE_FLIGHT.labels(label).value
+
+
+def _endpoint(calls: list, delay: float = 0, distributed: bool = True):
+    @single_flight(distributed=distributed)
+    async def endpoint(item_id: int):
+        calls.append(item_id)
+        await asyncio.sleep(delay)
+        return {"item_id": item_id}
+
+    return endpoint
+
+
+def test_concurrent_calls_share_one_leader_call(redis):
+    lock = redis(_Redis())
+    calls = []
+    endpoint = _endpoint(calls, delay=0.01)
+    leaders, shared = _outcome("leader"), _outcome("shared")
+
+    async def main():
+        return await asyncio.gather(*(endpoint(item_id=1) for _ in range(5)))
+
+    assert asyncio.run(main()) == [{"item_id": 1}] * 5
+    assert calls == [1]
+    assert len(lock.released) == 1
+    assert _outcome("leader") - leaders == 1
+    assert _outcome("shared") - shared == 4
+
+
+def test_different_keys_are_not_shared(redis):
+    redis(_Redis())
+    calls = []
+    endpoint = _endpoint(calls, delay=0.01)
+
+    async def main():
+        return await asyncio.gather(endpoint(item_id=1), endpoint(item_id=2))
+
+    assert asyncio.run(main()) == [{"item_id": 1}, {"item_id": 2}]
+    assert sorted(calls) == [1, 2]
+
+
+def test_leader_error_is_raised_to_every_waiter(redis):
+    redis(_Redis(), [])
+
+    @single_flight()
+    async def endpoint(item_id: int):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("БД недоступна")
+
+    async def main():
+        return await asyncio.gather(*(endpoint(item_id=1) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+
+def test_value_cached_by_another_replica_is_returned_without_a_call(redis):
+    redis(_Redis(token=None), [None, json.dumps({"item_id": 1}).encode()])
+    calls = []
+    waited = _outcome("waited")
+
+    assert asyncio.run(_endpoint(calls)(item_id=1)) == {"item_id": 1}
+    assert calls == []
+    assert _outcome("waited") - waited == 1
+
+
+def test_falls_back_to_a_call_when_nothing_is_cached_in_time(redis):
+    redis(_Redis(token=None))
+    calls = []
+    fallback = _outcome("fallback")
+
+    assert asyncio.run(_endpoint(calls)(item_id=1)) == {"item_id": 1}
+    assert calls == [1]
+    assert _outcome("fallback") - fallback == 1
+
+
+def test_falls_back_to_a_call_when_redis_is_unavailable(redis):
+    redis(_Redis(error=ConnectionError("redis недоступен")))
+    calls = []
+    fallback = _outcome("fallback")
+
+    assert asyncio.run(_endpoint(calls)(item_id=1)) == {"item_id": 1}
+    assert calls == [1]
+    assert _outcome("fallback") - fallback == 1
+
+
+def test_local_only_mode_does_not_take_the_lock(redis):
+    lock = redis(_Redis(error=AssertionError("блокировка не нужна")))
+    calls = []
+
+    assert asyncio.run(_endpoint(calls, distributed=False)(item_id=1)) == {"item_id": 1}
+    assert calls == [1]
+    assert lock.released == []
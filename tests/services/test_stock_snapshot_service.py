@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from src.db.partitions import MovementPartitions
+from src.db.schemas import SStockSnapshotAll
+from src.services import stock_snapshot_service
+from src.services.stock_snapshot_service import (
+    StockCheckpointDAO,
+    StockCheckpointRunDAO,
+    StockSnapshotDAO,
+    StockSnapshotService,
+    WarehouseDAO,
+)
+
+
+class _Session:
+    """Сессия, которая нумерует транзакции: вызовы DAO записывают номер текущей"""
+
+    def __init__(self):
+        self.transaction = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def begin(self):
+        self.transaction += 1
+        return self
+
+
+@pytest.mark.parametrize(
+    "snapshot, high_watermark",
+    [(None, 0), (SStockSnapshotAll(id=1, high_watermark=500, created_at=datetime.now(timezone.utc)), 500)],
+)
+def test_rebuild_refuses_when_ledger_was_archived(monkeypatch, snapshot, high_watermark):
+    checked = []
+
+    async def find_latest(session):
+        return snapshot
+
+    async def archived_after(value):
+        checked.append(value)
+        return ["movement_p202401"]
+
+    async def find_ids(primary):
+        raise AssertionError("пересборка не должна начинаться")
+
+    monkeypatch.setattr(StockSnapshotDAO, "find_latest", find_latest)
+    monkeypatch.setattr(MovementPartitions, "archived_after", archived_after)
+    monkeypatch.setattr(WarehouseDAO, "find_ids", find_ids)
+
+    with pytest.raises(RuntimeError, match="movement_p202401"):
+        asyncio.run(StockSnapshotService.rebuild(workers=1))
+    assert checked == [high_watermark]
+
+
+def test_checkpoint_fold_does_not_hold_the_movement_lock(monkeypatch):
+    session = _Session()
+    calls = []
+    watermarks = iter([100, 130])
+
+    async def lock_high_watermark(session):
+        calls.append(("lock", session.transaction))
+        return next(watermarks)
+
+    async def find_latest(session):
+        return None
+
+    async def create_checkpoints(session, last_run, high_watermark, checkpoint_at):
+        calls.append(("create", session.transaction, high_watermark))
+        return 5
+
+    async def create_run(session, high_watermark, checkpoint_at):
+        calls.append(("run", session.transaction, high_watermark))
+
+    async def delete_stale_between(session, after_id, up_to_id):
+        calls.append(("delete_stale", session.transaction, after_id, up_to_id))
+        return 1
+
+    monkeypatch.setattr(stock_snapshot_service, "async_session_maker", lambda: session)
+    monkeypatch.setattr(StockSnapshotDAO, "lock_high_watermark", lock_high_watermark)
+    monkeypatch.setattr(StockCheckpointRunDAO, "find_latest", find_latest)
+    monkeypatch.setattr(StockCheckpointDAO, "create", create_checkpoints)
+    monkeypatch.setattr(StockCheckpointRunDAO, "create", create_run)
+    monkeypatch.setattr(StockCheckpointDAO, "delete_stale_between", delete_stale_between)
+
+    assert asyncio.run(StockSnapshotService.take_checkpoints()) == 5
+    # блокировка только в коротких транзакциях чтения high_watermark, подсчёт и удаление — без неё
+    assert calls == [("lock", 1), ("create", 2, 100), ("run", 2, 100), ("lock", 3), ("delete_stale", 4, 100, 130)]
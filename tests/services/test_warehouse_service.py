@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.coder import JsonCoder
+
+from src.db.schemas import SGetProductWarehouseByIdResult, SStockItemAll
+from src.redis.constant import RedisConstant
+from src.redis.utils import build_cache_key
+from src.services.warehouse_service import StockCheckpointDAO, StockItemDAO, WarehouseService, redis_service
+
+WAREHOUSE_ID = uuid.UUID(int=1)
+CACHED, STORED, MISSING = uuid.UUID(int=10), uuid.UUID(int=11), uuid.UUID(int=12)
+
+
+def test_unknown_pair_has_no_quantity_with_and_without_as_of(monkeypatch):
+    async def quantity_as_of(warehouse_id, product_id, as_of):
+        return None
+
+    async def find_by_key(warehouse_id, product_id):
+        return None
+
+    monkeypatch.setattr(StockCheckpointDAO, "quantity_as_of", quantity_as_of)
+    monkeypatch.setattr(StockItemDAO, "find_by_key", find_by_key)
+
+    warehouse_id, product_id = uuid.uuid4(), uuid.uuid4()
+    current = asyncio.run(WarehouseService.get_product_warehouse_by_id(warehouse_id, product_id))
+    as_of = asyncio.run(
+        WarehouseService.get_product_warehouse_by_id(warehouse_id, product_id, as_of=datetime(2025, 1, 1))
+    )
+    assert current.product_quantity is None
+    assert as_of.product_quantity is None
+
+
+def _cache_key(product_id: uuid.UUID) -> str:
+    return build_cache_key(RedisConstant.CACHE_PREFIX, warehouse_id=WAREHOUSE_ID, product_id=product_id)
+
+
+@pytest.fixture
+def lookup(monkeypatch):
+    """Кэш с остатком CACHED, в БД — остаток STORED; возвращает запрошенные ключи и записанные изменения кэша"""
+    calls = {"get_many": [], "find_by_keys": [], "applied": []}
+
+    async def get_many(keys):
+        calls["get_many"].append(keys)
+        value = JsonCoder.encode(SGetProductWarehouseByIdResult(product_quantity=3))
+        return {key: value for key in keys if key == _cache_key(CACHED)}
+
+    async def find_by_keys(keys):
+        calls["find_by_keys"].append(keys)
+        return [
+            SStockItemAll(warehouse_id=warehouse_id, product_id=product_id, quantity=7, version=2)
+            for warehouse_id, product_id in keys
+            if product_id == STORED
+        ]
+
+    async def apply_changes(changes):
+        calls["applied"].append(changes)
+
+    monkeypatch.setattr(FastAPICache, "get_coder", classmethod(lambda cls: JsonCoder))
+    monkeypatch.setattr(redis_service, "get_many", get_many)
+    monkeypatch.setattr(redis_service, "apply_changes", apply_changes)
+    monkeypatch.setattr(StockItemDAO, "find_by_keys", find_by_keys)
+    return calls
+
+
+def test_lookup_merges_cache_hits_with_database_misses_in_request_order(lookup):
+    keys = [(WAREHOUSE_ID, MISSING), (WAREHOUSE_ID, CACHED), (WAREHOUSE_ID, STORED), (WAREHOUSE_ID, CACHED)]
+    result = asyncio.run(WarehouseService.lookup_stock(keys))
+
+    assert [(item.product_id, item.product_quantity) for item in result.items] == [
+        (MISSING, None),
+        (CACHED, 3),
+        (STORED, 7),
+    ]
+    # один MGET по всем парам без повторов, в БД — только промахи
+    assert lookup["get_many"] == [[_cache_key(MISSING), _cache_key(CACHED), _cache_key(STORED)]]
+    assert lookup["find_by_keys"] == [[(WAREHOUSE_ID, MISSING), (WAREHOUSE_ID, STORED)]]
+    # найденный в БД остаток записывается в кэш, отсутствующий — нет
+    assert list(lookup["applied"][0].entries) == [_cache_key(STORED)]
+
+
+def test_lookup_without_misses_does_not_query_the_database(lookup):
+    result = asyncio.run(WarehouseService.lookup_stock([(WAREHOUSE_ID, CACHED)]))
+
+    assert result.items[0].product_quantity == 3
+    assert lookup["find_by_keys"] == []
+
+
+def test_lookup_reads_the_database_when_the_cache_is_unavailable(lookup, monkeypatch):
+    async def get_many(keys):
+        raise ConnectionError("redis недоступен")
+
+    monkeypatch.setattr(redis_service, "get_many", get_many)
+    result = asyncio.run(WarehouseService.lookup_stock([(WAREHOUSE_ID, CACHED), (WAREHOUSE_ID, STORED)]))
+
+    assert [item.product_quantity for item in result.items] == [None, 7]
+    assert lookup["find_by_keys"] == [[(WAREHOUSE_ID, CACHED), (WAREHOUSE_ID, STORED)]]